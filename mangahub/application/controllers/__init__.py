@@ -1,5 +1,6 @@
 from .app_controller import MangaSignals, AppController
 from .chapter_image_loader import ChapterImageLoader
+from .chapter_prefetcher import ChapterPrefetcher
 from .manga_manager import MangaManager
 from .novels_manager import NovelsManager
 from .sites_manager import DownloadTypes, MangaSignals, MangaChapterSignals, SitesManager
@@ -8,6 +9,7 @@ __all__ = [
     'MangaSignals', 
 	'AppController', 
 	'ChapterImageLoader', 
+	'ChapterPrefetcher', 
 	'MangaManager', 
 	'NovelsManager', 
 	'DownloadTypes', 
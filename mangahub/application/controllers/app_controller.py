@@ -8,6 +8,7 @@ from core.models.images import ImageMetadata
 from core.models.manga import MangaState, MangaChapter
 from core.repositories import StateRepository
 
+from .chapter_prefetcher import ChapterPrefetcher
 from .manga_manager import MangaManager
 from .sites_manager import SitesManager
 from core.models.manga import Manga
@@ -39,6 +40,7 @@ class AppController(QObject):
         self.state = MangaState()
         
         self.chapter_load_timer = QTimer()
+        self.prefetcher = ChapterPrefetcher(app)
 
         logger.success("AppController initialized")
 
@@ -83,7 +85,9 @@ class AppController(QObject):
     
     def set_chapter(self, number: float):
         self.chapter_load_timer.stop()
-        self.chapter_load_timer.singleShot(Config.Downloading.Chapter.time_wait_before_loading(), lambda: self._set_chapter(number))
+        # Prefetched chapter is served from cache, nothing to debounce
+        wait = 0 if self.prefetcher.is_prefetched(number) else Config.Downloading.Chapter.time_wait_before_loading()
+        self.chapter_load_timer.singleShot(wait, lambda: self._set_chapter(number))
         
     def _set_chapter(self, number: float):
         media = self.state.get_media()
@@ -93,6 +97,7 @@ class AppController(QObject):
             media.last_read_chapter = number
         self.state.set_chapter(number)
         self.state._chapter.set_is_read()
+        self.prefetcher.set_chapter(media, number)
         self.load_chapter()
         
     def load_chapter(self):
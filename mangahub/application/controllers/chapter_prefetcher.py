@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from loguru import logger
+from PySide6.QtCore import QObject, Slot
+
+from application.services.downloaders import ImageDownloaderWorker
+from core.models.manga import Manga
+from config import Config
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from main import App
+
+
+class ChapterPrefetcher(QObject):
+    """
+    Downloads next chapters into `ImageCache` while current one is read, so opening them is served from cache.
+
+    Once reading passes `prefetch_after` of current chapter, image urls of next `prefetch_chapters` chapters
+    are taken from chapter repository or resolved from site, and images are downloaded at background priority.
+    Opening any other chapter cancels prefetch of chapters that are not ahead of it anymore.
+    """
+
+    def __init__(self, app: App):
+        super().__init__()
+        self.sites_manager = app.sites_manager
+        self.download_manager = app.download_manager
+        self.download_manager.chapter_images_urls_downloaded.connect(self._image_urls_downloaded)
+
+        self._manga: Manga | None = None
+        self._chapter_num = 0.
+        self._started = False   # Prefetch from current chapter was already started
+        self._resolving: set[float] = set()     # Chapters waiting for image urls
+        self._workers: dict[float, ImageDownloaderWorker | None] = {}   # None if everything was cached already
+
+    def set_chapter(self, manga: Manga, chapter_num: float):
+        """Reader opened `chapter_num`, it is downloaded in foreground now, so its prefetch is cancelled as well"""
+        upcoming = set(self._next_chapters(manga, chapter_num)) if manga is self._manga else set()
+        for num in list(self._workers):
+            if num not in upcoming:
+                if (worker := self._workers.pop(num)) is not None:
+                    worker.cancel()
+                logger.debug(f'ChapterPrefetcher: cancelled prefetch of chapter {num}')
+        self._resolving &= upcoming
+
+        self._manga = manga
+        self._chapter_num = chapter_num
+        self._started = False
+
+    def is_prefetched(self, chapter_num: float) -> bool:
+        """All images of chapter are in cache"""
+        if chapter_num not in self._workers:
+            return False
+        if (worker := self._workers[chapter_num]) is None:
+            return True
+        future = worker.future
+        return future.done() and not future.cancelled() and future.exception() is None and not future.result()
+
+    def update_position(self, image_index: int, progress: float):
+        """Reading position from `MangaViewer.get_current_reading_position`"""
+        if self._manga is None or self._started:
+            return
+        chapter = self._manga._chapters_repo.get(self._chapter_num, None)
+        total = len(chapter._repo.get_all()) if chapter is not None else 0
+        if not total or (image_index + progress) / total < Config.Downloading.Chapter.prefetch_after():
+            return
+
+        self._started = True
+        for num in self._next_chapters(self._manga, self._chapter_num):
+            if num in self._workers or num in self._resolving:
+                continue
+            chapter = self._manga._chapters_repo.get(num)
+            if chapter.urls_cached and (images := chapter._repo.get_all()):
+                self._download(num, [image.metadata.url for image in images.values()])
+            else:
+                self._resolving.add(num)
+                self.sites_manager.download_manga_chapter_details(self._manga, num)
+
+    def _next_chapters(self, manga: Manga, chapter_num: float) -> list[float]:
+        """Chapters after `chapter_num` in order, numbers may be fractional or skip some"""
+        nums = sorted(num for num in manga._chapters_repo.keys() if num > chapter_num)
+        return nums[:Config.Downloading.Chapter.prefetch_chapters()]
+
+    def _download(self, num: float, urls: list[str]):
+        logger.info(f'ChapterPrefetcher: prefetching {len(urls)} images of {self._manga.name} chapter {num}')
+        self._workers[num] = self.download_manager.prefetch_manga_chapter_images(self._manga.id_, num, urls)
+
+    @Slot(str, float, list)
+    def _image_urls_downloaded(self, manga_id: str, num: float, urls: list[str]):
+        if self._manga is None or manga_id != self._manga.id_ or num not in self._resolving:
+            return
+        self._resolving.discard(num)
+        self._download(num, urls)
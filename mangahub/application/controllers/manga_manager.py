@@ -41,6 +41,7 @@ class MangaManager(QObject):
         self.download_manager.image_downloaded.connect(self._image_downloaded)
         
         self._downloading_manga = []
+        self._loading_chapter: tuple[str, float] | None = None  # Image urls of other chapters are only stored, e.g. prefetched
         
     def get(self, id_: str) -> Manga | None:
         manga = self.repo.get(id_)
@@ -64,8 +65,9 @@ class MangaManager(QObject):
             logger.error(f'Requested non-existed manga chapter: {manga} - {num}')
             return None
         
-        if chapter.urls_cached:
-            self.download_manager.download_manga_chapter_images(manga, chapter)
+        self._loading_chapter = (manga.id_, num)
+        if chapter.urls_cached and chapter._repo.get_all():
+            self.download_manager.download_manga_chapter_images(manga.id_, chapter)
         else:
             self.download_manager.download_manga_chapter_details(manga, num)
         
@@ -176,7 +178,10 @@ class MangaManager(QObject):
                     url=url
                 )
             ))
-        self.download_manager.download_manga_chapter_images(manga_id, chapter)
+        chapter.urls_cached = True
+        chapter.set_changed()
+        if self._loading_chapter == (manga_id, num):
+            self.download_manager.download_manga_chapter_images(manga_id, chapter)
 
     @Slot(str, float, int, ImageMetadata) 
     def _image_metadata_downloaded(self, manga_id: str, chapter_num: float, image_num: int, metadata: ImageMetadata):
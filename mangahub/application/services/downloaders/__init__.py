@@ -1,14 +1,25 @@
+from .download_buffer import DownloadBuffer
 from .download_manager import DownloadManager
+from .download_scheduler import RequestStats, HostLimiter, DownloadScheduler
 from .html_downloader import HtmlDownloaderWorkerSignals, HtmlDownloaderWorker, HtmlDownloaderSignals, HtmlDownloader
+from .http_client_pool import HttpClientPool
+from .image_transcoder import TranscodedImage, ImageTranscoder
 from .image_downloader import ImageDownloader, ImageDownloaderWorker, ImageDownloadManager
 from .sites_downloader import SiteUrlTypes, SitesDownloader
 
 __all__ = [
-    'DownloadManager', 
+    'DownloadBuffer', 
+	'DownloadManager', 
+	'RequestStats', 
+	'HostLimiter', 
+	'DownloadScheduler', 
 	'HtmlDownloaderWorkerSignals', 
 	'HtmlDownloaderWorker', 
 	'HtmlDownloaderSignals', 
 	'HtmlDownloader', 
+	'HttpClientPool', 
+	'TranscodedImage', 
+	'ImageTranscoder', 
 	'ImageDownloader', 
 	'ImageDownloaderWorker', 
 	'ImageDownloadManager', 
@@ -0,0 +1,41 @@
+class DownloadBuffer:
+    """
+    Byte buffer for a single download, preallocated from Content-Length.
+
+    Chunks are written in place into one `bytearray`, so the body is never
+    regrown like `BytesIO` or copied out by `getvalue()`.
+    `detach()` hands the very same `bytearray` to the transcoder or cache.
+    """
+
+    def __init__(self, size_hint: int = 0):
+        self._data = bytearray(max(0, size_hint))
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def write(self, chunk: bytes | bytearray | memoryview) -> int:
+        end = self._length + len(chunk)
+        self._data[self._length:end] = chunk  # Grows the bytearray if Content-Length was missing or wrong
+        self._length = end
+        return len(chunk)
+
+    def getbuffer(self) -> memoryview:
+        """
+        View of written bytes without copying them.
+        Must be released (or used as context manager) before next `write`, as it locks buffer size.
+        """
+        return memoryview(self._data)[: self._length]
+
+    def detach(self) -> bytearray:
+        """Returns written bytes as `bytearray` without copying, buffer is empty afterwards"""
+        data = self._data
+        if len(data) > self._length:
+            del data[self._length:]
+        self._data = bytearray()
+        self._length = 0
+        return data
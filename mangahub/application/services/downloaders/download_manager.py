@@ -1,6 +1,5 @@
 from __future__ import annotations
 import time
-from itertools import batched
 from PySide6.QtCore import Signal, QObject
 from loguru import logger
 
@@ -8,8 +7,9 @@ from core.interfaces import AbstractMedia
 from core.models.manga import Manga, MangaChapter
 from core.models.images import ImageCache, ImageMetadata
 from core.models import Url
-from .image_downloader import ImageDownloadManager
+from .image_downloader import ImageDownloadManager, ImageDownloaderWorker
 from .html_downloader import HtmlDownloader
+from utils import AsyncLoopThread
 from config import Config
 
 from typing import TYPE_CHECKING
@@ -23,6 +23,7 @@ class DownloadManager(QObject):
     # overall_image_download_progress = ImageDownloader.overall_download_progress  # len(urls), percent, current bytes, total bytes
     # image_download_progress = ImageDownloadManager.download_progress
     image_download_error = ImageDownloadManager.download_error
+    image_host_stats = Signal(str, int, int, float, float)   # host, requests in flight, concurrency limit, rtt ms, bytes/s
     images_downloaded = ImageDownloadManager.all_downloaded
     
     html_downloaded = HtmlDownloader.signals.downloaded   # url, content
@@ -43,6 +44,7 @@ class DownloadManager(QObject):
         self.image_downloader.metadata_downloaded.connect(self._image_metadata_downloaded)
         self.image_downloader.downloaded.connect(self._image_downloaded)
         self.image_downloader.all_downloaded.connect(lambda: print('IT WORKS: ', time.perf_counter() - self.dt))
+        self.image_downloader.host_stats_updated.connect(self.image_host_stats.emit)
         
         self.queue: dict[str, dict[str, list[Url]]] = {}
         self._cover_downloads: dict[str, str] = {}
@@ -72,20 +74,32 @@ class DownloadManager(QObject):
     def download_manga_chapter_details(self, manga: Manga, chapter: MangaChapter):
         self.sites_manager.download_manga_chapter_details(manga, chapter)
         
+    @staticmethod
+    def _chapter_image_names(manga_id: str, chapter_num: float, count: int) -> list[str]:
+        return [f'chap-image_{manga_id}_{str(chapter_num).replace('.', '-')}_{i}' for i in range(count)]
+        
     def download_manga_chapter_images(self, manga_id: str, chapter: MangaChapter):
         all_urls = [image.metadata.url for image in chapter._repo.get_all().values()]
         
         for num, image in chapter._repo.get_all().items():
             self._image_urls[image.metadata.url] = (manga_id, chapter.num, num)
             
-        urls_names = [(url, f'chap-image_{manga_id}_{str(chapter.num).replace('.', '-')}_{i}') for i, url in enumerate(all_urls)]
+        names = self._chapter_image_names(manga_id, chapter.num, len(all_urls))
         self.dt = time.perf_counter()
-        for batch in list(batched(urls_names, 3)):
-            urls, names = [], []
-            for url, name in batch:
-                urls.append(url)
-                names.append(name)
-            self.image_downloader.download_images_sep_thread(urls, names)
+        self.image_downloader.set_focus(0)
+        self.image_downloader.download_images_sep_thread(all_urls, names, indices=list(range(len(all_urls))))
+        
+    def prefetch_manga_chapter_images(self, manga_id: str, chapter_num: float, urls: list[str]) -> ImageDownloaderWorker | None:
+        """
+        Download chapter images into cache at background priority, without showing them.
+        Names are the same as `download_manga_chapter_images` uses, so opening the chapter later is served from cache.
+        """
+        names = self._chapter_image_names(manga_id, chapter_num, len(urls))
+        return self.image_downloader.download_images_sep_thread(urls, names, indices=list(range(len(urls))), background=True)
+        
+    def set_download_focus(self, image_index: int):
+        """Prioritize downloading pages around the one being read"""
+        self.image_downloader.set_focus(image_index)
         
     def download_html(self, name: str, url: str | Url):
         url = self._url_from_url(url)
@@ -102,18 +116,27 @@ class DownloadManager(QObject):
         return self.html_downloader.download_htmls(urls)
     
     def _image_metadata_downloaded(self, metadata: ImageMetadata):
-        manga_id, chapter_num, num = self._image_urls.get(metadata.url)
+        if metadata.url not in self._image_urls:    # Covers are not laid out anywhere
+            return
+        manga_id, chapter_num, num = self._image_urls[metadata.url]
         self.image_metadata_downloaded.emit(manga_id, chapter_num, num, metadata)
     
     def _image_downloaded(self, metadata: ImageMetadata):
         if metadata.name.startswith('cover'):
             self.cover_downloaded.emit(self._cover_downloads.pop(metadata.url), self.images_cache.pop(metadata.name))
         elif metadata.name.startswith('chap-image'):
+            if metadata.url not in self._image_urls:    # Prefetched, chapter is not opened yet
+                return
             manga_id, chapter_num, num = self._image_urls.pop(metadata.url)
             self.image_downloaded.emit(manga_id, chapter_num, num, metadata)
         else:
             logger.warning(f'Unknown image was downloaded: {metadata.url} ({metadata.name}, {metadata})')
     
+    def close(self):
+        self.image_downloader.clients.close()
+        self.image_downloader.transcoder.close()
+        AsyncLoopThread().stop()
+        
     def start(self, name: str):
         if content := self.queue.pop(name, None):
             for type_, urls in content.items():
@@ -0,0 +1,204 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+import httpx
+from loguru import logger
+
+from utils import AsyncLoopThread
+from config import Config
+
+
+CONGESTION_STATUS_CODES = (429, 503)
+
+
+@dataclass
+class RequestStats:
+    """Filled by the downloader while it holds a slot, read back by `HostLimiter.release`"""
+    started: float = 0.0
+    first_byte: float = 0.0
+    bytes: int = 0
+    ok: bool = False
+    congested: bool = False
+    header: bool = False    # Header prefetch, its few bytes would pass for low throughput
+
+    @property
+    def rtt_ms(self) -> float:
+        return (self.first_byte - self.started) * 1000 if self.first_byte else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        duration = time.perf_counter() - (self.first_byte or self.started)
+        return self.bytes / duration if duration > 0 else 0.0
+
+
+class HostLimiter:
+    """
+    AIMD limit of requests in flight to one host.
+
+    Requests are measured in windows of `limit` completed requests, about one round trip.
+    Limit grows by 1 after window whose throughput beat best one seen by `throughput_margin`, while latency stays
+    within `latency_tolerance` of the best seen one, so it stops growing once host bandwidth is saturated,
+    instead of on noise between windows. Header prefetches only count as congestion.
+    It is multiplied by `backoff_factor` on 429/503 or timeouts, at most once per round trip.
+    Waiting requests are woken in priority order. Only touch it from the `AsyncLoopThread`.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        on_update: Callable[[HostLimiter], None] | None = None,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.host = host
+        self.on_update = on_update
+        self.clock = clock
+
+        self.max_limit = Config.Downloading.Scheduler.max_concurrency()
+        self.limit = float(min(Config.Downloading.Scheduler.initial_concurrency(), self.max_limit))
+        self.backoff_factor = Config.Downloading.Scheduler.backoff_factor()
+        self.latency_tolerance = Config.Downloading.Scheduler.latency_tolerance()
+        self.throughput_margin = Config.Downloading.Scheduler.throughput_margin()
+
+        self.in_flight = 0
+        self.rtt_ms = 0.0
+        self.min_rtt_ms = float('inf')
+        self.bytes_per_second = 0.0
+
+        self._waiters: list[tuple[tuple, int, asyncio.Future]] = []  # priority, seq, future
+        self._seq = itertools.count()
+        self._last_decrease = 0.0
+        self._reset_window(self.clock())
+        self._best_throughput = 0.0     # Bytes/s of best window since limit was last lowered
+
+    def _has_capacity(self) -> bool:
+        return self.in_flight < max(1, int(self.limit))
+
+    async def acquire(self, priority: tuple):
+        if self._has_capacity() and not self._waiters:
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():  # Slot was granted right before cancellation
+                self.in_flight -= 1
+                self._wake()
+            raise
+
+    def release(self, stats: RequestStats):
+        self.in_flight -= 1
+        if stats.congested:
+            self._decrease()
+        elif stats.ok and stats.first_byte and not stats.header:
+            self._increase(stats)
+        self._wake()
+        if self.on_update:
+            self.on_update(self)
+
+    def reprioritize(self, key: Callable[[tuple], tuple]):
+        """Recompute priorities of all waiting requests"""
+        self._waiters = [
+            (key(priority), seq, future) for priority, seq, future in self._waiters if not future.done()
+        ]
+        heapq.heapify(self._waiters)
+
+    def _increase(self, stats: RequestStats):
+        rtt = stats.rtt_ms
+        self.rtt_ms = rtt if not self.rtt_ms else self.rtt_ms * .8 + rtt * .2
+        self.min_rtt_ms = min(self.min_rtt_ms, rtt)
+        bps = stats.bytes_per_second
+        self.bytes_per_second = bps if not self.bytes_per_second else self.bytes_per_second * .8 + bps * .2
+
+        self._window_bytes += stats.bytes
+        self._window_requests += 1
+        if self._window_requests < int(self.limit):
+            return
+        now = self.clock()
+        throughput = self._window_bytes / (now - self._window_start) if now > self._window_start else 0.0
+        if throughput > self._best_throughput * self.throughput_margin and rtt <= self.min_rtt_ms * self.latency_tolerance:
+            self.limit = min(self.max_limit, self.limit + 1)
+        self._best_throughput = max(self._best_throughput, throughput)
+        self._reset_window(now)
+
+    def _reset_window(self, now: float):
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_requests = 0
+
+    def _decrease(self):
+        now = self.clock()
+        if (now - self._last_decrease) * 1000 < self.rtt_ms:  # Already backed off during this round trip
+            return
+        self._last_decrease = now
+        self.limit = max(1., self.limit * self.backoff_factor)
+        self._best_throughput = 0.0     # Probed again from lowered limit
+        self._reset_window(now)
+        logger.warning(f'Host {self.host} is congested, concurrency limit lowered to {int(self.limit)}')
+
+    def _wake(self):
+        while self._waiters and self._has_capacity():
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():   # Cancelled while waiting
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+
+class DownloadScheduler:
+    """
+    Orders image requests and limits them per host with `HostLimiter`.
+
+    Requests are prioritized by `(is background, distance from focus index)`,
+    so pages near the reader's current position are downloaded first.
+    """
+
+    def __init__(self, on_update: Callable[[HostLimiter], None] | None = None):
+        self.on_update = on_update
+        self.focus = 0
+        self._limiters: dict[str, HostLimiter] = {}
+
+    def _limiter(self, url: str) -> HostLimiter:
+        host = httpx.URL(url).host
+        if not (limiter := self._limiters.get(host)):
+            limiter = HostLimiter(host, self.on_update)
+            self._limiters[host] = limiter
+        return limiter
+
+    def _priority(self, index: int, background: bool) -> tuple:
+        return (background, abs(index - self.focus), index)
+
+    @asynccontextmanager
+    async def slot(self, url: str, index: int = 0, background: bool = False, header: bool = False):
+        limiter = self._limiter(url)
+        await limiter.acquire(self._priority(index, background))
+
+        stats = RequestStats(started=time.perf_counter(), header=header)
+        try:
+            yield stats
+            stats.ok = True
+        except httpx.HTTPStatusError as e:
+            stats.congested = e.response.status_code in CONGESTION_STATUS_CODES
+            raise
+        except httpx.TimeoutException:
+            stats.congested = True
+            raise
+        finally:
+            limiter.release(stats)
+
+    def set_focus(self, index: int):
+        """Thread-safe. Requests closer to `index` will be started first"""
+        AsyncLoopThread().call_soon(self._set_focus, index)
+
+    def _set_focus(self, index: int):
+        self.focus = index
+        for limiter in self._limiters.values():
+            limiter.reprioritize(lambda priority: self._priority(priority[2], priority[0]))
@@ -1,24 +1,25 @@
 import asyncio
+from concurrent.futures import Future
 import httpx
-import io
 import time
 from pathlib import Path
 import logging
-from PySide6.QtCore import QObject, QThreadPool, QRunnable, Signal, QUrl, Slot
-from PIL import Image
+from PySide6.QtCore import QObject, Signal, QUrl, Slot
 import tenacity
 from loguru import logger
 
 from core.models.images import ImageMetadata, ImageCache
-from utils import ThreadingManager
+from utils import AsyncLoopThread
+from utils.image_dimensions import HeaderSniffer
+from .download_buffer import DownloadBuffer
+from .http_client_pool import HttpClientPool
+from .download_scheduler import DownloadScheduler, HostLimiter
+from .image_transcoder import ImageTranscoder
 from config import Config
 
 
-try:
-    jxl_supported = 'JXL' in Image.registered_extensions().values()  # TODO: Make it global state
-    jxl_supported = True
-except Exception:
-    pass
+HEADER_SNIFF_LIMIT = 64 * 1024  # Give up looking for dimensions after this many bytes, they will come from transcoder
+
 
 class ImageDownloader(QObject):
     """
@@ -30,89 +31,139 @@ class ImageDownloader(QObject):
     download_finished = Signal(ImageMetadata)
     download_error = Signal(str, str, tuple)
     
-    def __init__(self, client: httpx.AsyncClient, cache: ImageCache):
+    def __init__(
+        self,
+        cache: ImageCache,
+        clients: HttpClientPool | None = None,
+        scheduler: DownloadScheduler | None = None,
+        transcoder: ImageTranscoder | None = None,
+    ):
         super().__init__()
-        self.client = client
+        self.clients = clients or HttpClientPool()
+        self.scheduler = scheduler or DownloadScheduler()
+        self.transcoder = transcoder or ImageTranscoder(processes=0)
         self.cache = cache
         
+    async def _download_image_header(self, url, name, index=0, background=False) -> bool:
+        """
+        Fetch only the start of an image with a Range request and emit `metadata_downloaded`.
+        Servers that ignore Range answer with the whole body, then it is dropped after the header.
+
+        Returns:
+            bool: True if dimensions were found
+        """
+        sniffer = HeaderSniffer(Config.Downloading.Image.header_prefetch_size().bytes_value)
+        total_size = 0
+        try:
+            async with (
+                self.scheduler.slot(url, index, background, header=True) as stats,
+                self.clients.get(url).stream('GET', url, headers={'Range': f'bytes=0-{sniffer.limit - 1}'}) as response,
+            ):
+                stats.first_byte = time.perf_counter()
+                response.raise_for_status()
+                
+                if response.status_code == 206:
+                    total_size = response.headers.get('Content-Range', '').rpartition('/')[2]
+                    total_size = int(total_size) if total_size.isdigit() else 0
+                else:
+                    total_size = int(response.headers.get('Content-Length', 0))
+                    
+                async for chunk in response.aiter_bytes():
+                    stats.bytes += len(chunk)
+                    if sniffer.feed(chunk) or sniffer.done:
+                        break
+        except Exception as e:
+            logger.debug(f"Could not prefetch header of {url}, dimensions will come with the image: {e}")
+            return False
+        
+        if not sniffer.dimensions:
+            return False
+        width, height = sniffer.dimensions
+        self.metadata_downloaded.emit(ImageMetadata(
+            url=url, name=name, width=width, height=height, size=total_size, format=sniffer.format
+        ))
+        return True
+    
     @tenacity.retry(
         stop=tenacity.stop_after_attempt(Config.Downloading.max_retries()),
         wait=tenacity.wait_fixed(Config.Downloading.min_wait_time()),
         reraise=True,
     )
-    async def _download_and_process_single_image(self, url, name):
-        image_buffer = io.BytesIO()
+    async def _download_and_process_single_image(self, url, name, index=0, background=False, sniff_header=True):
         downloaded_bytes = 0
         prev_downloaded_bytes = 0
         diff_bytes = 0
         total_size = 0
         width, height = 0, 0
-        metadata_emited = False
+        metadata_emited = not sniff_header  # Already emitted from prefetched header
         
         # dt = time.perf_counter()
         try:
-            async with self.client.stream('GET', url) as response:
+            async with (
+                self.scheduler.slot(url, index, background) as stats,
+                self.clients.get(url).stream('GET', url) as response,
+            ):
+                stats.first_byte = time.perf_counter()
                 response.raise_for_status()
                 
                 if content_length := response.headers.get('Content-Length'):
                     total_size = int(content_length)
+                buffer = DownloadBuffer(total_size)
+                sniffer = HeaderSniffer(HEADER_SNIFF_LIMIT)
+                source_hasher = self.cache.hasher()  # Fed while downloading, so known images skip conversion
                     
                 async for chunk in response.aiter_bytes(Config.Downloading.Image.chunk_size().bytes_value):
-                    bytes_written = image_buffer.write(chunk)
-                    downloaded_bytes += bytes_written
+                    downloaded_bytes += buffer.write(chunk)
+                    source_hasher.update(chunk)
+                    stats.bytes = downloaded_bytes
                     diff_bytes = downloaded_bytes - prev_downloaded_bytes
-                    prev_downloaded_bytes = 0
+                    prev_downloaded_bytes = downloaded_bytes
                     
-                    if not metadata_emited and downloaded_bytes > 0:
-                        try:
-                            img_temp = Image.open(image_buffer)
-                            img_temp.verify()
-                            width, height = img_temp.size
-                            self.metadata_downloaded.emit(ImageMetadata(
-                                url=url, name=name, width=width, height=height, size=total_size, format=img_temp.format
-                            ))
-                            metadata_emited = True
-                        except Exception:
-                            pass
+                    # Dimensions are usually known within first 1-4KB, long before the body is downloaded
+                    if not metadata_emited and (dimensions := sniffer.feed(chunk)):
+                        width, height = dimensions
+                        self.metadata_downloaded.emit(ImageMetadata(
+                            url=url, name=name, width=width, height=height, size=total_size, format=sniffer.format
+                        ))
+                        metadata_emited = True
                         
                     percent = (downloaded_bytes / total_size * 100) if total_size > 0 else 0
                     self.download_progress.emit(url, name, percent, downloaded_bytes, diff_bytes, total_size)
-            # print('Downloading: ', time.perf_counter() - dt)
+            original_image = buffer.detach()
+            source_hash = source_hasher.hexdigest()
+            
+            # Same image was already converted (credit page, mirror), reuse its blob
+            if (converted := self.cache.find_source(source_hash)) is not None:
+                metadata = converted.model_copy(update={'url': url, 'name': name + converted.format, 'cached_path': ''})
+                if self.cache.link(metadata.name, metadata):
+                    logger.debug(f"{url} is already cached as {converted.name}, not converting it again")
+                    if not metadata_emited:
+                        self.metadata_downloaded.emit(ImageMetadata(
+                            url=url, name=name, width=metadata.width, height=metadata.height, size=len(original_image)
+                        ))
+                    self.download_finished.emit(metadata)
+                    return
+            
             # --- Image Optimization ---
-            image_buffer.seek(0)
-            original_image_bytes = image_buffer.getvalue()
-
             try:
-                img = Image.open(io.BytesIO(original_image_bytes)).convert('RGB')   # TODO: Conversion helped greatly, but playing with it may improve perf even more
+                image = await self.transcoder.transcode(original_image)
             except Exception as e:
                 raise ValueError(f"Could not open image from downloaded data: {e}")
             if not metadata_emited:
-                width, height = img_temp.size
                 self.metadata_downloaded.emit(ImageMetadata(
-                    url=url, name=name, width=img.width, height=img.height, size=len(original_image_bytes), format=img_temp.format
-                ))
-            # dt = time.perf_counter()
-            optimized_image_buffer = io.BytesIO()
-            format_to_save = '.webp'
-            
-            if jxl_supported:
-                try:
-                    img.save(optimized_image_buffer, format='JXL', lossless=True, effort=1) # TODO: Tweak params
-                    format_to_save = '.jxl'
-                except Exception:
-                    img.save(optimized_image_buffer, format='WEBP', lossless=True, method=6, quality=100)
-            else:
-                img.save(optimized_image_buffer, format='WEBP', lossless=True, method=6, quality=100)
-            # print('Save: ', time.perf_counter() - dt)
-            name = name + format_to_save
-            self.cache.add(name, optimized_image_buffer.getvalue())
-            self.download_finished.emit(ImageMetadata(
-                    url=url, name=name, width=img.width, height=img.height, size=len(optimized_image_buffer.getvalue()), format=format_to_save
+                    url=url, name=name, width=image.width, height=image.height, size=len(original_image)
                 ))
-        
+            del original_image  # Raw download is not needed anymore, free it before caching
+
+            metadata = ImageMetadata(
+                url=url, name=name + image.extension, width=image.width, height=image.height, size=len(image.data),
+                format=image.extension, source_hash=source_hash,
+            )
+            self.cache.add(metadata.name, image.data, metadata)
+            self.download_finished.emit(metadata)
             
         except httpx.HTTPStatusError as e:
-            error_msg = f"HTTP error {e.response.status_code} for {url}: {e.response.text}"
+            error_msg = f"HTTP error {e.response.status_code} for {url}: {e.response.reason_phrase}"
             logger.error(error_msg)
             raise # Re-raise for tenacity to handle retries
         except httpx.RequestError as e:
@@ -125,17 +176,29 @@ class ImageDownloader(QObject):
             raise # Re-raise for tenacity to handle retries
         
 
-class ImageDownloaderWorker(QRunnable):
+class ImageDownloaderWorker:
     """
-    QRunnable to execute ImageDownloader tasks in a separate thread.
+    Batch of image downloads, executed as one coroutine on the shared `AsyncLoopThread`.
+    All workers share `HttpClientPool`, so they reuse the same connections.
     """
-    def __init__(self, client: httpx.AsyncClient, cache: ImageCache, urls: list[str], names: list[str]):
-        super().__init__()
-        self.client = client
+    def __init__(
+        self,
+        cache: ImageCache,
+        urls: list[str],
+        names: list[str],
+        clients: HttpClientPool | None = None,
+        scheduler: DownloadScheduler | None = None,
+        transcoder: ImageTranscoder | None = None,
+        indices: list[int] | None = None,
+        background: bool = False,
+    ):
         self.urls = urls
         self.names = names
+        self.indices = indices or list(range(len(urls)))
+        self.background = background
         # ImageDownloader instance will emit signals
-        self.downloader = ImageDownloader(client, cache)
+        self.downloader = ImageDownloader(cache, clients, scheduler, transcoder)
+        self.future: Future | None = None
 
         # We don't connect signals directly here, but expose them for the Main Window
         # The MainWindow will connect to these signals
@@ -144,31 +207,43 @@ class ImageDownloaderWorker(QRunnable):
         self.download_finished = self.downloader.download_finished
         self.download_error = self.downloader.download_error
         
-    @Slot()
-    def run(self):
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            
+    def start(self) -> Future:
+        self.future = AsyncLoopThread().submit(self.run())
+        return self.future
+    
+    def cancel(self):
+        """Stop downloads that are not finished yet, finished images stay cached"""
+        if self.future is not None:
+            self.future.cancel()
+        
+    async def run(self) -> list[str]:
+        """Urls that failed to download"""
         try:
-            tasks = [self.downloader._download_and_process_single_image(url, name)
-                     for url, name in zip(self.urls, self.names)]
+            header_known = [False] * len(self.urls)
+            if Config.Downloading.Image.prefetch_headers():
+                header_known = await asyncio.gather(*(
+                    self.downloader._download_image_header(url, name, index, self.background)
+                    for url, name, index in zip(self.urls, self.names, self.indices)
+                ))
+                
+            tasks = [self.downloader._download_and_process_single_image(url, name, index, self.background, not known)
+                     for url, name, index, known in zip(self.urls, self.names, self.indices, header_known)]
             
-            results = loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            results = await asyncio.gather(*tasks, return_exceptions=True)
             
-            for i, result in enumerate(results):
+            failed = []
+            for url, result in zip(self.urls, results):
                 if isinstance(result, Exception):
-                    logger.error(f"Task for {self.urls[i]} failed in worker: {result}")
+                    logger.error(f"Task for {url} failed in worker: {result}")
+                    self.download_error.emit(url, str(result), (type(result), str(result)))
+                    failed.append(url)
+            return failed
             
         except Exception as e:
-            logger.critical(f"ImageDownloaderWorker: Unhandled exception in worker thread for URLs {self.urls}: {e}", exc_info=True)
+            logger.critical(f"ImageDownloaderWorker: Unhandled exception in worker for URLs {self.urls}: {e}", exc_info=True)
             for url in self.urls: # Fallback to emit error for all URLs if a critical error
-                self.downloader.download_error.emit(url, f"Critical internal error: {e}")
-                
-        finally:
-            loop.close()
+                self.download_error.emit(url, f"Critical internal error: {e}", (type(e), str(e)))
+            return list(self.urls)
             
 
 class ImageDownloadManager(QObject):
@@ -176,40 +251,96 @@ class ImageDownloadManager(QObject):
     downloaded = Signal(ImageMetadata)
     download_error = Signal(str, str, tuple)
     overall_progress = Signal(str, str, float, int, int, int)
+    host_stats_updated = Signal(str, int, int, float, float)  # host, requests in flight, concurrency limit, rtt ms, bytes/s
     all_downloaded = Signal()
     
     def __init__(self, cache: ImageCache):
         super().__init__()
         self.cache = cache
-        self.thread_pool = QThreadPool(maxThreadCount=Config.Downloading.Image.max_threads())
+        self.clients = HttpClientPool()
+        self.scheduler = DownloadScheduler(self._host_stats_updated)
+        self.transcoder = ImageTranscoder()
+        self._pending = 0
+        
+    def _host_stats_updated(self, limiter: HostLimiter):
+        self.host_stats_updated.emit(
+            limiter.host, limiter.in_flight, int(limiter.limit), limiter.rtt_ms, limiter.bytes_per_second
+        )
         
     def _add_to_overall_progress(self, url, name, percent, downloaded, diff, total):
         pass
     
-    def _image_downloaded(self, metadata: ImageMetadata):
-        if not self.thread_pool.activeThreadCount():
+    def _image_finished(self, metadata: ImageMetadata):
+        self.downloaded.emit(metadata)
+        self._image_done()
+    
+    def _image_failed(self, url: str, message: str, exc: tuple):
+        self.download_error.emit(url, message, exc)
+        self._image_done()
+    
+    def _image_done(self, *_):
+        self._pending = max(0, self._pending - 1)
+        if not self._pending:
             self.all_downloaded.emit()
     
-    def download_images_sep_thread(self, urls: list[str], names: list[str]=None, cache: ImageCache=None) -> ImageDownloaderWorker:
+    def set_focus(self, index: int):
+        """Download pages closest to `index` first"""
+        self.scheduler.set_focus(index)
+    
+    def download_images_sep_thread(
+        self,
+        urls: list[str],
+        names: list[str]=None,
+        cache: ImageCache=None,
+        indices: list[int]=None,
+        background: bool=False,
+    ) -> ImageDownloaderWorker | None:
         """
-        Downloads a list of images in separate threads.
+        Downloads a list of images on the shared download loop.
+        Images already in cache are emitted right away.
 
         Args:
             urls: list of URLs to download
             names: list of names to associate with the downloaded images (optional)
             cache: cache to store the downloaded images (optional)
+            indices: page indices used to order requests around the focus (optional)
+            background: if True, requests are started only when no foreground ones are waiting,
+                they do not count towards `all_downloaded`, so worker can be cancelled
 
         Returns:
-            ImageDownloaderWorker: worker object that can be used to track the progress
+            ImageDownloaderWorker: worker object that can be used to track the progress, None if everything was cached
         """
-        client = httpx.AsyncClient(timeout=10, follow_redirects=True)
-        worker = ImageDownloaderWorker(client, cache or self.cache, urls, names or urls)
-        worker.setAutoDelete(True)
+        if isinstance(urls, str):
+            urls = [urls]
+        if isinstance(names, str):
+            names = [names]
+        cache = cache or self.cache
+        names = names or urls
+        indices = indices or list(range(len(urls)))
+        finished, failed = (self.downloaded.emit, self.download_error.emit) if background else (self._image_finished, self._image_failed)
+        if not background:
+            self._pending += len(urls)
+        
+        # Images cached in this or previous sessions are served without touching the network
+        to_download = []
+        for url, name, index in zip(urls, names, indices):
+            metadata = cache.find(url)
+            if metadata is not None and metadata.name.rpartition('.')[0] == name:
+                self.metadata_downloaded.emit(metadata)
+                finished(metadata)
+            else:
+                to_download.append((url, name, index))
+        if not to_download:
+            return None
+        
+        urls, names, indices = map(list, zip(*to_download))
+        worker = ImageDownloaderWorker(
+            cache, urls, names, self.clients, self.scheduler, self.transcoder, indices, background
+        )
         worker.metadata_downloaded.connect(self.metadata_downloaded.emit)
-        worker.download_finished.connect(self.downloaded.emit)
-        worker.download_finished.connect(self._image_downloaded)
-        worker.download_error.connect(self.download_error.emit)
-        self.thread_pool.start(worker)
+        worker.download_finished.connect(finished)  # One slot, so `downloaded` always comes before `all_downloaded`
+        worker.download_error.connect(failed)
+        worker.start()
         return worker
 
 # cache = ImageCache(Config.Dirs.CACHE.IMAGES, 0)
@@ -0,0 +1,60 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pydantic import BaseModel
+from loguru import logger
+
+from utils.image_conversion import transcode_image
+from config import Config
+
+
+class TranscodedImage(BaseModel):
+    data: bytes
+    extension: str
+    width: int
+    height: int
+
+
+class ImageTranscoder:
+    """
+    Converts downloaded images into cache format in a `ProcessPoolExecutor`,
+    so encoding never holds the GIL of the download loop.
+
+    At most `queue_size` images wait for (or are in) conversion at once;
+    when it is full, `transcode` waits, which pushes back on downloaders.
+    With `processes=0` images are converted inline, blocking the loop.
+    """
+
+    def __init__(self, processes: int | None = None, queue_size: int | None = None, preferable_format: str | None = None):
+        self.processes = Config.Downloading.Image.transcode_processes() if processes is None else processes
+        self.queue_size = queue_size or Config.Downloading.Image.transcode_queue_size()
+        self.preferable_format = preferable_format or Config.Downloading.Image.preferable_format()
+
+        self._pool: ProcessPoolExecutor | None = None
+        self._queue: asyncio.Semaphore | None = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:  # Lazy, so processes are spawned only when something is downloaded
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )   # Forking process that already runs Qt and loop threads may deadlock the child
+            logger.info(f'ImageTranscoder: started {self.processes} processes')
+        return self._pool
+
+    async def transcode(self, image_data: bytes | bytearray) -> TranscodedImage:
+        if not self.processes:
+            data, extension, width, height = transcode_image(image_data, self.preferable_format)
+        else:
+            if self._queue is None:
+                self._queue = asyncio.Semaphore(self.queue_size)
+            async with self._queue:
+                data, extension, width, height = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, transcode_image, image_data, self.preferable_format
+                )
+        return TranscodedImage(data=data, extension=extension, width=width, height=height)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
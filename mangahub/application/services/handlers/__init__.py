@@ -2,10 +2,12 @@ from .file_handler import FileHandler
 from .html_handler import HtmlHandler
 from .json_handler import JsonHandler
 from .md_handler import MdHandler
+from .model_store import ModelStore
 
 __all__ = [
     'FileHandler', 
 	'HtmlHandler', 
 	'JsonHandler', 
-	'MdHandler',
+	'MdHandler', 
+	'ModelStore',
 ]
\ No newline at end of file
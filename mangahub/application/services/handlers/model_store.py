@@ -0,0 +1,113 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+
+
+class ModelStore:
+    """
+    Models of all collections, stored as json in one sqlite database in WAL mode.
+
+    Collection is what used to be one json file, e.g. chapters of one manga, rows keep order they were added in.
+    Writes are batched, `transaction()` can be nested and only outermost one commits,
+    so saving whole library is one commit. Thread-safe.
+    """
+
+    _stores: dict[Path, "ModelStore"] = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS models (
+                collection TEXT NOT NULL,
+                key TEXT NOT NULL,
+                data TEXT NOT NULL,
+                UNIQUE (collection, key)
+            );
+            CREATE TABLE IF NOT EXISTS collections (
+                name TEXT PRIMARY KEY
+            ) WITHOUT ROWID;
+            """
+        )
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    @classmethod
+    def open(cls, path: Path) -> "ModelStore":
+        """Store shared by everything using database at `path`"""
+        path = Path(path).resolve()
+        with cls._stores_lock:
+            if path not in cls._stores:
+                cls._stores[path] = cls(path)
+            return cls._stores[path]
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                if self._depth == 1:
+                    self._connection.rollback()
+                raise
+            else:
+                if self._depth == 1:
+                    self._connection.commit()
+            finally:
+                self._depth -= 1
+
+    def has_collection(self, collection: str) -> bool:
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM collections WHERE name = ?", (collection,)).fetchone() is not None
+
+    def keys(self, collection: str) -> list[str]:
+        with self._lock:
+            return [key for key, in self._connection.execute(
+                "SELECT key FROM models WHERE collection = ? ORDER BY rowid", (collection,)
+            )]
+
+    def get(self, collection: str, key: str) -> str | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM models WHERE collection = ? AND key = ?", (collection, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_all(self, collection: str) -> list[tuple[str, str]]:
+        """(key, data) in order they were added"""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT key, data FROM models WHERE collection = ? ORDER BY rowid", (collection,)
+            ).fetchall()
+
+    def put(self, collection: str, rows: Iterable[tuple[str, str]]):
+        """Insert or update (key, data), updated rows keep their place"""
+        with self.transaction():
+            self._connection.execute("INSERT OR IGNORE INTO collections (name) VALUES (?)", (collection,))
+            self._connection.executemany(
+                "INSERT INTO models (collection, key, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (collection, key) DO UPDATE SET data = excluded.data",
+                ((collection, key, data) for key, data in rows),
+            )
+
+    def delete(self, collection: str, keys: Iterable[str]):
+        with self.transaction():
+            self._connection.executemany(
+                "DELETE FROM models WHERE collection = ? AND key = ?", ((collection, key) for key in keys)
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+        with self._stores_lock:
+            if self._stores.get(self.path.resolve()) is self:
+                del self._stores[self.path.resolve()]
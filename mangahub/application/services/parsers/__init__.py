@@ -1,11 +1,13 @@
 from .models_json_parser import ModelsJsonParser
 from .model_json_parser import ModelJsonParser
+from .models_sqlite_parser import ModelsSqliteParser
 from .tag_models_json_parser import TagModelsJsonParser
 from .url_parser import UrlParser
 
 __all__ = [
     'ModelsJsonParser', 
 	'ModelJsonParser', 
+	'ModelsSqliteParser', 
 	'TagModelsJsonParser', 
 	'UrlParser',
 ]
\ No newline at end of file
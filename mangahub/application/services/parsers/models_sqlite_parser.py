@@ -0,0 +1,140 @@
+from __future__ import annotations
+import typing
+from pathlib import Path
+
+import ujson as json
+from loguru import logger
+
+from application.services.handlers import JsonHandler, ModelStore
+from config import Config
+from core.models.tags import TagModel
+
+
+class ModelsSqliteParser[KT, MT: TagModel]:
+    """
+    Same collection as `ModelsJsonParser`, stored in `ModelStore` instead of rewriting json file on every save.
+
+    `file` names collection, and json file of it, if any, is imported once.
+    Models are loaded on demand, `save` writes only added, removed and `_changed` models, in one transaction.
+    """
+
+    def __init__(self, file: Path | str, model: type[MT], key_type: type[KT], store: ModelStore | None = None):
+        self.file = Path(file) if str(file).endswith('.json') else Path(f'{file}.json')
+        self.model = model
+        self.key_type = key_type
+        self.store = store or ModelStore.open(Config.Dirs.DATA.LIBRARY)
+        self.collection = self._collection_name(self.file)
+        self._models_collection: dict[KT, MT] = {}
+        self._stored_keys: dict[KT, None] | None = None     # Lazily, ordered
+        self._dirty: dict[KT, None] = {}    # Added since last save, written even if not `_changed`
+        self._removed: set[KT] = set()
+        self._import_json()
+
+    @staticmethod
+    def _collection_name(file: Path) -> str:
+        """Path relative to data dir, so data dir can be moved"""
+        data, file = Config.Dirs.DATA.dir.resolve(), file.resolve()
+        return (file.relative_to(data) if file.is_relative_to(data) else file).as_posix()
+
+    def _import_json(self):
+        if self.store.has_collection(self.collection) or not self.file.exists():
+            return
+        data = JsonHandler(self.file).load()
+        self.store.put(self.collection, ((str(self.key_type(name)), json.dumps(model)) for name, model in data.items()))
+        logger.info(f"Imported {len(data)} models of {self.file}")
+
+    @property
+    def stored_keys(self) -> dict[KT, None]:
+        if self._stored_keys is None:
+            self._stored_keys = dict.fromkeys(map(self.key_type, self.store.keys(self.collection)))
+        return self._stored_keys
+
+    def keys(self) -> list[KT]:
+        keys = [name for name in self.stored_keys if name not in self._removed]
+        return keys + [name for name in self._dirty if name not in self.stored_keys]
+
+    def add(self, name: KT, model: MT) -> typing.Self:
+        name = self.key_type(name)
+        self._models_collection[name] = model
+        self._dirty[name] = None
+        self._removed.discard(name)
+        return self
+
+    def get(self, name: KT, default=None) -> MT | None:
+        name = self.key_type(name)
+        if name in self._models_collection:
+            return self._models_collection[name]
+
+        if name not in self._removed and (data := self.store.get(self.collection, str(name))) is not None:
+            model = self.model.model_validate_json(data)
+            self._models_collection[name] = model
+            return model
+        logger.warning(
+            f"Model not found: {self.model}({name})\ncollection: {self.collection}\nkey type: {self.key_type}\nname type: {type(name)}"
+        )
+        return default
+
+    def get_i(self, index: int, default=None) -> MT:
+        keys = self.keys()
+        if index < 0:
+            index = len(keys) + index
+        if index < 0 or index >= len(keys):
+            if default == 'err':
+                raise IndexError(f'Index is out of range. Index: {index}, max: {len(keys)}')
+            return default
+        return self.get(keys[index])
+
+    def pop(self, name: KT) -> MT:
+        name = self.key_type(name)
+        model = self.get(name)
+        self._models_collection.pop(name, None)
+        self._dirty.pop(name, None)
+        if name in self.stored_keys:
+            self._removed.add(name)
+        return model
+
+    def get_all(self) -> dict[KT, MT]:
+        keys = self.keys()
+        if len(self._models_collection) < len(keys):    # One query for all not loaded yet
+            for name, data in self.store.get_all(self.collection):
+                name = self.key_type(name)
+                if name not in self._models_collection and name not in self._removed:
+                    self._models_collection[name] = self.model.model_validate_json(data)
+        self._models_collection = {name: self.get(name) for name in keys}   # In order, through `get` of repository
+        return self._models_collection
+
+    @property
+    def models_collection(self) -> dict[KT, MT]:
+        return self.get_all()
+
+    @models_collection.setter
+    def models_collection(self, models_dict: dict[KT, MT]):
+        for name in self.keys():
+            if name not in models_dict:
+                self.pop(name)
+        for name, model in models_dict.items():
+            self.add(name, model)
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def __str__(self) -> str:
+        return f'ModelsSqliteParser: collection: {self.collection}, length: {len(self)}'
+
+    def save(self):
+        changed = {
+            name: model for name, model in self._models_collection.items() if name in self._dirty or model._changed
+        }
+        if not changed and not self._removed:
+            return
+        with self.store.transaction():
+            self.store.delete(self.collection, map(str, self._removed))
+            self.store.put(self.collection, ((str(name), model.model_dump_json()) for name, model in changed.items()))
+
+        for model in changed.values():
+            model.set_changed(False)
+        for name in self._removed:
+            self.stored_keys.pop(name, None)
+        self.stored_keys.update(dict.fromkeys(self._dirty))
+        self._dirty.clear()
+        self._removed.clear()
@@ -1,5 +1,6 @@
 import time
-import io
+from concurrent.futures import Future
+from typing import Callable
 from PySide6.QtCore import QObject, Signal
 import numpy as np
 from PIL import Image
@@ -12,19 +13,45 @@ from core.models.images import (
     PanelDetectionResult,
     ImageMetadata,
     ImageCache,
+    PanelResultIndex,
+    PageBuffer,
+    PageBuffers,
 )
 
-from utils import ThreadingManager
+from utils import ThreadingManager, Worker
+from utils.image_conversion import MemoryReader
 from config import Config
 
 
+BACKGROUND_LUMINANCE = 240  # Pixels lighter than this are gutter background
+EDGE_DECIMATION = 4         # Edge detection runs on every 4th row and column
+EDGE_PERCENTILE = 90        # Rows with stronger edges are boundary candidates
+EDGE_CONTRAST = 4.0         # Edge this many times stronger than average row is boundary even without gutter
+DETECTOR_VERSION = 2        # Bump when detection changes, so results stored by older detector are not used
+
+
 class ContentAwareTileManager(QObject):
-    """Manages tile creation with content-aware and fallback strategies"""
+    """
+    Manages tile creation with content-aware and fallback strategies.
+
+    With `panel_index`, detection results are stored by content of the image, so pages analyzed before
+    (in any session, under any name) get content-aware strips at once, without decoding.
+    Content is identified by `ImageCache.content_key` if `image_cache` knows the image, by hash of its bytes otherwise.
+    With `pages`, pages are analyzed from the `PageBuffer` strips are cut from, so they are decoded once for both.
+    """
 
     strips_generated = Signal(str, list)  # image_name, list[StripInfo]
 
-    def __init__(self):
+    def __init__(
+        self,
+        image_cache: ImageCache | None = None,
+        panel_index: PanelResultIndex | None = None,
+        pages: PageBuffers | None = None,
+    ):
         super().__init__()
+        self.image_cache = image_cache
+        self.panel_index = panel_index
+        self.pages = pages
         self.min_strip_height = Config.Performance.MangaViewer.min_strip_height()
         self.max_strip_height = Config.Performance.MangaViewer.max_strip_height()
         self.detection_confidence_threshold = (
@@ -33,153 +60,255 @@ class ContentAwareTileManager(QObject):
         self.strip_mode = (
             Config.Performance.MangaViewer.strip_mode()
         )  # "uniform", "content_aware", "adaptive"
+        self._analyzing: dict[str, Worker] = {}     # Image name -> its analysis, kept alive until it reports back
+        if self.panel_index is not None:
+            self.panel_index.prune(self.detector_version)
 
     def generate_strips(self, metadata: ImageMetadata):
         return self._create_uniform_strips(metadata)
 
-    def analyze_panel_async(self, metadata: ImageMetadata, img_bytes: bytes):
-        """Start background panel analysis"""
+    @property
+    def detector_version(self) -> str:
+        """Detector and settings results depend on"""
+        return ":".join(map(str, (
+            DETECTOR_VERSION,
+            Config.Performance.MangaViewer.gutter_threshold(),
+            Config.Performance.MangaViewer.min_gutter_height(),
+            self.min_strip_height,
+        )))
+
+    def analyze_panel_async(self, metadata: ImageMetadata, image: bytes | Future | Callable[[], bytes | Future]):
+        """
+        Start background panel analysis, strips of already analyzed images are emitted at once.
+        `image` may be callable, it is only called by worker, so image is not read if result is stored.
+        """
         if self.strip_mode in (
             "content_aware",
             "adaptive",
         ):  # TODO: Strip mode setting should be enum
-            worker = ThreadingManager.run(
+            key = self.image_cache.content_key(metadata.name) if self.image_cache is not None else None
+            if key is not None and (result := self._stored_result(key)) is not None:
+                self._create_context_aware_strips(metadata, result)
+                return None
+
+            if metadata.name in self._analyzing:    # Page bound again before its analysis is done
+                return None
+            if self.pages is not None:  # Held until analysis is done, strips are cut from the same decode
+                image = self.pages.acquire(metadata.name, image, key)
+
+            worker = Worker(
+                f"panel_analysis_{metadata.name}",
                 self._analyze_panel_worker,
-                img_bytes,
-                name=f"panel_analysis_{metadata.name}",
+                image,
+                key,
             )
             worker.signals.success.connect(
-                lambda name, result: self._create_context_aware_strips(
-                    metadata, result
-                    )
+                lambda name, result: self._on_analyzed(metadata, result)
                 )
             worker.signals.error.connect(
-                lambda name, e: logger.error(e)
+                lambda name, e: self._on_analysis_error(metadata, e)
             )
+            self._analyzing[metadata.name] = worker
+            ThreadingManager.run_worker(worker, worker.name)  # Connected before start, so fast analysis can not finish unnoticed
             return worker
         return None
 
-    def _analyze_panel_worker(
-        self, img_bytes: bytes
-    ) -> PanelDetectionResult:
-        try:
-            start_time = time.perf_counter()
+    def _on_analyzed(self, metadata: ImageMetadata, result: PanelDetectionResult):
+        self._analysis_done(metadata)
+        self._create_context_aware_strips(metadata, result)
 
-            img = Image.open(io.BytesIO(img_bytes))
-            img_array = np.array(img.convert("L"))  # Grayscale
+    def _on_analysis_error(self, metadata: ImageMetadata, e):
+        self._analysis_done(metadata)
+        logger.error(e)
 
-            boundaries = []
-            confidence = 0
-            method = "failed"
+    def _analysis_done(self, metadata: ImageMetadata):
+        self._analyzing.pop(metadata.name, None)
+        if self.pages is not None:
+            self.pages.release(metadata.name)
 
-            # Edge detection (medium speed, higher accuracy)
-            # edge_boundaries = self._detect_panel_edges(img_array)
-            # if edge_boundaries and len(edge_boundaries) > len(boundaries):
-            #     boundaries = edge_boundaries
-            #     confidence = 0.8
-            #     method = "edge_detection"
-
-            # White space analysis (fast)
-            if confidence < self.detection_confidence_threshold:
-                if gutter_boundaries := self._find_gutter(img_array):  # TODO: Optimize
-                    boundaries = gutter_boundaries
-                    confidence = 0.7
-                    method = "gutter_detection"
-
-            processing_time = time.perf_counter() - start_time
-            result = PanelDetectionResult(
-                boundaries=boundaries,
-                confidence=confidence,
-                method=method,
-                processing_time_ms=processing_time
-            )
+    def _stored_result(self, key: str) -> PanelDetectionResult | None:
+        if self.panel_index is None:
+            return None
+        return self.panel_index.get(key, self.detector_version)
+
+    def close(self):
+        """Close panel index, analyses still running should be waited for first"""
+        if self.panel_index is not None:
+            self.panel_index.close()
+            self.panel_index = None
 
+    def _analyze_panel_worker(
+        self, image: bytes | Future | Callable[[], bytes | Future] | PageBuffer, key: str | None = None
+    ) -> PanelDetectionResult:
+        try:
+            start_time = time.perf_counter()
+            if isinstance(image, PageBuffer):
+                img_array = self._luminance(image.pixels())
+            else:
+                if callable(image):
+                    image = image()
+                if isinstance(image, Future):
+                    image = image.result()
+
+                if key is None and self.panel_index is not None:
+                    key = ImageCache.hasher(image).hexdigest()  # Image is not cached, hashing is still cheaper than decoding
+                    if (result := self._stored_result(key)) is not None:
+                        return result
+
+                with MemoryReader(image) as reader:
+                    img = Image.open(reader)
+                    img_array = np.array(img.convert("L"))  # Grayscale
+
+            result = self._detect_panels(img_array)
+            result.processing_time_ms = (time.perf_counter() - start_time) * 1000
+            if self.panel_index is not None and key is not None:
+                self.panel_index.put(key, self.detector_version, result)
             return result
 
         except Exception as e:
-            return PanelDetectionResult([], 0.0, f"error: {str(e)}")
+            return PanelDetectionResult(boundaries=[], confidence=0.0, method=f"error: {str(e)}")
+
+    @staticmethod
+    def _luminance(pixels: np.ndarray, chunk: int = 1024) -> np.ndarray:
+        """Grayscale of BGRA pixels, as PIL converts RGB to L, in chunks of rows to keep temporaries small"""
+        gray = np.empty(pixels.shape[:2], dtype=np.uint8)
+        for y in range(0, len(pixels), chunk):
+            rows = pixels[y:y + chunk].astype(np.uint32)
+            gray[y:y + chunk] = (rows[..., 2] * 19595 + rows[..., 1] * 38470 + rows[..., 0] * 7471 + 0x8000) >> 16
+        return gray
+
+    def _detect_panels(self, img_array: np.ndarray) -> PanelDetectionResult:
+        """
+        Gutters and Sobel edges fused into one set of boundaries with one confidence.
+
+        Gutter is confirmed by edge at its border (bottom of panel above or top of panel below).
+        Edges not explained by any gutter are boundaries without white space, e.g. full-bleed panels,
+        and count only if they stand out from the page by `EDGE_CONTRAST` and are not at top or bottom of it.
+        """
+        gutter_starts, gutter_ends = self._find_gutter_spans(img_array)
+        edges, edge_strengths, baseline = self._edge_peaks(img_array)
+
+        tolerance = 2 * EDGE_DECIMATION
+        near_gutter = (
+            (edges[None, :] >= gutter_starts[:, None] - tolerance) & (edges[None, :] <= gutter_ends[:, None] + tolerance)
+        )   # gutters x edges
+        at_border = near_gutter & (
+            (np.abs(edges[None, :] - gutter_starts[:, None]) <= tolerance) | (np.abs(edges[None, :] - gutter_ends[:, None]) <= tolerance)
+        )
+        contrast = edge_strengths / max(baseline, 1.0)
+        inner = (edges >= self.min_strip_height) & (edges <= img_array.shape[0] - self.min_strip_height)   # Not page border
+        strong = ~near_gutter.any(axis=0) & inner & (contrast >= EDGE_CONTRAST)
+
+        boundaries = np.sort(np.concatenate(((gutter_starts + gutter_ends) // 2, edges[strong])))
+        if len(gutter_starts):
+            confidence = 0.7 + 0.3 * at_border.any(axis=1).mean()
+            method = "gutter_detection" if not strong.any() else "gutter_edge_detection"
+        elif strong.any():
+            confidence = 0.6 + 0.4 * min(1.0, contrast[strong].mean() / EDGE_CONTRAST - 1)
+            method = "edge_detection"
+        else:
+            confidence = 0.0
+            method = "failed"
+
+        return PanelDetectionResult(boundaries=boundaries.tolist(), confidence=float(confidence), method=method)
 
     def _find_gutter(self, img_array: np.ndarray) -> list[int]:
-        """Find horizontal gutters (white space between panels)"""
-        dt = time.perf_counter()
+        """Find horizontal gutters (white space between panels), returns middle row of each"""
+        starts, ends = self._find_gutter_spans(img_array)
+        return ((starts + ends) // 2).tolist()  # Use middle of gutter as cut point
+
+    def _find_gutter_spans(self, img_array: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Starts and (exclusive) ends of horizontal gutters.
+
+        Rows are classified on a strided (downscaled) view first, then only rows around candidate gutters
+        are measured at full resolution, so exact boundaries cost a fraction of a full pass.
+        Gutter reaching bottom of the image is not a cut point.
+        """
         height, width = img_array.shape
-
-        row_scores = []
-        for y in range(height):
-            row = img_array[y]
-            # Consider pixels > 240 as background (white/light)
-            background_ratio = np.sum(row > 240) / width
-            row_scores.append(background_ratio)
-
-        # Find regions with high background ratio
         gutter_threshold = (
             Config.Performance.MangaViewer.gutter_threshold()
         )  # e.g., 0.8
         min_gutter_height = (
             Config.Performance.MangaViewer.min_gutter_height()
         )  # e.g., 10px
-
-        gutters = []
-        in_gutter = False
-        gutter_start = 0
-
-        for y, score in enumerate(row_scores):
-            if score > gutter_threshold and not in_gutter:
-                in_gutter = True
-                gutter_start = y
-            elif score <= gutter_threshold and in_gutter:
-                gutter_height = y - gutter_start
-                if gutter_height >= min_gutter_height:
-                    # Use middle of gutter as cut point
-                    gutters.append(gutter_start + gutter_height // 2)
-                in_gutter = False
-                
-        return gutters
+        step = max(1, min_gutter_height // 2)   # Every gutter still spans at least 2 sampled rows
+
+        starts, ends = self._row_runs(self._background_rows(img_array[::step, ::step], gutter_threshold))
+        if not len(starts):
+            return starts, ends
+
+        # Full resolution rows between sampled rows around each coarse run, rows outside are not gutter
+        window_starts = np.maximum((starts - 1) * step + 1, 0)
+        window_ends = np.where(ends * step < height, ends * step, height)
+        marks = np.zeros(height + 1, dtype=np.int32)
+        np.add.at(marks, window_starts, 1)
+        np.add.at(marks, window_ends, -1)
+        rows = np.flatnonzero(np.cumsum(marks[:-1]))
+
+        is_gutter = np.zeros(height, dtype=bool)
+        is_gutter[rows] = self._background_rows(img_array[rows], gutter_threshold)
+
+        starts, ends = self._row_runs(is_gutter)
+        keep = (ends - starts >= min_gutter_height) & (ends < height)
+        return starts[keep], ends[keep]
+
+    @staticmethod
+    def _background_rows(img_array: np.ndarray, threshold: float) -> np.ndarray:
+        """Rows where more than `threshold` of pixels are background (white/light)"""
+        return np.count_nonzero(img_array > BACKGROUND_LUMINANCE, axis=1) / img_array.shape[1] > threshold
+
+    @staticmethod
+    def _row_runs(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Starts and (exclusive) ends of runs of True in `mask`"""
+        edges = np.diff(mask.view(np.int8), prepend=0, append=0)
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
 
     def _detect_panel_edges(self, img_array: np.ndarray) -> list[int]:
         """Detect panel boundaries using edge detection"""
-        try:
-            # Horizontal Sobel filter to detect horizontal edges
-            sobel_h = ndimage.sobel(img_array, axis=0)
-
-            # Find strong horizontal edges
-            edge_strength = np.abs(sobel_h)
-            row_edge_strength = np.mean(edge_strength, axis=1)
-
-            # Find peaks in edge strength
-            threshold = np.percentile(row_edge_strength, 90)  # Top 10% of edges
-            potential_boundaries = []
-
-            for y in range(len(row_edge_strength)):
-                if row_edge_strength[y] > threshold:
-                    potential_boundaries.append(y)
-
-            # Group nearby boundaries and take the strongest one from each group
-            if not potential_boundaries:
-                return []
-
-            grouped_boundaries = []
-            current_group = [potential_boundaries[0]]
-
-            for boundary in potential_boundaries[1:]:
-                if boundary - current_group[-1] < self.min_strip_height // 2:
-                    current_group.append(boundary)
-                else:
-                    # Find strongest edge in current group
-                    best_y = max(current_group, key=lambda y: row_edge_strength[y])
-                    grouped_boundaries.append(best_y)
-                    current_group = [boundary]
-
-            # Don't forget the last group
-            if current_group:
-                best_y = max(current_group, key=lambda y: row_edge_strength[y])
-                grouped_boundaries.append(best_y)
-
-            return grouped_boundaries
-
-        except Exception as e:
-            logger.error(f'Error while detecting panel edges: {e}')
-            return []
+        return self._edge_peaks(img_array)[0].tolist()
+
+    def _edge_peaks(self, img_array: np.ndarray) -> tuple[np.ndarray, np.ndarray, float]:
+        """
+        Rows of strongest horizontal edges, one per group of nearby strong rows,
+        with their strength and mean strength of all rows, for contrast.
+
+        Sobel runs on image decimated by `EDGE_DECIMATION`, peaks are then refined
+        to the row of strongest vertical gradient at full resolution.
+        """
+        height = img_array.shape[0]
+        small = img_array[::EDGE_DECIMATION, ::EDGE_DECIMATION].astype(np.float32)    # uint8 Sobel would overflow
+        if small.shape[0] < 3 or height < 3:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32), 0.0
+
+        profile = np.abs(ndimage.sobel(small, axis=0)).mean(axis=1)
+        candidates = np.flatnonzero(profile > np.percentile(profile, EDGE_PERCENTILE))  # Top 10% of edges
+        if not len(candidates):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32), float(profile.mean())
+
+        gap = max(1, self.min_strip_height // 2 // EDGE_DECIMATION)
+        peaks, strengths = self._group_peaks(candidates, profile[candidates], gap)
+
+        # Strongest gradient within one decimation step around each peak
+        offsets = np.arange(-EDGE_DECIMATION, EDGE_DECIMATION + 1)
+        rows = np.clip(peaks[:, None] * EDGE_DECIMATION + offsets, 1, height - 2)
+        gradient = np.abs(img_array[rows + 1].astype(np.int16) - img_array[rows - 1]).mean(axis=2)
+        refined = rows[np.arange(len(peaks)), gradient.argmax(axis=1)]
+        return refined, strengths, float(profile.mean())
+
+    @staticmethod
+    def _group_peaks(candidates: np.ndarray, strengths: np.ndarray, gap: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Split sorted `candidates` where they are `gap` or more apart,
+        return first strongest candidate of each group and its strength.
+        """
+        group_starts = np.concatenate(([0], np.flatnonzero(np.diff(candidates) >= gap) + 1))
+        group_max = np.maximum.reduceat(strengths, group_starts)
+        group_ids = np.repeat(np.arange(len(group_starts)), np.diff(np.append(group_starts, len(candidates))))
+
+        maxima = np.flatnonzero(strengths == group_max[group_ids])
+        _, first = np.unique(group_ids[maxima], return_index=True)
+        return candidates[maxima[first]], group_max
 
     def _create_uniform_strips(self, metadata: ImageMetadata) -> list[StripInfo]:
         """Create uniform horizontal strips"""
@@ -212,7 +341,8 @@ class ContentAwareTileManager(QObject):
     ):
         """Create strips based on panel detection results"""
         if result.confidence < self.detection_confidence_threshold:
-            return self._create_uniform_strips(metadata)
+            self.strips_generated.emit(metadata.name, self._create_uniform_strips(metadata))
+            return
 
         if Config.debug_mode():
             logger.info(
@@ -20,18 +20,44 @@ class Config_(MainConfigBase):
     class Downloading(ConfigBase):
         max_retries = Setting[int](3, "Maximum Download Retries")
         min_wait_time = Setting[int](1, "Minimum Time between Retries")
-        
+
+        class Http(ConfigBase):
+            http2 = Setting[bool](True, "Use HTTP/2")
+            timeout = Setting[int](10, "Request Timeout", 's')
+            max_connections_per_host = Setting[int](16, "Max Connections per Host")
+            keepalive_expiry = Setting[int](60, "Keep-Alive Expiry", 's')
+
+        class Scheduler(ConfigBase):
+            initial_concurrency = Setting[int](4, "Initial Requests in Flight per Host")
+            max_concurrency = Setting[int](16, "Max Requests in Flight per Host")
+            backoff_factor = Setting[float](.5, "Concurrency Backoff Factor", level=Level.DEVELOPER)
+            latency_tolerance = Setting[float](2., "Latency Growth Tolerance", level=Level.DEVELOPER)
+            throughput_margin = Setting[float](1.1, "Throughput Growth Margin", level=Level.DEVELOPER)
+
         class Chapter(ConfigBase):
             time_wait_before_loading = Setting[int](300, "Time to Wait before Attempting to Download Chapter", 'ms')
+            prefetch_chapters = Setting[int](2, "Next Chapters to Prefetch", setting_type=SettingType.PERFORMANCE)
+            prefetch_after = Setting[float](
+                .5, "Prefetch Next Chapters after Reading", setting_type=SettingType.PERFORMANCE
+            )   # Fraction of current chapter
         
         class Image(ConfigBase):
             convert_image = Setting[bool](True, "Convert Image")
             preferable_format = Setting[str]("JXL", "Converted Images Format")
+            transcode_processes = Setting[int](
+                max(1, multiprocessing.cpu_count() - 1), "Image Converting Processes", setting_type=SettingType.PERFORMANCE
+            )   # 0 converts on the download loop itself
+            transcode_queue_size = Setting[int](8, "Max Images Waiting for Conversion", setting_type=SettingType.PERFORMANCE)
 
-            max_threads = RangeSetting[int](1, multiprocessing.cpu_count(), 1, multiprocessing.cpu_count(), "Max Download Threads")
             chunk_size = Setting[StorageSize](
                 8 * SU.KB, "Image chunk size", strongly_typed=False
             )
+            prefetch_headers = Setting[bool](
+                False, "Fetch All Image Sizes before Images", setting_type=SettingType.PERFORMANCE
+            )   # Range requests for headers of whole chapter, so it can be laid out before bodies arrive
+            header_prefetch_size = Setting[StorageSize](
+                4 * SU.KB, "Image Header Prefetch Size", strongly_typed=False
+            )
             image_update_every = Setting[int](
                 10, "Image Update Percentage", "%"
             )  # After image downloaded image_update_every% of size, update
@@ -88,12 +114,30 @@ class Config_(MainConfigBase):
             
             gutter_threshold = Setting[float](.8)
             min_gutter_height = Setting[int](10)
+            strip_cache_budget = Setting[StorageSize](
+                256 * SU.MB, "Max Memory for Strips", strongly_typed=False
+            )   # Far strips are downgraded to preview, then dropped, once pixmaps exceed it
+            strip_pool_budget = Setting[StorageSize](
+                32 * SU.MB, "Max Memory for Reusable Strip Images", strongly_typed=False
+            )   # Images of dropped strips kept to be filled by next loads
+            prefetch_horizon_ms = Setting[int](
+                300, "Prefetch Strips Reached Within", "ms", setting_type=SettingType.PERFORMANCE
+            )   # Cull window is stretched along scroll by distance covered in it
+            fling_velocity = Setting[float](
+                6000., "Only Preview Strips when Scrolling Faster than", "px/s", setting_type=SettingType.PERFORMANCE
+            )
             
 
     class Caching(ConfigBase):
         class Image(ConfigBase):
-            max_ram = Setting[StorageSize](00 * SU.MB, "Max Ram for Images")
+            max_ram = Setting[StorageSize](100 * SU.MB, "Max Ram for Images")
             max_disc = Setting[StorageSize](500 * SU.MB, "Max Disc Space for Images")
+            mmap_threshold = Setting[StorageSize](
+                1 * SU.MB, "Memory Map Images Larger Than", strongly_typed=False
+            )   # Read from disc as mmap and decoded straight from mapping, never kept in ram tier
+
+        class Pyramids(ConfigBase):
+            max_disc = Setting[StorageSize](1000 * SU.MB, "Max Disc Space for Page Pyramids")  # About twice the images
             
     class DataProcessing(ConfigBase):
         class UrlParsing(ConfigBase):
@@ -112,6 +156,8 @@ class Config_(MainConfigBase):
 
         class CACHE(DirConfigBase):
             IMAGES = "images"
+            PANELS = "panels.sqlite3"
+            MIPS = "mips"
 
         class DATA(DirConfigBase):
             class NOVELS(DirConfigBase):
@@ -122,6 +168,7 @@ class Config_(MainConfigBase):
             NOVELS_JSON = "novels.json"
             MANGA_JSON = "manga.json"
             SITES_JSON = "sites.json"
+            LIBRARY = "library.sqlite3"     # Manga, chapters and chapter data of all media
 
         class RESOURCES(DirConfigBase):
             ICONS = "icons"
@@ -1,13 +1,35 @@
-from .image_cache import ImageCache
+from .disc_store import DiscStore
+from .image_cache import ImageCacheStats, ImageCache
+from .image_cache_index import ImageCacheIndex
 from .image_metadata import ImageMetadata
+from .mip_pyramid import MipPyramid
+from .page_layout import PageLayout
+from .page_buffer import PageBuffer, PageBuffers
+from .panel_result_index import PanelResultIndex
+from .scroll_predictor import ScrollPredictor
 from .strip import StripInfo, StripData, PanelDetectionResult
 from .strip_cache import StripCache
+from .strip_image_pool import StripImagePool
+from .strip_index import StripIndex
+from .strip_load_scheduler import StripLoadScheduler
 
 __all__ = [
-    'ImageCache', 
+    'DiscStore', 
+	'ImageCacheStats', 
+	'ImageCache', 
+	'ImageCacheIndex', 
 	'ImageMetadata', 
+	'MipPyramid', 
+	'PageLayout', 
+	'PageBuffer', 
+	'PageBuffers', 
+	'PanelResultIndex', 
+	'ScrollPredictor', 
 	'StripInfo', 
 	'StripData', 
 	'PanelDetectionResult', 
-	'StripCache',
+	'StripCache', 
+	'StripImagePool', 
+	'StripIndex', 
+	'StripLoadScheduler',
 ]
\ No newline at end of file
@@ -0,0 +1,145 @@
+import mmap
+import os
+import queue
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from loguru import logger
+
+
+class DiscStore:
+    """
+    Files of `ImageCache` disc tier, written by a dedicated writer thread.
+
+    `write` only puts data into the write-back buffer, writer thread writes queued files in batches,
+    fsyncs the whole batch and only then renames files into place, so readers never see partial files.
+    Reads of files still in the buffer are served from it.
+    Files of at least `mmap_threshold` bytes are read as read-only `mmap`, so they can be decoded straight from the mapping.
+    """
+
+    TEMP_DIR = ".writing"
+    BATCH_SIZE = 32
+
+    def __init__(self, path: Path, mmap_threshold: int, reader_threads: int = 2):
+        self.path = path
+        self.mmap_threshold = mmap_threshold
+
+        self._temp_path = path / self.TEMP_DIR
+        shutil.rmtree(self._temp_path, ignore_errors=True)  # Leftovers of interrupted writes
+        self._temp_path.mkdir(parents=True, exist_ok=True)
+
+        self._pending: dict[str, bytes] = {}  # Write-back buffer, name -> data not yet on disc
+        self._pending_lock = threading.Lock()
+        self._queue: queue.Queue[tuple[str, str, bytes | None] | None] = queue.Queue()  # (operation, name, data)
+
+        self._readers = ThreadPoolExecutor(reader_threads, thread_name_prefix="DiscStoreReader")
+        self._writer = threading.Thread(target=self._write_loop, name="DiscStoreWriter", daemon=True)
+        self._writer.start()
+
+    def write(self, name: str, data: bytes):
+        with self._pending_lock:
+            self._pending[name] = data
+        self._queue.put(("write", name, data))
+
+    def delete(self, name: str):
+        with self._pending_lock:
+            self._pending.pop(name, None)  # Queued write will see it is not current anymore and skip
+        self._queue.put(("delete", name, None))
+
+    def read(self, name: str, allow_mmap: bool = True) -> bytes | mmap.mmap:
+        """Blocking read, prefer `read_async` on GUI thread"""
+        with self._pending_lock:
+            if (data := self._pending.get(name)) is not None:
+                return data
+
+        with open(self.path / name, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if allow_mmap and size >= self.mmap_threshold:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return f.read()
+
+    def read_async(self, name: str, allow_mmap: bool = True) -> Future:
+        with self._pending_lock:
+            if (data := self._pending.get(name)) is not None:
+                future = Future()
+                future.set_result(data)
+                return future
+        return self._readers.submit(self.read, name, allow_mmap)
+
+    def is_pending(self, name: str) -> bool:
+        with self._pending_lock:
+            return name in self._pending
+
+    def flush(self):
+        """Block until everything queued so far is on disc"""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._queue.put(None)
+        self._writer.join()
+        self._readers.shutdown(wait=True)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while item is not None and len(batch) < self.BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.opt(exception=e).error(f"DiscStore: failed to write batch of {len(batch)} to {self.path}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def _process(self, batch: list[tuple[str, str, bytes | None] | None]):
+        written: list[tuple[str, bytes, Path]] = []
+        for item in batch:
+            if item is None:
+                break
+            operation, name, data = item
+
+            if operation == "write":
+                with self._pending_lock:
+                    if self._pending.get(name) is not data:  # Replaced or deleted since
+                        continue
+                temp_file = self._temp_path / f"{name}.{len(written)}"
+                with open(temp_file, "wb") as f:
+                    f.write(data)
+                written.append((name, data, temp_file))
+            else:
+                self._commit(written)  # Earlier writes must land before delete of same name
+                written = []
+                try:
+                    (self.path / name).unlink(missing_ok=True)
+                except OSError as e:  # File is mapped on Windows, it will be adopted and evicted in next session
+                    logger.warning(f"DiscStore: could not delete {name}: {e}")
+        self._commit(written)
+
+    def _commit(self, written: list[tuple[str, bytes, Path]]):
+        """Fsync whole batch at once, then move files into place and drop them from write-back buffer"""
+        if not written:
+            return
+        for _, _, temp_file in written:
+            fd = os.open(temp_file, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+        for name, data, temp_file in written:
+            os.replace(temp_file, self.path / name)
+            with self._pending_lock:
+                if self._pending.get(name) is data:
+                    del self._pending[name]
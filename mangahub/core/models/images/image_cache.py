@@ -1,106 +1,364 @@
-import os
+import hashlib
+import mmap
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 from pathlib import Path
-from queue import SimpleQueue
+from pydantic import BaseModel
 from resources.enums import SU, StorageSize
 from config import Config
+from .disc_store import DiscStore
+from .image_cache_index import ImageCacheIndex
+from .image_metadata import ImageMetadata
 
 
-class ImageCache:  # TODO: SAVE/LOAD
+class ImageCacheStats(BaseModel):
+    ram_hits: int = 0
+    disc_hits: int = 0
+    misses: int = 0
+    ram_evictions: int = 0  # Moved from ram to disc
+    disc_evictions: int = 0  # Deleted from disc
+    deduplicated: int = 0  # Names added for already cached blob
+
+    @property
+    def hits(self) -> int:
+        return self.ram_hits + self.disc_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class ImageCache:
+    """
+    Two-tier LRU cache of encoded images: ram, then files in `cache_path`.
+
+    Images are stored content-addressed: every name refers to a blob, keyed by hash of the original
+    (not transcoded) bytes when downloader provides `ImageMetadata.source_hash`, else by hash of the image itself.
+    Identical pages under different names (credit pages, mirrors) are stored once; blob is deleted when last name
+    referring to it is discarded, or evicted together with all its names.
+
+    Both tiers are `OrderedDict`s of blobs in least-recently-used order, so get, promotion and eviction are O(1).
+    Disc is written through on `add` and indexed by `ImageCacheIndex`, so it persists across sessions;
+    ram only keeps hot copies, images evicted from it are dropped, images evicted from disc are deleted.
+    Files are written in background by `DiscStore`, images larger than `mmap_threshold` are returned as `mmap`
+    and are not promoted to ram. Index is loaded lazily on first use. Thread-safe.
+    """
+
     def __init__(
         self,
         cache_path: Path,
         max_ram: int | StorageSize = 100 * SU.MB,
         max_disc: int | StorageSize = 500 * SU.MB,
+        mmap_threshold: int | StorageSize = 1 * SU.MB,
     ):
         self.cache_path = cache_path
 
         self.max_ram = StorageSize(max_ram)
         self.max_disc = StorageSize(max_disc)
+        self.mmap_threshold = StorageSize(mmap_threshold)
+
+        self.stats = ImageCacheStats()
+
+        self._ram_cache: OrderedDict[str, bytes] = OrderedDict()  # blob -> image
+        self._disc_cache: OrderedDict[str, int] = OrderedDict()  # blob -> size
+        self._names: dict[str, str] = {}  # name -> blob
+        self._links: dict[str, set[str]] = {}  # blob -> names referring to it
+        self._ram_bytes = 0
+        self._disc_bytes = 0
+        self._index: ImageCacheIndex | None = None
+        self._store: DiscStore | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def hasher(data: bytes = b""):
+        """Hash addressing blobs, fast and incremental, so downloader can feed it chunk by chunk"""
+        return hashlib.blake2b(data, digest_size=16)
+
+    @classmethod
+    def blob_key(cls, name: str, image: bytes, metadata: ImageMetadata | None = None) -> str:
+        """File name of blob, hash and extension, so blobs of one source in different formats do not collide"""
+        digest = metadata.source_hash if metadata and metadata.source_hash else cls.hasher(image).hexdigest()
+        return digest + (metadata.format if metadata and metadata.format else Path(name).suffix)
+
+    def _ensure_index(self) -> ImageCacheIndex:
+        """Open persistent index and disc store, reconcile index with `cache_path` on first use"""
+        if self._index is None:
+            self._index = ImageCacheIndex(self.cache_path)
+            self._store = DiscStore(self.cache_path, self.mmap_threshold.bytes_value)
+            for name, blob, size in self._index.load():
+                self._link(name, blob)
+                if blob not in self._disc_cache:
+                    self._disc_bytes += size
+                self._disc_cache[blob] = size
+                self._disc_cache.move_to_end(blob)  # Blob is as recent as its most recent name
+            self._evict_disc(0)  # `max_disc` may be lower than in previous session
+        return self._index
+
+    def _link(self, name: str, blob: str) -> None:
+        self._names[name] = blob
+        self._links.setdefault(blob, set()).add(name)
+
+    def _forget(self, blob: str) -> set[str]:
+        """Drop all names referring to `blob`"""
+        names = self._links.pop(blob, set())
+        for name in names:
+            del self._names[name]
+        return names
+
+    def _evict_ram(self, bytes_needed: int) -> None:
+        """Drop least recently used images from ram until `bytes_needed` more fit, they stay on disc"""
+        while self._ram_cache and self._ram_bytes + bytes_needed > self.max_ram.bytes_value:
+            blob, image = self._ram_cache.popitem(last=False)
+            self._ram_bytes -= len(image)
+            self.stats.ram_evictions += 1
+            if blob not in self._disc_cache:  # Was too large for disc, nothing is left of it
+                self._forget(blob)
+
+    def _evict_disc(self, bytes_needed: int) -> None:
+        """Delete least recently used blobs until `bytes_needed` more fit on disc, names of blobs not in ram are dropped"""
+        evicted = []
+        while self._disc_cache and self._disc_bytes + bytes_needed > self.max_disc.bytes_value:
+            blob, size = self._disc_cache.popitem(last=False)
+            self._disc_bytes -= size
+            self.stats.disc_evictions += 1
+            self._store.delete(blob)
+            if blob in self._ram_cache:  # Hot copy stays, its names live as long as it does, just not in index
+                evicted.extend(self._links[blob])
+            else:
+                evicted.extend(self._forget(blob))
+        if evicted:
+            self._index.remove(evicted)
+
+    def _write_to_disc(self, blob: str, image: bytes) -> bool:
+        if len(image) > self.max_disc.bytes_value:
+            return False
+        self._evict_disc(len(image))
+        self._store.write(blob, image)  # Served from write-back buffer until it is on disc
+
+        self._disc_cache[blob] = len(image)
+        self._disc_bytes += len(image)
+        return True
+
+    def _discard(self, name: str) -> None:
+        """Drop `name`, and its blob if nothing else refers to it"""
+        if (blob := self._names.pop(name, None)) is None:
+            return
+        self._index.remove([name])
+        links = self._links[blob]
+        links.discard(name)
+        if links:
+            return
+
+        del self._links[blob]
+        if (image := self._ram_cache.pop(blob, None)) is not None:
+            self._ram_bytes -= len(image)
+        if (size := self._disc_cache.pop(blob, None)) is not None:
+            self._disc_bytes -= size
+            self._store.delete(blob)
+
+    def _link_existing(self, name: str, blob: str, metadata: ImageMetadata | None) -> bool:
+        """Refer `name` to already cached `blob`"""
+        if blob not in self._disc_cache and blob not in self._ram_cache:
+            return False
+        if self._names.get(name) != blob:
+            self._discard(name)
+            self.stats.deduplicated += 1
+        self._link(name, blob)
+
+        if blob in self._disc_cache:
+            self._disc_cache.move_to_end(blob)
+            self._index.put(name, blob, self._disc_cache[blob], metadata)
+        if blob in self._ram_cache:
+            self._ram_cache.move_to_end(blob)
+        return True
+
+    def _promote(self, blob: str, image: bytes | mmap.mmap) -> None:
+        """Put image read from disc back to ram, disc copy stays"""
+        if isinstance(image, mmap.mmap) or len(image) > self.max_ram.bytes_value:
+            return
+        if blob in self._ram_cache or blob not in self._disc_cache:  # Promoted or discarded while being read
+            return
+        self._evict_ram(len(image))
+        self._ram_cache[blob] = image
+        self._ram_bytes += len(image)
+
+    def _lookup(self, name: str) -> tuple[str, bytes | None]:
+        """Update recency and stats, return blob and image if it is in ram, raise if it is not cached at all"""
+        index = self._ensure_index()
+        if (blob := self._names.get(name)) is None:
+            self.stats.misses += 1
+            raise KeyError(f"{name} was not found in cache")
+
+        if blob in self._disc_cache:
+            self._disc_cache.move_to_end(blob)
+            index.touch(name)
+        if (image := self._ram_cache.get(blob)) is not None:
+            self._ram_cache.move_to_end(blob)
+            self.stats.ram_hits += 1
+            return blob, image
+
+        self.stats.disc_hits += 1
+        return blob, None
+
+    def add(self, name: str, image: bytes, metadata: ImageMetadata | None = None):
+        """
+        Cache `image`, `metadata` (source url, dimensions, format) is persisted with it, so it can be found by `find`.
+        If the same blob is already cached, `name` just refers to it.
+        """
+        with self._lock:
+            self._ensure_index()  # Before `_discard`, so stale file from previous session is replaced too
+            blob = self.blob_key(name, image, metadata)
+            if self._link_existing(name, blob, metadata):
+                return
+
+            self._discard(name)  # Replacing image must not leave stale bytes in either tier
+            self._link(name, blob)
+            if self._write_to_disc(blob, image):
+                self._index.put(name, blob, len(image), metadata)
+
+            if len(image) <= self.max_ram.bytes_value:
+                self._evict_ram(len(image))
+                self._ram_cache[blob] = image
+                self._ram_bytes += len(image)
+            elif blob not in self._disc_cache:  # Fits in neither tier
+                self._forget(blob)
+
+    def link(self, name: str, metadata: ImageMetadata) -> bool:
+        """
+        Cache `name` as image already converted from the same source, found by `find_source`, without transcoding it again.
+
+        Returns:
+            bool: False if that image was evicted in the meantime and must be added
+        """
+        with self._lock:
+            self._ensure_index()
+            return self._link_existing(name, self.blob_key(name, b"", metadata), metadata)
+
+    def get(self, name: str, default=None) -> bytes | mmap.mmap:
+        """Blocking get, prefer `get_async` where disc read must not stall caller (e.g. GUI thread)"""
+        with self._lock:
+            try:
+                blob, image = self._lookup(name)
+            except KeyError:
+                if default is not None:
+                    return default
+                raise Exception(f"{name} was not found in cache")
+
+            if image is None:
+                image = self._store.read(blob)
+                self._promote(blob, image)
+            return image
+
+    def get_async(self, name: str) -> Future:
+        """Future of image, already done for ram hits and images still being written"""
+        with self._lock:
+            try:
+                blob, image = self._lookup(name)
+            except KeyError:
+                future = Future()
+                future.set_exception(Exception(f"{name} was not found in cache"))
+                return future
+
+            if image is not None:
+                future = Future()
+                future.set_result(image)
+                return future
+            read = self._store.read_async(blob)
+
+        future = Future()  # Resolved after promotion, so image is in ram once caller sees it
+        read.add_done_callback(lambda read: self._on_read(blob, read, future))  # Outside lock, may run at once
+        return future
+
+    def _on_read(self, blob: str, read: Future, future: Future) -> None:
+        if (e := read.exception()) is not None:
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._promote(blob, read.result())
+        future.set_result(read.result())
+
+    def find(self, url: str) -> ImageMetadata | None:
+        """Metadata of image cached from `url`, in this or previous session"""
+        with self._lock:
+            metadata = self._ensure_index().find(url)
+            if metadata is None or metadata.name not in self._names:
+                return None
+            return metadata
+
+    def find_source(self, source_hash: str) -> ImageMetadata | None:
+        """Metadata of image converted from original bytes with `source_hash`, so it can be `link`ed instead of converted"""
+        with self._lock:
+            metadata = self._ensure_index().find_source(source_hash)
+            if metadata is None or Path(metadata.cached_path).name not in self._disc_cache:
+                return None
+            return metadata
+
+    def content_key(self, name: str) -> str | None:
+        """Blob of image, identifies its content across names and sessions, without reading it"""
+        with self._lock:
+            self._ensure_index()
+            return self._names.get(name)
 
-        self.cur_ram = StorageSize()
-        self.cur_disc = StorageSize()
-
-        self._ram_name_history = SimpleQueue()
-        self._disc_name_history = SimpleQueue()
-        self._freed_from_ram = {}
-        self._ram_cache = {}
-        self._disc_cache = {}
-        self._freed_ram_data_bytes = StorageSize()
-
-    def _free_ram(self, bytes_to_free: StorageSize) -> None:
-        while self.free_ram < bytes_to_free:  # While free ram is less that requested
-            old_item = self._ram_name_history.get()
-            self._freed_from_ram[old_item] = self._ram_cache.pop(old_item)
-            self._freed_ram_data_bytes += bytes_to_free
-            self.cur_ram -= self._freed_from_ram[old_item][1]  # Free oldest image
-
-    def _free_disc(self, bytes_to_free: StorageSize):
-        while self.max_disc - self.cur_disc < bytes_to_free:
-            file, size = self._disc_cache.pop(self._disc_name_history.get())
-            self.cur_disc -= size
-            os.remove(file)
-
-    def add(self, name: str, image: bytes):
-        size: StorageSize = StorageSize(len(image))
-        if self.max_ram < size:  # If image larger that maximum ram available
-            self._free_ram(self.max_ram)  # Free all ram
-            self._freed_from_ram[name] = [image, size]
-            self._freed_ram_data_bytes += size
-        else:
-            if (
-                self.cur_ram + size >= self.max_ram
-            ):  # If image takes more that ram available
-                self._free_ram(size)
-            self._ram_cache[name] = [image, size]
-            self._ram_name_history.put(name)
-            self.cur_ram += size
-
-        if self._freed_from_ram:  # If files where moved from ram
-            if (
-                self.cur_disc + self._freed_ram_data_bytes >= self.max_disc
-                and self.max_disc >= self._freed_ram_data_bytes
-            ):  # If file takes more that disc space available
-                self._free_disc(self._freed_ram_data_bytes)
-
-            for name, (bytes, size) in self._freed_from_ram.items():
-                cached_image_path = self.cache_path / name
-                with open(cached_image_path, "wb") as f:
-                    f.write(bytes)
-
-                self._disc_cache[name] = [cached_image_path, size]
-                self._disc_name_history.put(name)
-                self.cur_disc += size
-
-            self._freed_ram_data_bytes = 0
-            self._freed_from_ram = {}
-
-    def get(self, name: str, default=None) -> bytes:  # TODO: Set image as recently used
-        if image := self._ram_cache.get(name, default):
-            return image[0]
-        elif image := self._disc_cache.get(name, default):
-            with open(image[0], "rb") as f:
-                return f.read()  # Possibility of async chunk loading
-        else:
-            raise Exception(f"{name} was not found in cache")
-        
     def pop(self, name: str, default=None) -> bytes:
-        if image := self._ram_cache.pop(name, default):
-            self.cur_ram -= image[1]
-            return image[0]
-        elif image := self._disc_cache.pop(name, default):
-            self.cur_disc -= image[1]
-            with open(image[0], 'rb') as f:
-                return f.read()
-        else:
-            raise Exception(f"{name} was not found in cache")
+        with self._lock:
+            self._ensure_index()
+            if (blob := self._names.get(name)) is None:
+                if default is not None:
+                    return default
+                raise Exception(f"{name} was not found in cache")
+
+            image = self._ram_cache.get(blob)
+            if image is None:
+                image = self._store.read(blob, allow_mmap=False)  # File may be deleted right away, mapping would outlive it
+            self._discard(name)
+            return image
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            self._ensure_index()
+            return name in self._names
+
+    def flush(self):
+        """Block until every added image is on disc"""
+        with self._lock:
+            store = self._store
+        if store is not None:
+            store.flush()
+
+    def close(self):
+        """Finish pending writes and index updates, cache can still be used afterwards, it is reloaded from disc"""
+        with self._lock:
+            if self._index is None:
+                return
+            store, index = self._store, self._index
+            self._store = None
+            self._index = None
+            self._ram_cache.clear()
+            self._disc_cache.clear()
+            self._names.clear()
+            self._links.clear()
+            self._ram_bytes = 0
+            self._disc_bytes = 0
+        store.close()   # Outside lock, reads it waits for finish in `_on_read`, which takes lock
+        index.close()
+
+    @property
+    def cur_ram(self) -> StorageSize:
+        return StorageSize(self._ram_bytes)
+
+    @property
+    def cur_disc(self) -> StorageSize:
+        return StorageSize(self._disc_bytes)
 
     @property
     def free_ram(self) -> StorageSize:
-        return self.max_ram - self.cur_ram
+        return self.max_ram - self._ram_bytes
 
     @property
     def free_disc(self) -> StorageSize:
-        return self.max_disc - self.cur_disc
+        return self.max_disc - self._disc_bytes
 
     def save_image(self, name: str, path: Path = Config.Dirs.CACHE.IMAGES):
         path.mkdir(exist_ok=True)
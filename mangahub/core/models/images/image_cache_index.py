@@ -0,0 +1,141 @@
+import sqlite3
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from .image_metadata import ImageMetadata
+
+
+class ImageCacheIndex:
+    """
+    Persistent index of images cached on disc, stored as sqlite database inside cache directory.
+
+    Records name, blob file it refers to, size, format, dimensions, source url, hash of original bytes
+    and last access of every cached image, so cache survives restarts and can be looked up by url or source.
+    Not thread-safe, `ImageCache` guards it.
+    """
+
+    FILE_NAME = "index.sqlite3"
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = cache_path
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+
+        self._connection = sqlite3.connect(self.cache_path / self.FILE_NAME, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                name TEXT PRIMARY KEY,
+                blob TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                format TEXT NOT NULL DEFAULT '',
+                width INTEGER NOT NULL DEFAULT 0,
+                height INTEGER NOT NULL DEFAULT 0,
+                url TEXT NOT NULL DEFAULT '',
+                source TEXT NOT NULL DEFAULT '',
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS images_url ON images (url);
+            """
+        )
+        self._migrate()
+        self._accessed: dict[str, float] = {}  # name -> time, written in batches by `flush`
+
+    def _migrate(self):
+        """Add blob columns to index written before images were content-addressed, old files are blobs named as images"""
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(images)")}
+        with self._connection:
+            if "blob" not in columns:
+                self._connection.execute("ALTER TABLE images ADD COLUMN blob TEXT NOT NULL DEFAULT ''")
+                self._connection.execute("UPDATE images SET blob = name")
+            if "source" not in columns:
+                self._connection.execute("ALTER TABLE images ADD COLUMN source TEXT NOT NULL DEFAULT ''")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS images_blob ON images (blob)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS images_source ON images (source)")
+
+    def is_index_file(self, path: Path) -> bool:
+        return path.name.startswith(self.FILE_NAME)  # Database itself, -wal and -shm
+
+    def load(self) -> list[tuple[str, str, int]]:
+        """
+        Reconcile index with blob files in cache directory and return (name, blob, size) of all entries,
+        least recently used first.
+        Rows without file are dropped, files without row (e.g. cached before index existed) are adopted as blob of same name.
+        """
+        rows = dict(self._connection.execute("SELECT blob, size FROM images"))
+        files = {
+            path.name: path.stat() for path in self.cache_path.iterdir() if path.is_file() and not self.is_index_file(path)
+        }
+
+        missing = [(blob,) for blob in rows.keys() - files.keys()]
+        adopted = [  # Format is stored as extension, same as downloader does
+            (blob, blob, files[blob].st_size, Path(blob).suffix, files[blob].st_mtime) for blob in files.keys() - rows.keys()
+        ]
+        resized = [(files[blob].st_size, blob) for blob in rows.keys() & files.keys() if files[blob].st_size != rows[blob]]
+
+        with self._connection:
+            self._connection.executemany("DELETE FROM images WHERE blob = ?", missing)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO images (name, blob, size, format, last_access) VALUES (?, ?, ?, ?, ?)", adopted
+            )
+            self._connection.executemany("UPDATE images SET size = ? WHERE blob = ?", resized)
+        if missing or adopted or resized:
+            logger.info(f"ImageCacheIndex: {len(missing)} missing, {len(adopted)} adopted, {len(resized)} resized files in {self.cache_path}")
+
+        return list(self._connection.execute("SELECT name, blob, size FROM images ORDER BY last_access, rowid"))
+
+    def put(self, name: str, blob: str, size: int, metadata: ImageMetadata | None = None):
+        metadata = metadata or ImageMetadata(url="")
+        self._accessed.pop(name, None)
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO images (name, blob, size, format, width, height, url, source, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (name, blob, size, metadata.format, metadata.width, metadata.height, metadata.url, metadata.source_hash, time.time()),
+            )
+
+    def remove(self, names: list[str]):
+        for name in names:
+            self._accessed.pop(name, None)
+        with self._connection:
+            self._connection.executemany("DELETE FROM images WHERE name = ?", [(name,) for name in names])
+
+    def touch(self, name: str):
+        self._accessed[name] = time.time()
+
+    def find(self, url: str) -> ImageMetadata | None:
+        return self._find("url = ?", url)
+
+    def find_source(self, source_hash: str) -> ImageMetadata | None:
+        """Any image converted from original bytes with `source_hash`"""
+        return self._find("source = ?", source_hash) if source_hash else None
+
+    def _find(self, where: str, value: str) -> ImageMetadata | None:
+        row = self._connection.execute(
+            f"SELECT url, name, blob, size, format, width, height, source FROM images WHERE {where} ORDER BY last_access DESC LIMIT 1",
+            (value,),
+        ).fetchone()
+        if row is None:
+            return None
+        url, name, blob, size, format_, width, height, source = row
+        return ImageMetadata(
+            url=url, name=name, width=width, height=height, size=size, format=format_,
+            cached_path=str(self.cache_path / blob), source_hash=source,
+        )
+
+    def flush(self):
+        """Write pending last access times"""
+        if not self._accessed:
+            return
+        with self._connection:
+            self._connection.executemany(
+                "UPDATE images SET last_access = ? WHERE name = ?", [(t, name) for name, t in self._accessed.items()]
+            )
+        self._accessed.clear()
+
+    def close(self):
+        self.flush()
+        self._connection.close()
@@ -10,3 +10,4 @@ class ImageMetadata(BaseModel):
     format: str = ""
     size: int = 0
     cached_path: str = ""
+    source_hash: str = ""  # `ImageCache.hasher` of original bytes, before conversion
@@ -0,0 +1,128 @@
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+
+class MipPyramid:
+    """
+    Page at halving resolutions, level `n` is `1 / 2**n` of original, each box-filtered from the previous one.
+
+    Either held in memory (`from_pixels`) or backed by its file (`open`). File is one per page:
+    header, (height, width) of levels, offset table of tiles and zlib compressed tiles of `TILE_ROWS` rows,
+    so rows of any level are read by decompressing only tiles they span.
+    Pixels are BGRA with opaque alpha, byte order of `QImage.Format_RGB32`, so strips go to Qt without conversion.
+    """
+
+    MAGIC = b"MIP2"
+    TILE_ROWS = 64
+    CHANNELS = 4
+    _HEADER = struct.Struct("<4sHH")    # magic, levels, tile rows
+    _LEVEL = struct.Struct("<II")       # height, width
+    _TILE = np.dtype([("offset", "<u8"), ("length", "<u4")])
+
+    def __init__(self, shapes: list[tuple[int, int]], levels: list[np.ndarray] | None = None, path: Path | None = None, tiles: list[np.ndarray] | None = None):
+        self.shapes = shapes
+        self.path = path
+        self._levels = levels
+        self._tiles = tiles     # Offset table of each level, file-backed only
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pixels(cls, pixels: np.ndarray, count: int) -> "MipPyramid":
+        levels = [pixels]
+        for _ in range(1, count):
+            levels.append(cls._downsample(levels[-1]))
+        return cls([level.shape[:2] for level in levels], levels=levels)
+
+    @staticmethod
+    def _downsample(pixels: np.ndarray) -> np.ndarray:
+        """2x2 box filter, odd last row and column are repeated"""
+        height, width = pixels.shape[:2]
+        if height % 2 or width % 2:
+            pixels = np.pad(pixels, ((0, height % 2), (0, width % 2), (0, 0)), mode="edge")
+        total = pixels[0::2, 0::2].astype(np.uint16)
+        total += pixels[1::2, 0::2]
+        total += pixels[0::2, 1::2]
+        total += pixels[1::2, 1::2]
+        total += 2  # Rounded
+        return (total >> 2).astype(np.uint8)
+
+    @classmethod
+    def open(cls, path: Path) -> "MipPyramid":
+        with path.open("rb") as f:
+            magic, count, tile_rows = cls._HEADER.unpack(f.read(cls._HEADER.size))
+            if magic != cls.MAGIC or tile_rows != cls.TILE_ROWS:
+                raise ValueError(f"{path} is not a mip pyramid of this version")
+            shapes = [cls._LEVEL.unpack(f.read(cls._LEVEL.size)) for _ in range(count)]
+            tiles = []
+            for height, _ in shapes:
+                n = -(-height // tile_rows)
+                tiles.append(np.frombuffer(f.read(n * cls._TILE.itemsize), dtype=cls._TILE, count=n))
+        return cls(shapes, path=path, tiles=tiles)
+
+    def save(self, path: Path, compression: int = 1):
+        """Write pyramid held in memory, atomically, so half written file is never opened"""
+        tiles, data = [], []
+        offset = self._HEADER.size + self._LEVEL.size * len(self.shapes) + sum(
+            -(-height // self.TILE_ROWS) * self._TILE.itemsize for height, _ in self.shapes
+        )
+        for level in self._levels:
+            table = np.empty(-(-level.shape[0] // self.TILE_ROWS), dtype=self._TILE)
+            for i, y in enumerate(range(0, level.shape[0], self.TILE_ROWS)):
+                tile = zlib.compress(np.ascontiguousarray(level[y:y + self.TILE_ROWS]), compression)
+                table[i] = (offset, len(tile))
+                offset += len(tile)
+                data.append(tile)
+            tiles.append(table)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_suffix(path.suffix + ".tmp")
+        with temp.open("wb") as f:
+            f.write(self._HEADER.pack(self.MAGIC, len(self.shapes), self.TILE_ROWS))
+            for height, width in self.shapes:
+                f.write(self._LEVEL.pack(height, width))
+            for table in tiles:
+                f.write(table.tobytes())
+            f.writelines(data)
+        os.replace(temp, path)
+
+    def rows(self, level: int, y_start: int, y_end: int) -> np.ndarray:
+        """
+        Rows of level covering `y_start:y_end` of original page.
+        View of level held in memory, read and decompressed from file otherwise.
+        """
+        height, width = self.shapes[level]
+        start, end = y_start >> level, min(height, -(-y_end >> level))
+        if self._levels is not None:
+            return self._levels[level][start:end]
+
+        first, last = start // self.TILE_ROWS, max(start, end - 1) // self.TILE_ROWS
+        table = self._tiles[level][first:last + 1]
+        with self._lock:
+            if self._file is None:
+                self._file = self.path.open("rb")
+            self._file.seek(int(table["offset"][0]))
+            compressed = self._file.read(int(table["offset"][-1] + table["length"][-1] - table["offset"][0]))
+        tiles, position = [], 0
+        for length in table["length"].tolist():
+            tiles.append(zlib.decompress(compressed[position:position + length]))
+            position += length
+        pixels = np.frombuffer(b"".join(tiles), dtype=np.uint8).reshape(-1, width, self.CHANNELS)
+        offset = first * self.TILE_ROWS
+        return pixels[start - offset:end - offset]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of levels held, file-backed pyramid holds none"""
+        return sum(level.nbytes for level in self._levels) if self._levels is not None else 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
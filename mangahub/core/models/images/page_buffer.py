@@ -0,0 +1,224 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+from PIL import Image
+from loguru import logger
+
+from .mip_pyramid import MipPyramid
+from resources.enums import StorageSize
+from utils import ThreadingManager
+from config import Config
+from utils.image_conversion import MemoryReader
+
+
+MIP_LEVEL_COUNT = 4  # Full, 1/2, 1/4 and 1/8, as strip qualities
+
+
+class PageBuffer:
+    """
+    Pixels of one page as `MipPyramid`, decoded once and shared by all of its strips.
+
+    Decoding is deferred to first `rows` call, which is made by strip workers, so GUI thread never decodes.
+    Concurrent callers wait for the one decode. Encoded image is dropped once decoded.
+    With `pyramid_path`, pyramid is written there in background after decoding, and page seen before is read from it
+    instead, without reading or decoding the image at all. `image` may be callable for that reason.
+    `on_saved` is called with path of pyramid from the saving thread once it is written.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        image: bytes | Future | Callable[[], bytes | Future],
+        pyramid_path: Path | None = None,
+        on_saved: Callable[[Path], None] | None = None,
+    ):
+        self.name = name
+        self.refs = 0
+        self.pyramid_path = pyramid_path
+        self.on_saved = on_saved
+        self._image = image
+        self._pyramid: MipPyramid | None = None
+        self._lock = threading.Lock()
+
+    def pyramid(self) -> MipPyramid:
+        with self._lock:
+            if self._pyramid is None:
+                self._pyramid = self._open_pyramid() or self._build_pyramid()
+                self._image = None
+            return self._pyramid
+
+    def _open_pyramid(self) -> MipPyramid | None:
+        if self.pyramid_path is None or not self.pyramid_path.exists():
+            return None
+        try:
+            return MipPyramid.open(self.pyramid_path)
+        except (OSError, ValueError, EOFError) as e:
+            logger.warning(f"PageBuffer: could not open pyramid of {self.name}, decoding again: {e}")
+            return None
+
+    def _build_pyramid(self) -> MipPyramid:
+        image = self._image() if callable(self._image) else self._image
+        if isinstance(image, Future):
+            image = image.result()
+        with MemoryReader(image) as reader:
+            decoded = Image.open(reader).convert("RGB").convert("RGBA")  # Alpha is dropped, as pages are shown opaque
+        pixels = np.frombuffer(decoded.tobytes("raw", "BGRA"), dtype=np.uint8).reshape(decoded.height, decoded.width, 4)
+
+        pyramid = MipPyramid.from_pixels(pixels, MIP_LEVEL_COUNT)
+        if self.pyramid_path is not None:   # Strips are served from memory meanwhile
+            ThreadingManager.run(self._save_pyramid, pyramid, self.pyramid_path, name=f"pyramid_save_{self.name}")
+        return pyramid
+
+    def _save_pyramid(self, pyramid: MipPyramid, path: Path):
+        try:
+            pyramid.save(path)
+        except OSError as e:
+            logger.warning(f"PageBuffer: could not save pyramid of {self.name}: {e}")
+            return
+        if self.on_saved:
+            self.on_saved(path)
+
+    def pixels(self, level: int = 0) -> np.ndarray:
+        """Whole level as height x width x 4 BGRA array, as `MipPyramid` holds it"""
+        pyramid = self.pyramid()
+        return pyramid.rows(level, 0, pyramid.shapes[0][0])
+
+    def rows(self, y_start: int, y_end: int, level: int = 0) -> np.ndarray:
+        """
+        Rows of level covering `y_start:y_end` of page.
+        Without copy while pyramid is in memory, view keeps pixels alive even after page is released.
+        """
+        return self.pyramid().rows(level, y_start, y_end)
+
+    @property
+    def is_decoded(self) -> bool:
+        return self._pyramid is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self._pyramid.nbytes if self._pyramid is not None else 0
+
+    def close(self):
+        if self._pyramid is not None:
+            self._pyramid.close()
+
+
+class PageBuffers:
+    """
+    Refcounted `PageBuffer`s by image name.
+
+    Page is acquired by its image item when it enters cull window and released when it leaves,
+    buffer is dropped once nothing holds it. With `pyramid_path`, pyramids of pages are persisted there,
+    named by content key of the page. Acquired and released from GUI thread only.
+
+    Pyramid files are an LRU bounded by `max_disc`: pages seen least recently are deleted first once newly saved
+    pyramid does not fit, pyramids of pages held are kept. Recency is file mtime, so it persists across sessions,
+    files are indexed lazily on first use. Pyramids are saved on worker threads, hence index is locked.
+    """
+
+    def __init__(self, pyramid_path: Path | None = None, max_disc: int | StorageSize | None = None):
+        self.pyramid_path = pyramid_path
+        self.max_disc = StorageSize(max_disc if max_disc is not None else Config.Caching.Pyramids.max_disc())
+        self._pages: dict[str, PageBuffer] = {}
+        self._stored: OrderedDict[Path, int] | None = None  # pyramid file -> size
+        self._stored_bytes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, name: str, image: bytes | Future | Callable[[], bytes | Future], key: str | None = None) -> PageBuffer:
+        """Page of `name`, decoded from `image` unless it is held already or its pyramid was saved by `key` before"""
+        page = self._pages.get(name)
+        if page is None:
+            path = self.pyramid_path / f"{key}.mip" if self.pyramid_path is not None and key else None
+            with self._lock:
+                page = self._pages[name] = PageBuffer(name, image, path, self._on_pyramid_saved)
+                if path is not None:
+                    self._touch(path)
+        page.refs += 1
+        return page
+
+    def release(self, name: str):
+        page = self._pages.get(name)
+        if page is None:
+            return
+        page.refs -= 1
+        if page.refs <= 0:
+            with self._lock:
+                del self._pages[name]
+            page.close()
+
+    def _ensure_stored(self) -> OrderedDict[Path, int]:
+        """Index pyramid files in `pyramid_path` by mtime on first use, evict those over `max_disc`"""
+        if self._stored is None:
+            files = []
+            for path in self.pyramid_path.glob("*.mip") if self.pyramid_path is not None and self.pyramid_path.exists() else ():
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path, stat.st_size))
+            self._stored = OrderedDict((path, size) for _, path, size in sorted(files))
+            self._stored_bytes = sum(self._stored.values())
+            self._evict()  # `max_disc` may be lower than in previous session
+        return self._stored
+
+    def _touch(self, path: Path):
+        """Mark pyramid of acquired page most recently used"""
+        stored = self._ensure_stored()
+        if path in stored:
+            stored.move_to_end(path)
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+
+    def _on_pyramid_saved(self, path: Path):
+        try:
+            size = path.stat().st_size
+        except OSError:
+            return
+        with self._lock:
+            stored = self._ensure_stored()
+            self._stored_bytes += size - stored.get(path, 0)
+            stored[path] = size
+            stored.move_to_end(path)
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used pyramid files until they fit in `max_disc`, except those of pages held"""
+        held = {page.pyramid_path for page in self._pages.values()}
+        for path in list(self._stored):
+            if self._stored_bytes <= self.max_disc.bytes_value:
+                break
+            if path in held:
+                continue
+            self._stored_bytes -= self._stored.pop(path)
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.warning(f"PageBuffers: could not delete pyramid {path.name}: {e}")
+
+    def get(self, name: str) -> PageBuffer | None:
+        return self._pages.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._pages
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory of decoded pixels held"""
+        return sum(page.nbytes for page in self._pages.values())
+
+    @property
+    def stored_bytes(self) -> int:
+        """Disc space of pyramid files"""
+        with self._lock:
+            self._ensure_stored()
+            return self._stored_bytes
@@ -0,0 +1,132 @@
+from collections import Counter
+
+
+class PageLayout:
+    """
+    Vertical layout of chapter pages by index, Fenwick tree of page heights (plus `gap`).
+
+    Position of page, height update and page at y are O(log n), total height and max width O(1),
+    so page arriving last costs as much as page arriving first.
+    Indexes without size take no space, capacity grows by doubling as higher indexes arrive.
+    """
+
+    def __init__(self, gap: float = 0):
+        self.gap = gap
+        self._tree = [0.0] * 17    # 1-based, capacity 16
+        self._sizes: dict[int, tuple[int, int]] = {}  # index -> (width, height)
+        self._widths: Counter[int] = Counter()
+        self._max_width = 0
+        self._total = 0.0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._tree) - 1
+
+    def _grow(self, index: int):
+        capacity = self.capacity
+        while capacity <= index:
+            capacity *= 2
+        tree = [0.0] * (capacity + 1)
+        for i, (_, height) in self._sizes.items():    # Rebuilt in O(n), amortized over doublings
+            tree[i + 1] += height + self.gap
+        for i in range(1, capacity + 1):
+            parent = i + (i & -i)
+            if parent <= capacity:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _add(self, index: int, delta: float):
+        i = index + 1
+        while i <= self.capacity:
+            self._tree[i] += delta
+            i += i & -i
+        self._total += delta
+
+    def set(self, index: int, width: int, height: int) -> float:
+        """Set size of page, returns by how much pages after it moved"""
+        if index < 0:
+            raise IndexError(f"Page index can not be negative: {index}")
+        if index >= self.capacity:
+            self._grow(index)
+
+        old = self._sizes.get(index)
+        self._sizes[index] = (width, height)
+        self._add_width(width)
+        if old is None:
+            delta = height + self.gap
+        else:
+            self._remove_width(old[0])
+            delta = height - old[1]
+        if delta:
+            self._add(index, delta)
+        return delta
+
+    def remove(self, index: int) -> float:
+        """Remove page, returns by how much pages after it moved"""
+        if (old := self._sizes.pop(index, None)) is None:
+            return 0.0
+        self._remove_width(old[0])
+        delta = -(old[1] + self.gap)
+        self._add(index, delta)
+        return delta
+
+    def _add_width(self, width: int):
+        self._widths[width] += 1
+        self._max_width = max(self._max_width, width)
+
+    def _remove_width(self, width: int):
+        self._widths[width] -= 1
+        if not self._widths[width]:
+            del self._widths[width]
+            if width == self._max_width:
+                self._max_width = max(self._widths, default=0)
+
+    def position(self, index: int) -> float:
+        """Y of page, sum of heights (and gaps) of pages before it"""
+        i = min(index, self.capacity)
+        y = 0.0
+        while i > 0:
+            y += self._tree[i]
+            i -= i & -i
+        return y
+
+    def index_at(self, y: float) -> int | None:
+        """Page spanning `y` (its gap included), last page if `y` is past all of them"""
+        if not self._sizes or y < 0:
+            return None
+        if y >= self._total:
+            return max(self._sizes)
+        i, remaining = 0, y
+        step = 1 << (self.capacity.bit_length() - 1)
+        while step:  # Descend to last slot whose prefix sum is <= y
+            if i + step <= self.capacity and self._tree[i + step] <= remaining:
+                i += step
+                remaining -= self._tree[i]
+            step >>= 1
+        while i not in self._sizes:     # Slots without page take no space, next page spans `y`
+            i += 1
+        return i
+
+    def indexes_in(self, top: float, bottom: float) -> list[int]:
+        """Pages overlapping `top:bottom`, top to bottom, found in O(log n + pages in it)"""
+        if not self._sizes or bottom < 0 or top >= self._total:
+            return []
+        first, last = self.index_at(max(top, 0)), self.index_at(bottom)
+        return [i for i in range(first, last + 1) if i in self._sizes]
+
+    def size(self, index: int) -> tuple[int, int] | None:
+        return self._sizes.get(index)
+
+    @property
+    def total_height(self) -> float:
+        return self._total
+
+    @property
+    def max_width(self) -> int:
+        return self._max_width
+
+    def __contains__(self, index: int) -> bool:
+        return index in self._sizes
+
+    def __len__(self) -> int:
+        return len(self._sizes)
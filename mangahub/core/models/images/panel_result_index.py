@@ -0,0 +1,79 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .strip import PanelDetectionResult
+
+
+class PanelResultIndex:
+    """
+    Persistent panel detection results, stored as sqlite database.
+
+    Results are keyed by content of the image (e.g. `ImageCache.content_key`) and version of detector,
+    so same page is analyzed once no matter its name, and changes to detection invalidate old results.
+    Boundaries are stored packed as uint32. Thread-safe, results are written by analysis workers.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS panels (
+                key TEXT NOT NULL,
+                version TEXT NOT NULL,
+                boundaries BLOB NOT NULL,
+                confidence REAL NOT NULL,
+                method TEXT NOT NULL,
+                processing_time_ms REAL NOT NULL,
+                PRIMARY KEY (key, version)
+            ) WITHOUT ROWID
+            """
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: str) -> PanelDetectionResult | None:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT boundaries, confidence, method, processing_time_ms FROM panels WHERE key = ? AND version = ?",
+                (key, version),
+            ).fetchone()
+        if row is None:
+            return None
+        boundaries, confidence, method, processing_time_ms = row
+        return PanelDetectionResult(
+            boundaries=np.frombuffer(boundaries, dtype="<u4").tolist(),
+            confidence=confidence,
+            method=method,
+            processing_time_ms=processing_time_ms,
+        )
+
+    def put(self, key: str, version: str, result: PanelDetectionResult):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO panels (key, version, boundaries, confidence, method, processing_time_ms) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key, version, np.asarray(result.boundaries, dtype="<u4").tobytes(),
+                    result.confidence, result.method, result.processing_time_ms,
+                ),
+            )
+
+    def prune(self, version: str) -> int:
+        """Remove results of other detector versions, returns number of removed"""
+        with self._lock, self._connection:
+            return self._connection.execute("DELETE FROM panels WHERE version != ?", (version,)).rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM panels").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
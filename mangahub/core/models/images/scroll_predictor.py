@@ -0,0 +1,60 @@
+import math
+import time
+from collections import deque
+
+from config import Config
+
+
+class ScrollPredictor:
+    """
+    Scroll velocity from viewport positions of last `window_ms`, and where viewport will be in `horizon_ms`.
+
+    While smooth scroll animates, its target is known and is where viewport goes,
+    otherwise (scrollbar drag, kinetic scroll) position is extrapolated by velocity.
+    Scrolling faster than `fling_velocity` is fling, strips are only previewed then.
+    Positions are scene y of viewport top, velocity is in scene px per second.
+    """
+
+    def __init__(self, horizon_ms: int | None = None, fling_velocity: float | None = None, window_ms: int = 100):
+        self.horizon = (horizon_ms if horizon_ms is not None else Config.Performance.MangaViewer.prefetch_horizon_ms()) / 1000
+        self.fling_velocity = fling_velocity if fling_velocity is not None else Config.Performance.MangaViewer.fling_velocity()
+        self.window = window_ms / 1000
+        self.target: float | None = None
+        self._samples: deque[tuple[float, float]] = deque()    # time, y
+
+    def update(self, y: float, target: float | None = None, now: float | None = None):
+        now = time.perf_counter() if now is None else now
+        self._samples.append((now, y))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+        self.target = target
+
+    def reset(self):
+        """Scrolling settled"""
+        self._samples.clear()
+        self.target = None
+
+    @property
+    def velocity(self) -> float:
+        if len(self._samples) < 2:
+            return 0.0
+        (t0, y0), (t1, y1) = self._samples[0], self._samples[-1]
+        return (y1 - y0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def lead(self, limit: float = math.inf) -> float:
+        """How far viewport will move within horizon, negative when scrolling up, at most `limit` either way"""
+        if not self._samples:
+            return 0.0
+        if self.target is not None:
+            lead = self.target - self._samples[-1][1]
+        else:
+            lead = self.velocity * self.horizon
+        return max(-limit, min(limit, lead))
+
+    @property
+    def is_flinging(self) -> bool:
+        return abs(self.velocity) >= self.fling_velocity
+
+    @property
+    def is_moving(self) -> bool:
+        return bool(self.velocity or self.lead())
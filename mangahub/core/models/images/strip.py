@@ -36,6 +36,7 @@ class StripData(BaseModel):
     pixmap: QPixmap | None = None
     loaded_quality: StripQuality | None = None
     loading_quality: StripQuality | None = None
+    requested_quality: StripQuality | None = None  # Last requested, lower means farther from viewport
     last_accessed: float = 0.0
 
 
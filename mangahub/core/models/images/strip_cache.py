@@ -1,13 +1,17 @@
+import math
 import time
-import io
-from PySide6.QtCore import QObject, Signal
-from PySide6.QtGui import QPixmap
-from PIL import Image, ImageQt
+from pathlib import Path
+from PySide6.QtCore import QObject, Qt, Signal
+from PySide6.QtGui import QImage, QPixmap
 from loguru import logger
 
+from .page_buffer import PageBuffer, PageBuffers
 from .strip import StripInfo, StripData
+from .strip_image_pool import StripImagePool
+from .strip_load_scheduler import StripLoadScheduler
 from resources.enums import StripQuality, StorageSize
-from utils import ThreadingManager
+from utils import FrameRecorder
+from config import Config
 
 
 SCALE_FACTORS = {
@@ -16,27 +20,60 @@ SCALE_FACTORS = {
             StripQuality.MEDIUM: 0.5,
             StripQuality.HIGH: 1.0
         }
+MIP_LEVELS = {quality: round(-math.log2(scale)) for quality, scale in SCALE_FACTORS.items()}  # Pyramid level of quality
 
 class StripCache(QObject):
+    """
+    Pixmaps of strips at quality levels.
+
+    Strips are cut from `PageBuffer` of their page, which is decoded once into mip pyramid shared by all strips of it.
+    Strip of any quality is rows of pyramid level, copied once into image from `StripImagePool` that its pixmap shares,
+    and pages seen before are read from their saved pyramid instead of being decoded.
+    Image of pixmap that is replaced or dropped goes back to pool for next load.
+    Loads are queued in `StripLoadScheduler`, nearest to viewport first.
+
+    Pixmap memory is kept under `max_memory`. Over budget, strips requested at lower quality than they hold
+    (i.e. far from viewport) are downgraded to preview first, HIGH ones first, least recently requested first.
+    If that is not enough, strips are dropped entirely, farthest first, and `strip_unloaded` is emitted.
+    Strips requested at HIGH are never evicted.
+    """
+
     strip_loaded = Signal(str, int, StripData)
     strip_unloaded = Signal(str, int)
     
-    def __init__(self):
+    def __init__(
+        self,
+        max_memory: int | StorageSize | None = None,
+        pyramid_path: Path | None = None,
+        pool_memory: int | StorageSize | None = None,
+        frame_recorder: FrameRecorder | None = None,
+    ):
         super().__init__()
+        self.frame_recorder = frame_recorder or FrameRecorder(enabled=False)
         self.cache: dict[str, dict[int, StripData]] = {}
+        self.pages = PageBuffers(pyramid_path)
+        self.images = StripImagePool(pool_memory)
+        self._pixmap_images: dict[int, QImage] = {}  # Pixmap cache key -> pooled image it shares
+        self.scheduler = StripLoadScheduler(self._load_strip_worker, self._on_strip_loaded, self._on_strip_error)
+        self.max_memory = StorageSize(max_memory if max_memory is not None else Config.Performance.MangaViewer.strip_cache_budget())
         self.current_memory_usage = StorageSize(0)
+        self._memory_by_quality = dict.fromkeys(StripQuality, 0)
         
-    def request(self, strip_info: StripInfo, quality: StripQuality, image_bytes: bytes) -> QPixmap | None:
-        print(strip_info, quality)
+    def request(self, strip_info: StripInfo, quality: StripQuality, page: PageBuffer, distance: float = 0.0) -> QPixmap | None:
         if strip_info.image_name not in self.cache:
             self.cache[strip_info.image_name] = {}
-        if strip_info.index not in self.cache[strip_info.image_name]:
-            self.cache[strip_info.image_name][strip_info.index] = StripData(
+        strip_data = self.cache[strip_info.image_name].get(strip_info.index)
+        if strip_data is not None and strip_data.info != strip_info:   # Strips of image were regenerated after panel analysis
+            self._set_pixmap(strip_data, None, None)
+            self._set_preview(strip_data, None)
+            strip_data = None
+        if strip_data is None:
+            strip_data = self.cache[strip_info.image_name][strip_info.index] = StripData(
                 info=strip_info,
             )
         
-        strip_data = self.cache[strip_info.image_name][strip_info.index]
         strip_data.last_accessed = time.time()
+        strip_data.requested_quality = quality
         
         # Return cached pixmap if available
         if strip_data.pixmap is not None:
@@ -44,63 +81,151 @@ class StripCache(QObject):
         elif strip_data.preview_pixmap is not None:
             self.strip_loaded.emit(strip_info.image_name, strip_info.index, strip_data)
         
-        if strip_data.loading_quality != quality:
+        if not self._has_quality(strip_data, quality):  # Also when already queued, distance to viewport changed
             strip_data.loading_quality = quality
-            self._load_strip_async(strip_info, quality, image_bytes)
+            self._load_strip_async(strip_info, quality, page, distance)
+
+    @staticmethod
+    def _has_quality(strip_data: StripData, quality: StripQuality) -> bool:
+        if quality is StripQuality.PREVIEW:     # Anything held is good enough, as in fling
+            return strip_data.preview_pixmap is not None or strip_data.pixmap is not None
+        return strip_data.pixmap is not None and strip_data.loaded_quality is quality
+
+    @property
+    def memory_by_quality(self) -> dict[str, int]:
+        """Pixmap bytes held at each quality, as `PerformanceMetrics.memory_by_quality`"""
+        return {quality.name: size for quality, size in self._memory_by_quality.items()}
     
-    def _load_strip_async(self, strip_info: StripInfo, quality: StripQuality, image_bytes: bytes):
-        worker = ThreadingManager.run(
-            self._load_strip_worker,
-            strip_info, quality, image_bytes,
-            name=f"strip_load_{strip_info.image_name}_{strip_info.index}_{quality.name}"
-        )
-        worker.signals.success.connect(
-            lambda name, result: self._on_strip_loaded(strip_info, quality, result)
-        )
-        worker.signals.error.connect(
-            lambda name, error: logger.error(f"Strip loading failed: {name}, error: {error}")
-        )
-        
-    def _load_strip_worker(self, strip_info: StripInfo, quality: StripQuality, image_bytes: bytes) -> QPixmap:
-        img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        strip = img.crop((
-            0, strip_info.y_start,
-            strip_info.width, strip_info.y_end
-        ))
-        
-        scale = SCALE_FACTORS[quality]
-        if scale < 1.0:
-            new_size = (
-                int(strip.width * scale),
-                int(strip.height * scale)
-            )
-            strip.thumbnail(new_size, Image.Resampling.LANCZOS)
-            strip.save(f'cache/images/strips/{strip_info.image_name}-{strip_info.index}', format='WEBP', effort=1)
+    def _load_strip_async(self, strip_info: StripInfo, quality: StripQuality, page: PageBuffer, distance: float = 0.0):
+        self.scheduler.submit(strip_info, quality, page, distance)
+
+    def cancel(self, image_name: str):
+        """Image left cull window, its queued strip loads are dropped and its strips can be evicted"""
+        strips = self.cache.get(image_name, {})
+        for index in self.scheduler.cancel(image_name):
+            if index in strips:
+                strips[index].loading_quality = None
+        for strip_data in strips.values():
+            strip_data.requested_quality = None     # Farthest from viewport, HIGH would be kept forever
+
+    def _on_strip_error(self, strip_info: StripInfo, quality: StripQuality, error: tuple):
+        logger.error(f"Strip loading failed: {strip_info.image_name}[{strip_info.index}] {quality.name}, error: {error}")
+        strip_data = self.cache.get(strip_info.image_name, {}).get(strip_info.index)
+        if strip_data is not None and strip_data.loading_quality is quality:
+            strip_data.loading_quality = None   # Requested again on next viewport update
         
-        return QPixmap.fromImage(ImageQt.ImageQt(strip))
+    def _load_strip_worker(self, strip_info: StripInfo, quality: StripQuality, page: PageBuffer) -> QImage:
+        rows = page.rows(strip_info.y_start, strip_info.y_end, MIP_LEVELS[quality])    # Pyramid is made by first strip worker to get here
+        return self.images.fill(rows)   # Pixmap is made on GUI thread, sharing it
     
-    def _on_strip_loaded(self, strip_info: StripInfo, quality: StripQuality, pixmap: QPixmap):
+    def _on_strip_loaded(self, strip_info: StripInfo, quality: StripQuality, pixmap: QPixmap | QImage):
+        with self.frame_recorder.span("strip_upload"):
+            self._store_strip(strip_info, quality, pixmap)
+
+    def _store_strip(self, strip_info: StripInfo, quality: StripQuality, pixmap: QPixmap | QImage):
         image_name = strip_info.image_name
         strip_index = strip_info.index
         
-        if (image_name in self.cache and 
-            strip_index in self.cache[image_name]):
-            
-            strip_data = self.cache[image_name][strip_index]
+        if isinstance(pixmap, QImage):
+            image, pixmap = pixmap, QPixmap.fromImage(pixmap)
+            self._pixmap_images[pixmap.cacheKey()] = image
+        
+        strip_data = self.cache.get(image_name, {}).get(strip_index)
+        if strip_data is not None and strip_data.info == strip_info:
             if quality is not StripQuality.PREVIEW:
-                strip_data.pixmap = pixmap
+                self._set_pixmap(strip_data, pixmap, quality)
             else:
-                strip_data.preview_pixmap = pixmap
-            strip_data.loaded_quality = quality
+                self._set_preview(strip_data, pixmap)
             strip_data.loading_quality = None
             
             memory_used = self._estimate_pixmap_memory(pixmap)
-            self.current_memory_usage += memory_used
-            
             logger.debug(f"Strip loaded: {image_name}[{strip_index}] {quality.name}, "
-                        f"memory: {memory_used}, total: {self.current_memory_usage}")
+                        f"memory: {StorageSize(memory_used)}, total: {self.current_memory_usage}")
             
             self.strip_loaded.emit(image_name, strip_index, strip_data)
+            self._evict()
+        else:
+            self._release_pixmap(pixmap)    # Dropped or regenerated while loading
+
+    def _set_pixmap(self, strip_data: StripData, pixmap: QPixmap | None, quality: StripQuality | None):
+        if strip_data.pixmap is not None:
+            self._account(strip_data.loaded_quality, -self._estimate_pixmap_memory(strip_data.pixmap))
+            self._release_pixmap(strip_data.pixmap)
+        strip_data.pixmap = pixmap
+        if pixmap is not None:
+            self._account(quality, self._estimate_pixmap_memory(pixmap))
+        strip_data.loaded_quality = quality if pixmap is not None else (
+            StripQuality.PREVIEW if strip_data.preview_pixmap is not None else None
+        )
+
+    def _set_preview(self, strip_data: StripData, pixmap: QPixmap | None):
+        if strip_data.preview_pixmap is not None:
+            self._account(StripQuality.PREVIEW, -self._estimate_pixmap_memory(strip_data.preview_pixmap))
+            self._release_pixmap(strip_data.preview_pixmap)
+        strip_data.preview_pixmap = pixmap
+        if pixmap is not None:
+            self._account(StripQuality.PREVIEW, self._estimate_pixmap_memory(pixmap))
+        if strip_data.pixmap is None:
+            strip_data.loaded_quality = StripQuality.PREVIEW if pixmap is not None else None
+
+    def _release_pixmap(self, pixmap: QPixmap):
+        image = self._pixmap_images.pop(pixmap.cacheKey(), None)
+        if image is not None:
+            self.images.release(image)
+
+    def _account(self, quality: StripQuality, size: int):
+        self._memory_by_quality[quality] += size
+        self.current_memory_usage += size
+
+    def _evict(self):
+        """Downgrade, then drop strips until pixmaps fit `max_memory`"""
+        if self.current_memory_usage <= self.max_memory:
+            return
+
+        def farthest_first(strip_data: StripData):  # Requested at lower quality is farther from viewport
+            return (strip_data.requested_quality or StripQuality.PREVIEW).value, strip_data.last_accessed
+
+        strips = [
+            strip_data for strips in self.cache.values() for strip_data in strips.values()
+            if strip_data.requested_quality is not StripQuality.HIGH
+        ]
+        downgradable = sorted(
+            (
+                strip_data for strip_data in strips
+                if strip_data.pixmap is not None and strip_data.loaded_quality.value > (strip_data.requested_quality or StripQuality.PREVIEW).value
+            ),
+            key=lambda strip_data: (-strip_data.loaded_quality.value, *farthest_first(strip_data)),
+        )
+        downgraded = 0
+        for strip_data in downgradable:
+            if self.current_memory_usage <= self.max_memory:
+                break
+            if strip_data.preview_pixmap is None:   # Scaled down from what is held, page may be gone already
+                self._set_preview(strip_data, strip_data.pixmap.scaled(
+                    max(1, int(strip_data.pixmap.width() * SCALE_FACTORS[StripQuality.PREVIEW])),
+                    max(1, int(strip_data.pixmap.height() * SCALE_FACTORS[StripQuality.PREVIEW])),
+                    Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation
+                ))
+            self._set_pixmap(strip_data, None, None)
+            downgraded += 1
+            self.strip_loaded.emit(strip_data.info.image_name, strip_data.info.index, strip_data)
+
+        dropped = 0
+        for strip_data in sorted(strips, key=farthest_first):
+            if self.current_memory_usage <= self.max_memory:
+                break
+            if strip_data.pixmap is None and strip_data.preview_pixmap is None:
+                continue
+            self._set_pixmap(strip_data, None, None)
+            self._set_preview(strip_data, None)
+            info = strip_data.info
+            del self.cache[info.image_name][info.index]
+            if not self.cache[info.image_name]:
+                del self.cache[info.image_name]
+            dropped += 1
+            self.strip_unloaded.emit(info.image_name, info.index)
+
+        logger.debug(f"StripCache: downgraded {downgraded}, dropped {dropped} strips, total: {self.current_memory_usage}")
     
     def _estimate_pixmap_memory(self, pixmap: QPixmap) -> int:
         """Estimate memory usage of a pixmap in bytes"""
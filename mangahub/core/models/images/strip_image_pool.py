@@ -0,0 +1,67 @@
+import threading
+from collections import deque
+
+import numpy as np
+from PySide6.QtGui import QImage
+
+from resources.enums import StorageSize
+from config import Config
+
+
+class StripImagePool:
+    """
+    Reusable `QImage`s of strip sizes, so loading strip fills memory of evicted one instead of allocating.
+
+    Pyramid rows are in `Format_RGB32` byte order already, so `fill` is one plain copy of them,
+    and `QPixmap.fromImage` of raster backend shares pixels of filled image instead of converting them.
+    Image is released once its pixmap is dropped from cache. If something still shows that pixmap,
+    Qt detaches image on next fill, so reuse is never visible, it only costs allocation it was meant to save.
+    Free images are kept up to `max_memory`, thread safe, filled by strip workers and released from GUI thread.
+    """
+
+    FORMAT = QImage.Format.Format_RGB32
+
+    def __init__(self, max_memory: int | StorageSize | None = None):
+        self.max_memory = StorageSize(max_memory if max_memory is not None else Config.Performance.MangaViewer.strip_pool_budget())
+        self.allocated = 0
+        self.reused = 0
+        self._free: dict[tuple[int, int], deque[QImage]] = {}  # (width, height) -> images
+        self._free_memory = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, width: int, height: int) -> QImage:
+        with self._lock:
+            images = self._free.get((width, height))
+            if images:
+                image = images.pop()
+                self._free_memory -= image.sizeInBytes()
+                self.reused += 1
+                return image
+            self.allocated += 1
+        return QImage(width, height, self.FORMAT)
+
+    def release(self, image: QImage):
+        size = image.sizeInBytes()
+        with self._lock:
+            if image.format() != self.FORMAT or self._free_memory + size > self.max_memory.bytes_value:
+                return
+            self._free.setdefault((image.width(), image.height()), deque()).append(image)
+            self._free_memory += size
+
+    def fill(self, rows: np.ndarray) -> QImage:
+        """Image of height x width x 4 RGB32 `rows`, copied once"""
+        height, width = rows.shape[:2]
+        image = self.acquire(width, height)
+        line = image.bytesPerLine()     # Lines are 4 byte aligned, RGB32 needs no padding
+        pixels = np.frombuffer(image.bits(), dtype=np.uint8, count=line * height).reshape(height, line // 4, 4)
+        pixels[:, :width] = rows
+        return image
+
+    @property
+    def free_memory(self) -> StorageSize:
+        return StorageSize(self._free_memory)
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self._free_memory = 0
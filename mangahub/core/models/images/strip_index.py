@@ -0,0 +1,53 @@
+from bisect import bisect_left, bisect_right
+from typing import Iterable
+
+from .strip import StripInfo
+
+
+class StripIndex:
+    """
+    Strips of all images of a chapter as intervals of scene y, sorted, for viewport queries.
+
+    Images are stacked and strips of an image do not overlap, so both starts and ends are sorted,
+    and strips overlapping a window are one contiguous run found by two bisections.
+    Built once per layout change, queried on every viewport change.
+    """
+
+    def __init__(self):
+        self._starts: list[float] = []
+        self._ends: list[float] = []
+        self._strips: list[tuple[int, StripInfo]] = []  # image index, strip
+
+    def build(self, images: Iterable[tuple[int, float, float, list[StripInfo]]]):
+        """From (image index, scene y, scale, strips) of every image"""
+        entries = []
+        for index, y, scale, strips in images:
+            for strip in strips:
+                entries.append((y + strip.y_start * scale, y + strip.y_end * scale, index, strip))
+        entries.sort(key=lambda entry: entry[0])
+
+        self._starts = [start for start, _, _, _ in entries]
+        self._ends = [end for _, end, _, _ in entries]
+        self._strips = [(index, strip) for _, _, index, strip in entries]
+
+    def _range(self, top: float, bottom: float) -> tuple[int, int]:
+        return bisect_right(self._ends, top), bisect_left(self._starts, bottom)
+
+    def query(self, top: float, bottom: float) -> list[tuple[int, StripInfo]]:
+        """(image index, strip) of strips overlapping `top:bottom`, top to bottom"""
+        first, last = self._range(top, bottom)
+        return self._strips[first:last]
+
+    def query_by_image(self, top: float, bottom: float) -> dict[int, list[StripInfo]]:
+        """Strips overlapping `top:bottom` grouped by image index"""
+        by_image: dict[int, list[StripInfo]] = {}
+        for index, strip in self.query(top, bottom):
+            by_image.setdefault(index, []).append(strip)
+        return by_image
+
+    def count(self, top: float, bottom: float) -> int:
+        first, last = self._range(top, bottom)
+        return max(0, last - first)
+
+    def __len__(self) -> int:
+        return len(self._strips)
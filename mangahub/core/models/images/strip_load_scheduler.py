@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import os
+from typing import Callable
+
+from PySide6.QtCore import QObject, Slot
+from loguru import logger
+
+from .page_buffer import PageBuffer
+from .strip import StripInfo
+from resources.enums import StripQuality
+from utils import ThreadingManager, Worker
+
+
+class StripLoadScheduler(QObject):
+    """
+    Priority queue of strip loads, nearest to viewport first, lower quality first at same distance.
+
+    Requests for same strip are coalesced, latest one wins. Queued requests of image that left
+    cull window are cancelled, loads already running finish and their result is kept.
+    At most `max_in_flight` loads run at once, so queue order is what decides what is loaded next.
+    Used from GUI thread only, `on_loaded` and `on_error` are called there.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[StripInfo, StripQuality, PageBuffer], object],
+        on_loaded: Callable[[StripInfo, StripQuality, object], None],
+        on_error: Callable[[StripInfo, StripQuality, tuple], None] | None = None,
+        max_in_flight: int | None = None,
+    ):
+        super().__init__()
+        self.load = load
+        self.on_loaded = on_loaded
+        self.on_error = on_error
+        self.max_in_flight = max_in_flight or os.cpu_count() or 1
+
+        self._queue: list[tuple[tuple, int, tuple[str, int]]] = []  # priority, seq, strip key
+        self._pending: dict[tuple[str, int], tuple[tuple, int, StripInfo, StripQuality, PageBuffer]] = {}
+        self._running: dict[str, tuple[StripInfo, StripQuality]] = {}  # worker name -> strip
+        self._seq = itertools.count()
+
+    def submit(self, strip_info: StripInfo, quality: StripQuality, page: PageBuffer, distance: float = 0.0):
+        key = (strip_info.image_name, strip_info.index)
+        if any(info == strip_info and running is quality for info, running in self._running.values()):
+            self._pending.pop(key, None)    # Already being loaded, older queued request is stale
+            return                          # Load of strip regenerated since is not, its result is dropped
+
+        priority = (distance, quality.value)
+        queued = self._pending.get(key)
+        if queued is not None and queued[0] == priority and queued[2] == strip_info and queued[3] is quality:
+            return
+        seq = next(self._seq)
+        self._pending[key] = (priority, seq, strip_info, quality, page)
+        heapq.heappush(self._queue, (priority, seq, key))
+        if len(self._queue) > 4 * len(self._pending) + 64:     # Superseded entries are skipped lazily, drop them at some point
+            self._queue = [(priority, seq, key) for key, (priority, seq, *_) in self._pending.items()]
+            heapq.heapify(self._queue)
+        self._dispatch()
+
+    def cancel(self, image_name: str) -> list[int]:
+        """Drop queued requests of image, returns indexes of cancelled strips"""
+        cancelled = [index for name, index in self._pending if name == image_name]
+        for index in cancelled:
+            del self._pending[(image_name, index)]
+        return cancelled
+
+    def is_pending(self, image_name: str, index: int) -> bool:
+        return (image_name, index) in self._pending
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _dispatch(self):
+        while self._queue and len(self._running) < self.max_in_flight:
+            _, seq, key = heapq.heappop(self._queue)
+            queued = self._pending.get(key)
+            if queued is None or queued[1] != seq:   # Cancelled or superseded
+                continue
+            del self._pending[key]
+            _, _, strip_info, quality, page = queued
+
+            name = f"strip_load_{strip_info.image_name}_{strip_info.index}_{quality.name}_{seq}"
+            self._running[name] = (strip_info, quality)
+            worker = Worker(name, self.load, strip_info, quality, page)
+            worker.signals.success.connect(self._on_success)
+            worker.signals.error.connect(self._on_error)
+            worker.signals.finished.connect(self._on_finished)
+            self._start(worker)     # Connected before start, so fast load can not finish unnoticed
+
+    def _start(self, worker: Worker):
+        ThreadingManager.run_worker(worker, worker.name)
+
+    @Slot(str, object)
+    def _on_success(self, name: str, result: object):
+        if name in self._running:
+            self.on_loaded(*self._running[name], result)
+
+    @Slot(str, tuple)
+    def _on_error(self, name: str, error: tuple):
+        if name not in self._running:
+            return
+        if self.on_error is not None:
+            self.on_error(*self._running[name], error)
+        else:
+            logger.error(f"Strip loading failed: {name}, error: {error}")
+
+    @Slot(str)
+    def _on_finished(self, name: str):
+        self._running.pop(name, None)
+        self._dispatch()
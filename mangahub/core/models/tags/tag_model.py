@@ -16,6 +16,11 @@ class TagModel(BaseModel):
         self.tags.remove(tag_name)
         return self
         
+    def __setattr__(self, name: str, value) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).model_fields:     # Assigned field is saved, in-place changes set `_changed` themselves
+            self._changed = True
+
     def set_changed(self, value: bool=True) -> Self:
         self._changed = value
         return self
@@ -1,6 +1,6 @@
 from abc import ABC
-from application.services.parsers import TagModelsJsonParser
+from application.services.parsers import ModelsSqliteParser
 
 
-class ChapterDataRepository[KT, DT](ABC, TagModelsJsonParser[KT, DT]):
+class ChapterDataRepository[KT, DT](ABC, ModelsSqliteParser[KT, DT]):
     pass
\ No newline at end of file
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from pathlib import Path
 from loguru import logger
-from application.services.parsers import TagModelsJsonParser
+from application.services.parsers import ModelsSqliteParser
 from ..abstract.chapter_data_repository import ChapterDataRepository
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -10,7 +10,7 @@ if TYPE_CHECKING:
 
 class ChapterNotFoundError(Exception): ...
 
-class ChaptersRepository[CP: AbstractChapter, CDR: ChapterDataRepository](TagModelsJsonParser[float, CP]):
+class ChaptersRepository[CP: AbstractChapter, CDR: ChapterDataRepository](ModelsSqliteParser[float, CP]):
     def __init__(self, file: Path | str, model: CP, chapter_data_repo: CDR):
         super().__init__(file, model, float)
         self.chapter_data_repo = chapter_data_repo
@@ -30,9 +30,10 @@ class ChaptersRepository[CP: AbstractChapter, CDR: ChapterDataRepository](TagMod
         return chapter
         
     def save(self):
-        for chapter in self._models_collection.values():
-            if (repo := chapter._repo) is not None:
-                repo.save()
-            else:
-                logger.warning(f'ChapterRepository: {chapter} does not have a repo (from chapter._repo) when trying to save')
-        super().save()
\ No newline at end of file
+        with self.store.transaction():
+            for chapter in self._models_collection.values():
+                if (repo := chapter._repo) is not None:
+                    repo.save()
+                else:
+                    logger.warning(f'ChapterRepository: {chapter} does not have a repo (from chapter._repo) when trying to save')
+            super().save()
\ No newline at end of file
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from pathlib import Path
 from loguru import logger
-from application.services.parsers import TagModelsJsonParser
+from application.services.parsers import ModelsSqliteParser
 from .chapters_repository import ChaptersRepository
 from core.interfaces import AbstractMedia, AbstractChapter
 
@@ -9,7 +9,7 @@ from core.interfaces import AbstractMedia, AbstractChapter
 class MediaNotFoundError(Exception): ...
 
 class MediaRepository[MT: AbstractMedia, CT: AbstractChapter, CRT: ChaptersRepository[CT]](
-    TagModelsJsonParser[str, MT]
+    ModelsSqliteParser[str, MT]
 ):
     def __init__(self, file: Path | str, model: MT, chapter_model: CT, chapter_repository_model: CRT):
         super().__init__(file, model, str)
@@ -31,9 +31,10 @@ class MediaRepository[MT: AbstractMedia, CT: AbstractChapter, CRT: ChaptersRepos
         return media
     
     def save(self):
-        for model in self._models_collection.values():
-            if model._chapters_repo:
-                model._chapters_repo.save()
-            else:
-                logger.warning(f'{model} does not have a _chapters_repo attribute when trying to save')
-        super().save()
+        with self.store.transaction():  # Whole library in one commit
+            for model in self._models_collection.values():
+                if model._chapters_repo:
+                    model._chapters_repo.save()
+                else:
+                    logger.warning(f'{model} does not have a _chapters_repo attribute when trying to save')
+            super().save()
@@ -1,11 +1,13 @@
+import mmap
 import traceback
-import io
+from concurrent.futures import Future
 from PySide6.QtCore import QObject, Signal
 from PySide6.QtGui import QPixmap, QImage
 from PIL import Image, ImageQt
 
 from core.models.images import ImageCache
 from utils import ThreadingManager, Worker
+from utils.image_conversion import MemoryReader
 
 
 class ImageDecoderSignals(QObject):
@@ -21,24 +23,30 @@ class ImageDecoder(QObject):
         self.cache = cache
     
     def decode(self, name: str) -> Worker:
-        if not (image := self.cache.get(name)):
-            self.signals.decoding_failed.emit(name, f'No image {name} in cache {self.cache}')
-        return ThreadingManager.run(self._decode_from_bytes_thread, name, image)
+        return self.decode_from_cache(self.cache, name)
         
     @classmethod
     def decode_from_cache(cls, cache: ImageCache, name: str) -> Worker:
-        if not (image := cache.get(name)):
-            cls.signals.decoding_failed.emit(name, f'No image {name} in cache {cache}')
-        return ThreadingManager.run(cls._decode_from_bytes_thread, name, image)
+        return ThreadingManager.run(cls._decode_from_cache_thread, name, cache.get_async(name))  # Disc read is not done on caller thread
         
     @classmethod
     def decode_from_bytes(cls, image: bytes, name: str) -> Worker:
         return ThreadingManager.run(cls._decode_from_bytes_thread, name, image)
     
     @classmethod
-    def _decode_from_bytes_thread(cls, name: str, image: bytes):
+    def _decode_from_cache_thread(cls, name: str, future: Future):
+        try:
+            image = future.result()
+        except Exception as e:
+            cls.signals.decoding_failed.emit(name, str(e))
+            return None
+        return cls._decode_from_bytes_thread(name, image)
+    
+    @classmethod
+    def _decode_from_bytes_thread(cls, name: str, image: bytes | mmap.mmap):
         try:
-            result = QPixmap.fromImage(ImageQt.ImageQt(Image.open(io.BytesIO(image))))
+            with MemoryReader(image) as reader:  # Decoded straight from mmap of large files, without copy
+                result = QPixmap.fromImage(ImageQt.ImageQt(Image.open(reader)))
             cls.signals.image_decoded.emit(name, result)
             return result
         except Exception as e:
@@ -172,6 +172,12 @@ class MainWindow(QMainWindow):
         self.app_controller.manga_signals.image_loaded.connect(
             self.manga_viewer.on_image_downloaded
         )
+        self.manga_viewer.reading_position_changed.connect(
+            lambda i, _: self.app.download_manager.set_download_focus(i)
+        )
+        self.manga_viewer.reading_position_changed.connect(
+            self.app_controller.prefetcher.update_position
+        )
 
         self.add_manga_window.find_button.clicked.connect(
             lambda: self.app_controller.find_manga_sites(
@@ -11,7 +11,9 @@ from PySide6.QtGui import QBrush, QColor, QFont, QPainter, QPen
 from PySide6.QtWidgets import QGraphicsItem, QGraphicsRectItem, QGraphicsTextItem
 
 from config import Config
-from resources.enums import SU
+from core.models.images import ImageCacheStats
+from utils import FrameRecorder, FrameReport
+from resources.enums import SU, StorageSize
 
 
 class PerformanceMetrics(BaseModel):
@@ -24,6 +26,14 @@ class PerformanceMetrics(BaseModel):
     cache_miss_count: int = 0
     cache_hit_count: int = 0
     
+    # Image cache metrics
+    image_cache_ram: int = 0  # bytes
+    image_cache_disc: int = 0  # bytes
+    image_cache_hit_rate: float = 0.0
+    image_cache_hits: int = 0
+    image_cache_misses: int = 0
+    image_cache_evictions: int = 0  # ram -> disc and disc -> deleted
+    
     # Loading metrics  
     strips_loading: int = 0
     strips_loaded_total: int = 0
@@ -42,6 +52,13 @@ class PerformanceMetrics(BaseModel):
     strips_in_preview: int = 0
     viewport_updates_per_second: float = 0.0
     
+    # Frame metrics
+    frames: int = 0
+    dropped_frames: int = 0
+    frame_time_p50_ms: float = 0.0
+    frame_time_p95_ms: float = 0.0
+    frame_work_ms: dict[str, float] = field(default_factory=dict)  # GUI thread work -> average ms per frame
+    
     # Threading metrics
     active_workers: int = 0
     queued_workers: int = 0
@@ -87,6 +104,7 @@ class PerformanceMonitor(QObject):
         self.load_start_times: dict[str, float] = {}  # worker_name -> start_time
         self.detection_start_times: dict[str, float] = {}
         self.viewport_update_times: list[float] = []
+        self.frame_recorder: Optional[FrameRecorder] = None     # Set by viewer, reported with other metrics
         
         # Update timer
         self.update_timer = QTimer()
@@ -209,6 +227,18 @@ class PerformanceMonitor(QObject):
         self.metrics.strips_in_buffer = in_buffer  
         self.metrics.strips_in_preview = in_preview
     
+    def update_image_cache(self, stats: ImageCacheStats, ram_bytes: int, disc_bytes: int):
+        """Update image cache metrics"""
+        if not self.enabled:
+            return
+            
+        self.metrics.image_cache_ram = ram_bytes
+        self.metrics.image_cache_disc = disc_bytes
+        self.metrics.image_cache_hit_rate = stats.hit_rate
+        self.metrics.image_cache_hits = stats.hits
+        self.metrics.image_cache_misses = stats.misses
+        self.metrics.image_cache_evictions = stats.ram_evictions + stats.disc_evictions
+    
     def update_worker_counts(self, active: int, queued: int, by_type: dict[str, int]):
         """Update thread worker metrics"""
         if not self.enabled:
@@ -218,9 +248,22 @@ class PerformanceMonitor(QObject):
         self.metrics.queued_workers = queued
         self.metrics.worker_types_active = by_type.copy()
     
+    def update_frame_times(self, report: FrameReport):
+        """Update frame time metrics"""
+        if not self.enabled:
+            return
+            
+        self.metrics.frames = report.frames
+        self.metrics.dropped_frames = report.dropped_frames
+        self.metrics.frame_time_p50_ms = report.p50_ms
+        self.metrics.frame_time_p95_ms = report.p95_ms
+        self.metrics.frame_work_ms = report.work_ms.copy()
+    
     def _emit_metrics(self):
         """Emit current metrics"""
         if self.enabled:
+            if self.frame_recorder is not None:
+                self.update_frame_times(self.frame_recorder.report())
             self.metrics_updated.emit(self.metrics)
 
 
@@ -369,7 +412,7 @@ class DebugOverlay(QGraphicsItem):
             viewport_rect.right() - 250,
             viewport_rect.top() + 10,
             240,
-            200
+            312
         )
         
         # Background
@@ -396,8 +439,16 @@ class DebugOverlay(QGraphicsItem):
             f"Avg Detection: {self.metrics.average_detection_time_ms:.1f}ms",
             f"",
             f"Viewport FPS: {self.metrics.viewport_updates_per_second:.1f}",
+            f"Frame p50/p95: {self.metrics.frame_time_p50_ms:.1f}/{self.metrics.frame_time_p95_ms:.1f}ms",
+            f"Dropped Frames: {self.metrics.dropped_frames}/{self.metrics.frames}",
+            f"Strip Work/Frame: {self.metrics.frame_work_ms.get('update_visible_strips', 0):.2f}ms",
             f"Active Workers: {self.metrics.active_workers}",
             f"Queued Workers: {self.metrics.queued_workers}",
+            f"",
+            f"Image Cache Hit Rate: {self.metrics.image_cache_hit_rate:.1%}",
+            f"Hits/Misses: {self.metrics.image_cache_hits}/{self.metrics.image_cache_misses}",
+            f"Evictions: {self.metrics.image_cache_evictions}",
+            f"Cache RAM/Disc: {self.metrics.image_cache_ram / (1024 * 1024):.0f}/{self.metrics.image_cache_disc / (1024 * 1024):.0f}MB",
         ]
         
         for line in perf_lines:
@@ -425,7 +476,7 @@ class DebugOverlay(QGraphicsItem):
         painter.setPen(QPen(QColor(255, 255, 255, 255)))
         
         total_mb = self.metrics.total_memory_used / (1024 * 1024)
-        memory_limit_mb = 100
+        memory_limit_mb = StorageSize(Config.Performance.MangaViewer.strip_cache_budget()).bytes_value / (1024 * 1024)
         usage_percent = (total_mb / memory_limit_mb) * 100 if memory_limit_mb > 0 else 0
         
         y_offset = memory_rect.top() + 20
@@ -434,7 +485,7 @@ class DebugOverlay(QGraphicsItem):
         memory_lines = [
             "=== MEMORY ===",
             f"Total: {total_mb:.1f}MB",
-            f"Limit: {memory_limit_mb}MB",
+            f"Limit: {memory_limit_mb:.0f}MB",
             f"Usage: {usage_percent:.1f}%",
             "",
             "By Quality:",
@@ -1,11 +1,9 @@
 import math
-from PySide6.QtCore import Qt, QRectF
-from PySide6.QtGui import QPixmap
+from PySide6.QtCore import QRectF
 from PySide6.QtWidgets import QGraphicsPixmapItem
 from loguru import logger
 
-from gui import ImageDecoder
-from core.models.images import ImageMetadata, ImageCache, StripInfo, StripData, StripCache
+from core.models.images import ImageMetadata, ImageCache, StripInfo, StripData, StripCache, PageBuffer
 from application.services import ContentAwareTileManager
 from .manga_strip_item import MangaStripItem
 
@@ -13,7 +11,14 @@ from resources.enums import StripQuality
 
 
 class MangaImageItem(QGraphicsPixmapItem):
-    """Custom graphics item for manga images with strip-based rendering"""
+    """
+    Page of manga, shown as strips that `StripCache` loads at quality depending on distance from viewport.
+
+    Uniform strips are shown at once, replaced by content-aware ones when panel analysis of page is done,
+    stored results of pages seen before arrive while binding.
+    Exists only while its page is in cull window of viewer, which then `unbind`s it and `bind`s it to other page,
+    so strips held do not grow with chapter length.
+    """
 
     def __init__(
         self,
@@ -25,73 +30,80 @@ class MangaImageItem(QGraphicsPixmapItem):
         parent=None,
     ):
         super().__init__(parent)
-        self.index = index
-        self.metadata = metadata
         self.tile_manager = tile_manager
         self.strip_cache = strip_cache
         self.image_cache = image_cache
-        self.image_decoder = ImageDecoder(image_cache)
 
-        self.strips = []
+        self.metadata: ImageMetadata | None = None
+        self.strips: list[StripInfo] = []
         self.strip_items: dict[int, MangaStripItem] = {}
+        self.page: PageBuffer | None = None    # Held while item is in cull window
+        self.bind(index, metadata)
 
-        if metadata.width > 0 and metadata.height > 0:
-            placeholder = QPixmap(metadata.width, metadata.height)
-            placeholder.fill(Qt.GlobalColor.darkGray)
-        ImageDecoder.decode_from_cache(image_cache, metadata.name).signals.success.connect(lambda name, img: self.setPixmap(img))
-
-        # Generate initial strips
-        # self.strips = tile_manager.generate_strips(metadata)
-        # self._create_strip_items()
-        
-        # tile_manager.strips_generated.connect(self._on_strips_generated)
-        # strip_cache.strip_loaded.connect(self._on_strip_loaded)
-        
-        # tile_manager.analyze_panel_async(metadata, image_cache.get(metadata.name))
-    
-    def _create_strip_items(self):
-        """Create graphics items for each strip"""
-        for strip in self.strips:
+    def bind(self, index: int, metadata: ImageMetadata):
+        """Show page of `metadata` as strips, which are loaded once viewer requests them"""
+        self.index = index
+        self.metadata = metadata
+        self._set_strips(self.tile_manager.generate_strips(metadata))
+
+        self.tile_manager.strips_generated.connect(self._on_strips_generated)
+        self.strip_cache.strip_loaded.connect(self._on_strip_loaded)
+        self.strip_cache.strip_unloaded.connect(self._on_strip_unloaded)
+        name = metadata.name    # Read only if page has to be analyzed, on worker
+        self.tile_manager.analyze_panel_async(metadata, lambda: self.image_cache.get_async(name))
+
+    def unbind(self):
+        """Let go of page and its strips, item can be bound to other page after"""
+        self.tile_manager.strips_generated.disconnect(self._on_strips_generated)
+        self.strip_cache.strip_loaded.disconnect(self._on_strip_loaded)
+        self.strip_cache.strip_unloaded.disconnect(self._on_strip_unloaded)
+        self.release_page()
+        self._set_strips([])
+        self.setScale(1.0)
+        self.metadata = None
+
+    def _set_strips(self, strips: list[StripInfo]):
+        for strip_item in self.strip_items.values():
+            strip_item.setParentItem(None)
+        self.strip_items.clear()
+        self.strips = strips
+        for strip in strips:
             strip_item = MangaStripItem(self)
-            strip_item.setPos(0, strip.y_start) # -strip.width//2
+            strip_item.setPos(0, strip.y_start)
             self.strip_items[strip.index] = strip_item
 
     def _on_strips_generated(self, image_name: str, strips: list[StripInfo]):
-        if image_name != self.metadata.name:
+        if self.metadata is None or image_name != self.metadata.name or strips == self.strips:
             return
-        self._transition_to_strips(strips)
-
-    def _transition_to_strips(self, new_strips: list[StripInfo]):
-        """Transition from uniform to content-aware strips"""
-        logger.debug(f"Transitioning to {len(new_strips)} content-aware strips")
-
-        self.strips = new_strips
-
-        # Remove old strip items
-        for strip_item in self.strip_items.values():
-            strip_item.setParentItem(None)
-        self.strip_items.clear()
-
-        # Create new strip items
-        self._create_strip_items()
-        self.setPixmap(QPixmap(self.pixmap().size()))
+        logger.debug(f"Transitioning {image_name} to {len(strips)} content-aware strips")
+        self._set_strips(strips)    # Cached strips of old geometry are replaced once requested
 
     def _on_strip_loaded(self, image_name: str, strip_index: int, strip: StripData):
-        """Handle strip loading completion"""
-        if image_name != self.metadata.name:
+        if self.metadata is None or image_name != self.metadata.name:
             return
+        if (strip_item := self.strip_items.get(strip_index)) is None or strip.info != self.strips[strip_index]:
+            return
+        pixmap = strip.pixmap or strip.preview_pixmap   # Downgraded strips only have preview
+        if pixmap is not None:
+            strip_item.show_strip(pixmap, strip.info.width)
 
-        print('Strip loaded', image_name, strip)
+    def _on_strip_unloaded(self, image_name: str, strip_index: int):
+        """Strip was evicted from cache, it is loaded again once requested"""
+        if self.metadata is None or image_name != self.metadata.name:
+            return
         if strip_index in self.strip_items:
-            strip_info = next((s for s in self.strips if s.index == strip_index), None)
-            if strip_info:
-                pixmap = strip.pixmap
-                if pixmap:
-                    self.strip_items[strip_index].setPixmap(pixmap)
-
-    def update_viewport_strips(self, viewport_rect: QRectF, buffer_multiplier: float):
-        """Update strip loading based on viewport"""
-        if not self.strips:
+            self.strip_items[strip_index].show_strip(None)
+
+    def update_viewport_strips(
+        self, viewport_rect: QRectF, buffer_multiplier: float, strips: list[StripInfo] | None = None, fling: bool = False
+    ):
+        """
+        Update strip loading based on viewport, of `strips` in cull window if viewer knows them, of all otherwise.
+        `viewport_rect` is where viewport is and will be scrolled to soon, distances are from it.
+        During `fling` only previews are requested, full quality follows once scrolling settles.
+        """
+        strips = self.strips if strips is None else strips
+        if not strips:
             return
 
         # Calculate expanded viewport with buffer
@@ -103,21 +115,39 @@ class MangaImageItem(QGraphicsPixmapItem):
             viewport_rect.height() + 2 * buffer_height,
         )
 
-        for strip in self.strips:
-            strip_rect = QRectF(-strip.width//2, strip.y_start, strip.width, strip.height)
+        window = self.mapRectFromScene(expanded_rect)
+        if window.bottom() < 0 or window.top() > self.metadata.height:    # Out of cull window, pixmap may not be set yet
+            self.release_page()
+            return
+        if self.page is None:   # Decoded once by first strip worker, shared by all strips, image is not read if pyramid was saved
+            name = self.metadata.name     # Read on strip worker, item may be bound to other page by then
+            self.page = self.strip_cache.pages.acquire(
+                name, lambda: self.image_cache.get_async(name), self.image_cache.content_key(name)
+            )
+
+        viewport = self.mapRectFromScene(viewport_rect)
+        for strip in strips:
+            strip_rect = QRectF(0, strip.y_start, strip.width, strip.height)
 
             # Determine required quality based on distance from viewport
             distance_from_viewport = self._calculate_distance_to_viewport(
-                strip_rect, self.mapRectFromScene(expanded_rect)
+                strip_rect, viewport
             )
 
-            required_quality = self._calculate_required_quality(distance_from_viewport)
+            required_quality = StripQuality.PREVIEW if fling else self._calculate_required_quality(distance_from_viewport)
 
             # Request strip at required quality
             self.strip_cache.request(
-                strip, required_quality, self.image_cache.get(self.metadata.name)
+                strip, required_quality, self.page, distance_from_viewport
             )
 
+    def release_page(self):
+        """Let decoded page and queued strip loads go once item leaves cull window, strips already loaded stay"""
+        if self.page is not None:
+            self.strip_cache.cancel(self.metadata.name)
+            self.strip_cache.pages.release(self.metadata.name)
+            self.page = None
+
     def _calculate_distance_to_viewport(
         self, strip_rect: QRectF, viewport_rect: QRectF
     ) -> float:
@@ -1,9 +1,18 @@
+from PySide6.QtCore import Qt
 from PySide6.QtGui import QPixmap
 from PySide6.QtWidgets import QGraphicsPixmapItem
 
 
 class MangaStripItem(QGraphicsPixmapItem):
     def __init__(self, parent, pixmap: QPixmap | None=None):
-        super().__init__(parent or QPixmap())
-        self.setPixmap(pixmap)
-        self.setCacheMode(QGraphicsPixmapItem.CacheMode.DeviceCoordinateCache)
\ No newline at end of file
+        super().__init__(parent)
+        self.setCacheMode(QGraphicsPixmapItem.CacheMode.DeviceCoordinateCache)
+        self.setTransformationMode(Qt.TransformationMode.SmoothTransformation)
+        self.show_strip(pixmap)
+
+    def show_strip(self, pixmap: QPixmap | None, width: int = 0):
+        """Pixmap of strip at any quality, scaled up to `width` of strip"""
+        if pixmap is not None and pixmap.cacheKey() == self.pixmap().cacheKey():    # Cached strips are emitted on every request
+            return
+        self.setPixmap(pixmap if pixmap is not None else QPixmap())
+        self.setScale(width / pixmap.width() if pixmap is not None and width and pixmap.width() else 1.0)
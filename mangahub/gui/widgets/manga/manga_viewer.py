@@ -1,73 +1,120 @@
 from __future__ import annotations
-import importlib
 
-from PySide6.QtCore import Qt, QRectF, QPointF
-from PySide6.QtGui import QWheelEvent
+from PySide6.QtCore import Qt, QRectF, QPointF, QTimer, Signal
+from PySide6.QtGui import QPaintEvent, QWheelEvent
 from PySide6.QtWidgets import (
     QGraphicsView,
     QGraphicsScene,
 )
 
+from pathlib import Path
 from loguru import logger
 
 # from gui.widgets import IconRepo
 # from gui.widgets.buttons import IconButton
 from gui.widgets.scroll_areas import SmoothScrollMixin
 from application.services import ContentAwareTileManager
-from core.models.images import ImageMetadata, ImageCache, StripCache
+from core.models.images import ImageMetadata, ImageCache, StripCache, StripIndex, PageLayout, PanelResultIndex, ScrollPredictor
 from .manga_image_item import MangaImageItem
 from .debug import DebugCapableMixin
 
+from utils import FrameRecorder
 from config import Config
 
 
 class MangaViewer(QGraphicsView, SmoothScrollMixin, DebugCapableMixin):
+    """
+    Chapter pages stacked vertically, virtualized.
+
+    Every downloaded page has record in `pages` and place in `page_layout`, but graphics item only while
+    it is within `cull_height_multiplier` viewport heights. Items leaving that window are unbound and pooled,
+    then bound to pages entering it, so items and decoded pages held do not grow with chapter length.
+    While scrolling, window is stretched to where `scroll_predictor` expects viewport within its horizon,
+    and strips are only previewed during fling, until scrolling settles for `SETTLE_MS`.
+    Paints and GUI thread work for them are timed by `frame_recorder` in debug mode, see `export_frame_trace`.
+    """
+
+    reading_position_changed = Signal(int, float)   # image index, progress in image
+    ITEM_POOL_SIZE = 8
+    SETTLE_MS = 150
+    
     def __init__(self, image_cache: ImageCache, parent=None):
         super().__init__(parent)
         self.init_smooth_scroll(vertical=True)
 
-        self._scene = QGraphicsScene()
+        self._scene = QGraphicsScene(self)
         self.setScene(self._scene)
         self.setup_debug_monitoring()
         
-        self.tile_manager = ContentAwareTileManager()
-        self.strip_cache = StripCache()
+        self.frame_recorder = FrameRecorder(enabled=Config.debug_mode())
+        if self.performance_monitor:
+            self.performance_monitor.frame_recorder = self.frame_recorder
+        
+        self.strip_cache = StripCache(pyramid_path=Config.Dirs.CACHE.MIPS, frame_recorder=self.frame_recorder)
+        self.tile_manager = ContentAwareTileManager(
+            image_cache, PanelResultIndex(Config.Dirs.CACHE.PANELS), self.strip_cache.pages
+        )   # Pages are analyzed from pixels strips are cut from
+        self.tile_manager.strips_generated.connect(self._invalidate_strip_index)
         self.image_cache = image_cache
         
-        self.manga_items: dict[int, MangaImageItem] = {}  # index -> MangaImageItem
-        self.image_positions: dict[int, float] = {}       # index -> y_position
+        self.pages: dict[int, ImageMetadata] = {}  # index -> metadata, of every downloaded page
+        self.manga_items: dict[int, MangaImageItem] = {}  # index -> MangaImageItem, of pages in cull window only
+        self._item_pool: list[MangaImageItem] = []
 
         self.images = []
+        self.strip_index = StripIndex()
+        self._strip_index_dirty = True
+        self._items_in_window: set[int] = set()    # Items given strips on last viewport update
+        self._reading_index = -1
         self.current_zoom = 1.0
         self.fit_to_width = False
         
         self.cull_height_multiplier = Config.Performance.MangaViewer.cull_height_multiplier()
         self.debug_gap = Config.UI.MangaViewer.debug_gap() if Config.debug_mode() else 0
+        self.page_layout = PageLayout(self.debug_gap)   # Sizes are known from header before image is downloaded
+        self.scroll_predictor = ScrollPredictor()
+        self._settle_timer = QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.setInterval(self.SETTLE_MS)
+        self._settle_timer.timeout.connect(self._on_scroll_settled)
+        self._strips_changed_timer = QTimer(self)  # Strips of several pages regenerated at once are requested once
+        self._strips_changed_timer.setSingleShot(True)
+        self._strips_changed_timer.setInterval(0)
+        self._strips_changed_timer.timeout.connect(self._update_visible_strips)
 
         self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.verticalScrollBar().valueChanged.connect(self._on_scrolled)
 
         logger.success(
             f"MangaViewer initialized with buffer={self.cull_height_multiplier}x, "
             f"debug_gap={self.debug_gap}px"
         )
 
-    def add_manga_image(self, index: int, metadata: ImageMetadata):
-        """Add a manga image at specific index (handles out-of-order downloads)"""
-        if index in self.manga_items:
+    def add_manga_image(self, index: int, metadata: ImageMetadata) -> MangaImageItem | None:
+        """Add a manga image at specific index (handles out-of-order downloads), its item is made if it is in cull window"""
+        if index in self.pages:
             logger.warning(f"Image at index {index} already exists, replacing")
             self._remove_manga_image(index)
         
-        # Calculate position based on index and other images
-        y_position = self._calculate_position_for_index(index)
-        self.image_positions[index] = y_position
-        
-        # Create manga item
-        manga_item = MangaImageItem(
-            index, metadata, self.tile_manager, self.strip_cache, self.image_cache
-        )
-        manga_item.setPos(-metadata.width//2, y_position)
+        # Position based on sizes of images before it, items after it move if its size was not reserved
+        self.pages[index] = metadata
+        self._set_page_size(index, metadata.width, metadata.height)
+        self._update_visible_strips()
+        return self.manga_items.get(index)
+
+    def _materialize(self, index: int) -> MangaImageItem:
+        """Item of page entering cull window, pooled one if there is any"""
+        metadata = self.pages[index]
+        if self._item_pool:
+            manga_item = self._item_pool.pop()
+            manga_item.bind(index, metadata)
+        else:
+            manga_item = MangaImageItem(
+                index, metadata, self.tile_manager, self.strip_cache, self.image_cache
+            )
+        manga_item.setPos(-metadata.width//2, self.page_layout.position(index))
         
         # Scale to fit width if needed
         if self.fit_to_width:
@@ -75,48 +122,43 @@ class MangaViewer(QGraphicsView, SmoothScrollMixin, DebugCapableMixin):
         
         self._scene.addItem(manga_item)
         self.manga_items[index] = manga_item
-        
-        # Update positions of items that come after this one
-        self._recalculate_positions_after(index)
-
-        self._update_scene_rect()
+        self._strip_index_dirty = True
         return manga_item
+
+    def _recycle(self, index: int):
+        """Unbind item of page leaving cull window and pool it"""
+        manga_item = self.manga_items.pop(index)
+        manga_item.unbind()
+        self._scene.removeItem(manga_item)
+        if len(self._item_pool) < self.ITEM_POOL_SIZE:
+            self._item_pool.append(manga_item)
+        self._items_in_window.discard(index)
+        self._strip_index_dirty = True
+
+    def _update_items_in_window(self, top: float, bottom: float):
+        in_window = self.page_layout.indexes_in(top, bottom)
+        for index in self.manga_items.keys() - set(in_window):
+            self._recycle(index)
+        for index in in_window:
+            if index in self.pages and index not in self.manga_items:
+                self._materialize(index)
     
-    def _calculate_position_for_index(self, index: int) -> float:
-        """Calculate Y position for image at given index"""
-        y_position = 0.0
-        
-        # Sum heights of all images that should come before this index
-        for i in sorted(self.image_positions.keys()):
-            if i >= index:
-                break
-            
-            if i in self.manga_items:
-                item = self.manga_items[i]
-                y_position += item.metadata.height
-                y_position += self.debug_gap  # Add gap if in debug mode
-        
-        return y_position
-    
-    def _recalculate_positions_after(self, changed_index: int):
-        """Recalculate positions for all items after the changed index"""
-        sorted_indices = sorted(self.image_positions.keys())
-        
-        for index in sorted_indices[changed_index:]:
-            new_position = self._calculate_position_for_index(index)
-            
-            if abs(new_position - self.image_positions[index]) > 1.0:  # Only update if significant change
-                self.image_positions[index] = new_position
-                if self.manga_items.get(index):
-                    self.manga_items[index].setPos(-self.manga_items[index].metadata.width//2, new_position)
+    def _set_page_size(self, index: int, width: int, height: int):
+        """Size page in `page_layout`, move items after it by change of its height and resize scene"""
+        with self.frame_recorder.span("layout"):
+            delta = self.page_layout.set(index, width, height)
+            if delta:
+                for i, item in self.manga_items.items():
+                    if i > index:
+                        item.moveBy(0, delta)
+                self._strip_index_dirty = True
+            self._update_scene_rect()
     
     def _remove_manga_image(self, index: int):
         """Remove manga image at index"""
+        self.pages.pop(index, None)
         if index in self.manga_items:
-            item = self.manga_items[index]
-            self._scene.removeItem(item)
-            del self.manga_items[index]
-            del self.image_positions[index]
+            self._recycle(index)
     
     def _apply_fit_width_scaling(self, manga_item: MangaImageItem):
         """Apply fit-to-width scaling to a manga item"""
@@ -124,6 +166,17 @@ class MangaViewer(QGraphicsView, SmoothScrollMixin, DebugCapableMixin):
         if manga_item.metadata.width > 0 and view_width > 0:
             scale_factor = view_width / manga_item.metadata.width
             manga_item.setScale(scale_factor)
+            self._strip_index_dirty = True
+
+    def paintEvent(self, event: QPaintEvent):
+        with self.frame_recorder.frame():
+            super().paintEvent(event)
+
+    def export_frame_trace(self, path: Path | None = None) -> Path:
+        """Frames recorded so far as Chrome trace JSON, for chrome://tracing or Perfetto"""
+        path = self.frame_recorder.export_trace(path or Path(Config.Dirs.LOGS) / "frame_trace.json")
+        logger.info(f"Frame trace exported to {path}: {self.frame_recorder.report()}")
+        return path
 
     def wheelEvent(self, event: QWheelEvent):
         modifiers = event.modifiers()
@@ -131,8 +184,9 @@ class MangaViewer(QGraphicsView, SmoothScrollMixin, DebugCapableMixin):
         if modifiers & Qt.KeyboardModifier.ControlModifier:
             self._handle_zoom(event)
         else:
+            self.frame_recorder.record_input("wheel", delta=event.angleDelta().y())  # Replayed by scroll benchmark
             SmoothScrollMixin.wheelEvent(self, event)
-        importlib.reload(MangaImageItem)
+            self._track_scroll()    # Target of animation is known before its first step
         self._update_visible_strips()
 
     def _handle_zoom(self, event: QWheelEvent):
@@ -163,72 +217,95 @@ class MangaViewer(QGraphicsView, SmoothScrollMixin, DebugCapableMixin):
                 self.current_zoom = scale_factor
 
     def _update_scene_rect(self):
-        if not self.manga_items:
+        if not len(self.page_layout):
             return
 
-        total_height = 0
-        max_width = 0
+        max_width = self.page_layout.max_width
+        self.scene().setSceneRect(-max_width//2, 0, max_width, self.page_layout.total_height)
 
-        for item in self.manga_items.values():
-            total_height += item.metadata.height
-            max_width = max(max_width, item.metadata.width)
+    def _invalidate_strip_index(self, *_):
+        """Strips of page were regenerated, new ones are requested on next update"""
+        self._strip_index_dirty = True
+        self._strips_changed_timer.start()
 
-            if Config.debug_mode():
-                total_height += self.debug_gap
+    def _scroll_target(self, viewport_rect: QRectF) -> float | None:
+        """Scene y viewport top is animated to, if smooth scroll is running"""
+        if not self._scroll_animation_running or self._scroll_animation.endValue() is None:
+            return None
+        scale = self.transform().m22() or 1.0
+        return viewport_rect.top() + (self._scroll_animation.endValue() - self.scroll_bar.value()) / scale
 
-        self.scene().setSceneRect(-max_width//2, 0, max_width, total_height)
+    def _track_scroll(self):
+        """Feed `scroll_predictor` with where viewport is, settling is waited for while it moves"""
+        viewport_rect = self.mapToScene(self.viewport().rect()).boundingRect()
+        self.scroll_predictor.update(viewport_rect.top(), self._scroll_target(viewport_rect))
+        if self.scroll_predictor.is_moving:
+            self._settle_timer.start()
+
+    def _on_scroll_settled(self):
+        self.scroll_predictor.reset()
+        self._update_visible_strips()   # Previews of fling are upgraded
 
     def _update_visible_strips(self):
-        """Update strip loading based on current viewport"""
-        viewport_rect = self.mapToScene(self.viewport().rect()).boundingRect()
-        
-        # Performance monitoring
-        if hasattr(self, 'performance_monitor') and self.performance_monitor:
-            strips_in_viewport = 0
-            strips_in_buffer = 0
-            strips_in_preview = 0
-            
-            for manga_item in self.manga_items.values():
-                # Count strips in different zones for monitoring
-                for strip in manga_item.strips:
-                    strip_rect = QRectF(
-                        manga_item.x(),
-                        manga_item.y() + strip.y_start,
-                        strip.width,
-                        strip.height
+        """Update strip loading of strips in cull window, found in `strip_index` instead of testing every strip"""
+        with self.frame_recorder.span("update_visible_strips"):
+            viewport_rect = self.mapToScene(self.viewport().rect()).boundingRect()
+            buffer_height = viewport_rect.height() * self.cull_height_multiplier
+            lead = self.scroll_predictor.lead(limit=buffer_height)    # Jumps are not followed through whole chapter
+            path_rect = viewport_rect.adjusted(0, min(lead, 0), 0, max(lead, 0))  # Viewport now and within horizon
+            top, bottom = path_rect.top() - buffer_height, path_rect.bottom() + buffer_height
+
+            self._update_items_in_window(top, bottom)
+            if self._strip_index_dirty:
+                with self.frame_recorder.span("strip_index"):
+                    self.strip_index.build(
+                        (index, item.y(), item.scale(), item.strips) for index, item in self.manga_items.items()
                     )
-                    
-                    if strip_rect.intersects(viewport_rect):
-                        strips_in_viewport += 1
-                    else:
-                        distance = manga_item._calculate_distance_to_viewport(
-                            QRectF(0, strip.y_start, strip.width, strip.height),
-                            manga_item.mapRectFromScene(viewport_rect)
-                        )
-                        if distance < 500:
-                            strips_in_buffer += 1
-                        else:
-                            strips_in_preview += 1
-                
-                # Update strip loading for this item
-                manga_item.update_viewport_strips(viewport_rect, self.cull_height_multiplier)
-            
-            self.performance_monitor.update_strip_counts(
-                strips_in_viewport, strips_in_buffer, strips_in_preview
-            )
-        else:
-            # Just update strip loading without monitoring
-            for manga_item in self.manga_items.values():
-                manga_item.update_viewport_strips(viewport_rect, self.cull_height_multiplier)
+                self._strip_index_dirty = False
+
+            visible = self.strip_index.query_by_image(top, bottom)
+            for index in self._items_in_window - visible.keys():    # Left cull window
+                if manga_item := self.manga_items.get(index):
+                    manga_item.release_page()
+            fling = self.scroll_predictor.is_flinging
+            for index, strips in visible.items():
+                self.manga_items[index].update_viewport_strips(path_rect, self.cull_height_multiplier, strips, fling)
+            self._items_in_window = set(visible)
+
+            # Performance monitoring
+            if hasattr(self, 'performance_monitor') and self.performance_monitor:
+                strips_in_viewport = self.strip_index.count(viewport_rect.top(), viewport_rect.bottom())
+                strips_in_window = sum(map(len, visible.values()))
+                self.performance_monitor.update_strip_counts(
+                    strips_in_viewport, strips_in_window - strips_in_viewport, len(self.strip_index) - strips_in_window
+                )
+                self.performance_monitor.update_memory_usage(
+                    self.strip_cache.current_memory_usage.bytes_value, self.strip_cache.memory_by_quality
+                )
+                self.performance_monitor.update_image_cache(
+                    self.image_cache.stats, self.image_cache.cur_ram.bytes_value, self.image_cache.cur_disc.bytes_value
+                )
+
+    def _on_scrolled(self, _value: int):
+        """Smooth scroll, scrollbar drag, keys and hand drag alike"""
+        self._track_scroll()
+        self._update_visible_strips()
+        self._update_reading_position()
+
+    def _update_reading_position(self):
+        index, progress = self.get_current_reading_position()
+        if index != self._reading_index:
+            self._reading_index = index
+            self.reading_position_changed.emit(index, progress)
 
     def on_metadata_downloaded(self, index: int, metadata: ImageMetadata):
         """Handle metadata_downloaded signal"""
         logger.debug(f"Metadata downloaded for index {index}: {metadata.name} "
                     f"({metadata.width}x{metadata.height})")
         
-        if index not in self.manga_items:
-            position = self._calculate_position_for_index(index)
-            self.image_positions[index] = position
+        if index not in self.pages:
+            # Reserve space right away, so whole chapter is laid out before images arrive
+            self._set_page_size(index, metadata.width, metadata.height)
     
     def on_image_downloaded(self, index: int, metadata: ImageMetadata):
         """Handle image_downloaded signal"""
@@ -241,23 +318,17 @@ class MangaViewer(QGraphicsView, SmoothScrollMixin, DebugCapableMixin):
         viewport_center_y = viewport_rect.center().y()
         
         # Find which image the viewport center is in
-        for index in sorted(self.image_positions.keys()):
-            if index not in self.manga_items:
-                continue
-                
-            item = self.manga_items[index]
-            item_start = item.y()
-            item_end = item.y() + item.metadata.height
-            
-            if item_start <= viewport_center_y <= item_end:
-                progress = (viewport_center_y - item_start) / item.metadata.height
-                return index, progress
+        index = self.page_layout.index_at(viewport_center_y)
+        if index in self.pages:
+            height = self.pages[index].height
+            progress = (viewport_center_y - self.page_layout.position(index)) / height if height else 0.0
+            return index, min(max(progress, 0.0), 1.0)   # Gap after image counts as its end
         
         # If not in any image, return closest
-        if self.manga_items:
+        if self.pages:
             closest_index = min(
-                self.image_positions.keys(),
-                key=lambda i: abs(self.image_positions[i] - viewport_center_y)
+                self.pages.keys(),
+                key=lambda i: abs(self.page_layout.position(i) - viewport_center_y)
             )
             return closest_index, 0.0
         
@@ -265,12 +336,11 @@ class MangaViewer(QGraphicsView, SmoothScrollMixin, DebugCapableMixin):
     
     def scroll_to_image(self, index: int, progress: float = 0.0):
         """Scroll to specific image and progress within that image"""
-        if index not in self.manga_items:
+        if index not in self.pages:
             logger.warning(f"Cannot scroll to image {index}: not loaded")
             return
         
-        item = self.manga_items[index]
-        target_y = item.y() + (item.metadata.height * progress)
+        target_y = self.page_layout.position(index) + (self.pages[index].height * progress)
         
         # Center the target position in viewport
         viewport_height = self.viewport().height()
@@ -280,8 +350,13 @@ class MangaViewer(QGraphicsView, SmoothScrollMixin, DebugCapableMixin):
         logger.info(f"Scrolled to image[{index}] at {progress:.1%} progress")
         
     def clear(self):
-        self.manga_items = {}
-        self.image_positions = {}
+        for index in list(self.manga_items):
+            self._recycle(index)
+        self._reading_index = -1
+        self._items_in_window = set()
+        self._strip_index_dirty = True
+        self.pages = {}
+        self.page_layout = PageLayout(self.debug_gap)
         self.images = []
         for item in self.scene().items():
             del item
\ No newline at end of file
@@ -17,7 +17,7 @@ from core.repositories.manga import MangaRepository
 from core.repositories.novels import NovelsRepository
 from core.models.images import ImageCache
 from config import Config
-from utils import MM
+from utils import MM, ThreadingManager
 
 
 logger.info(f"Working directory: {Config.Dirs.STD_DIR}")
@@ -48,7 +48,9 @@ class App:
 
         self.sites_manager = SitesManager()
         
-        self.images_cache = ImageCache(Config.Dirs.CACHE.IMAGES, Config.Caching.Image.max_ram(), Config.Caching.Image.max_disc())
+        self.images_cache = ImageCache(
+            Config.Dirs.CACHE.IMAGES, Config.Caching.Image.max_ram(), Config.Caching.Image.max_disc(), Config.Caching.Image.mmap_threshold()
+        )
         self.download_manager = DownloadManager(self)
 
         self.manga_repository = MangaRepository(Config.Dirs.DATA.MANGA_JSON)
@@ -143,6 +145,10 @@ class App:
 
         logger.success(f"MangaHub v{Config.version()} initialized")
         self.gui_app.exec()
+        self.download_manager.close()
+        ThreadingManager.thread_pool.waitForDone()  # Panel analyses and strip loads use what is closed below
+        self.gui_window.manga_viewer.tile_manager.close()
+        self.images_cache.close()
 
         # AppConfig().save(CONF_FILE)
         logger.success("AppConfig was saved successfully")
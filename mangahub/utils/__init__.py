@@ -1,10 +1,15 @@
+from .async_loop import AsyncLoopThread
+from .frame_recorder import FrameReport, FrameRecorder
 from .message_manager import MessageType, Message, MM
 from .placeholder_generator import PlaceholderGenerator
 from .pyside_threading import WorkerStatus, WorkerSignals, Worker, ThreadingManager
 from .svg_manipulator import SVGManipulator
 
 __all__ = [
-    'MessageType', 
+    'AsyncLoopThread', 
+	'FrameReport', 
+	'FrameRecorder', 
+	'MessageType', 
 	'Message', 
 	'MM', 
 	'PlaceholderGenerator', 
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Coroutine
+
+from loguru import logger
+
+from .patterns import Singleton
+
+
+class AsyncLoopThread(Singleton):
+    """
+    Single persistent asyncio event loop, running in its own daemon thread.
+
+    Everything that needs a loop (downloads, http clients) submits coroutines here
+    instead of creating and tearing down a loop per task, so long-lived resources
+    like connection pools can be shared between them.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="AsyncLoopThread", daemon=True
+        )
+        self._thread.start()
+        logger.success("AsyncLoopThread started")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule coroutine on the loop. Thread-safe, returns `concurrent.futures.Future`"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, fn: Callable, *args: Any) -> None:
+        """Run a plain callback on the loop thread. Thread-safe"""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def stop(self, timeout: float = 5.0):
+        if not self.loop.is_running():
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
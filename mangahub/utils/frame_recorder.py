@@ -0,0 +1,156 @@
+import json
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable
+
+from pydantic import BaseModel
+
+
+class FrameReport(BaseModel):
+    """Frame times since last reset, percentiles of recent frames, comparable between runs and versions"""
+
+    frames: int = 0
+    dropped_frames: int = 0
+    histogram: dict[str, int] = {}     # Frame interval bucket -> frames
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    p99_ms: float = 0.0
+    max_ms: float = 0.0
+    work_ms: dict[str, float] = {}     # GUI thread work by name, average per frame
+
+
+class FrameRecorder:
+    """
+    Frame times of GUI thread, and work done on it for each frame, for jank reports and Chrome traces.
+
+    `frame()` wraps paint, frame time is interval between starts of consecutive paints.
+    Frame longer than one refresh of `budget_ms` means refreshes were dropped,
+    gap longer than `idle_ms` is not a frame at all, nothing was animating.
+    `span(name)` wraps GUI thread work, which is attributed to frame painted after it. Nested spans count in both.
+    `record_input` marks input, so exported trace of session can be replayed, see `inputs`.
+    Last `max_events` events are kept for `export_trace`, in format of chrome://tracing and Perfetto.
+    Disabled recorder records nothing and costs one check per call.
+    """
+
+    HISTOGRAM_MS = (8, 16.7, 33.4, 50, 100, 250)  # Upper bounds of buckets
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        budget_ms: float = 1000 / 60,
+        idle_ms: float = 250,
+        max_events: int = 100_000,
+        max_frames: int = 10_000,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.enabled = enabled
+        self.budget = budget_ms / 1000
+        self.idle = idle_ms / 1000
+        self.clock = clock
+        self.events: deque[tuple[str, str, float, float, dict]] = deque(maxlen=max_events)    # category, name, start, duration, args
+        self._intervals: deque[float] = deque(maxlen=max_frames)   # Percentiles are of last `max_frames`
+        self.reset()
+
+    def reset(self):
+        self.events.clear()
+        self.frames = 0
+        self.dropped_frames = 0
+        self.histogram = [0] * (len(self.HISTOGRAM_MS) + 1)
+        self.work: dict[str, float] = {}
+        self._intervals.clear()
+        self._frame_work: dict[str, float] = {}     # Work since last frame
+        self._last_frame: float | None = None
+
+    def frame(self):
+        return self._timed(self.record_frame) if self.enabled else nullcontext()
+
+    def span(self, name: str):
+        return self._timed(lambda start, end: self.record_span(name, start, end)) if self.enabled else nullcontext()
+
+    @contextmanager
+    def _timed(self, record: Callable[[float, float], None]):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            record(start, self.clock())
+
+    def record_frame(self, start: float, end: float):
+        args = {name: round(duration * 1000, 3) for name, duration in self._frame_work.items()}
+        if self._last_frame is not None and start - self._last_frame <= self.idle:
+            interval = start - self._last_frame
+            self.frames += 1
+            self.dropped_frames += max(0, round(interval / self.budget) - 1)
+            self.histogram[bisect_left(self.HISTOGRAM_MS, interval * 1000)] += 1
+            self._intervals.append(interval)
+            for name, duration in self._frame_work.items():
+                self.work[name] = self.work.get(name, 0.0) + duration
+            args["interval_ms"] = round(interval * 1000, 3)
+        self.events.append(("frame", "paint", start, end - start, args))
+        self._frame_work = {}
+        self._last_frame = start
+
+    def record_span(self, name: str, start: float, end: float):
+        self._frame_work[name] = self._frame_work.get(name, 0.0) + end - start
+        self.events.append(("work", name, start, end - start, {}))
+
+    def record_input(self, name: str, **args):
+        if self.enabled:
+            self.events.append(("input", name, self.clock(), 0.0, args))
+
+    def report(self) -> FrameReport:
+        intervals = sorted(self._intervals)
+
+        def percentile(p: float) -> float:
+            return round(intervals[min(len(intervals) - 1, int(p * len(intervals)))] * 1000, 3) if intervals else 0.0
+
+        bounds = [f"<={bound}ms" for bound in self.HISTOGRAM_MS] + [f">{self.HISTOGRAM_MS[-1]}ms"]
+        return FrameReport(
+            frames=self.frames,
+            dropped_frames=self.dropped_frames,
+            histogram=dict(zip(bounds, self.histogram)),
+            p50_ms=percentile(.5),
+            p95_ms=percentile(.95),
+            p99_ms=percentile(.99),
+            max_ms=percentile(1),
+            work_ms={name: round(total * 1000 / self.frames, 3) for name, total in self.work.items()} if self.frames else {},
+        )
+
+    def trace(self) -> dict:
+        """Chrome trace event format, complete events on GUI thread and frame time counter"""
+        origin = self.events[0][2] if self.events else 0.0
+        events = []
+        for category, name, start, duration, args in self.events:
+            ts = (start - origin) * 1e6
+            if category == "input":
+                events.append({"name": name, "cat": category, "ph": "i", "s": "t", "ts": ts, "pid": 1, "tid": 1, "args": args})
+                continue
+            events.append({
+                "name": name, "cat": category, "ph": "X", "ts": ts, "dur": duration * 1e6,
+                "pid": 1, "tid": 1, "args": args,
+            })
+            if "interval_ms" in args:
+                events.append({
+                    "name": "frame_ms", "cat": category, "ph": "C", "ts": ts, "pid": 1,
+                    "args": {"interval": args["interval_ms"]},
+                })
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "metadata": {"report": self.report().model_dump()},
+        }
+
+    def export_trace(self, path: Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.trace()), encoding="utf-8")
+        return path
+
+    @staticmethod
+    def inputs(trace: dict, name: str) -> list[tuple[float, dict]]:
+        """(ms since first of them, args) of input events `name` of exported trace"""
+        events = sorted((event["ts"], event.get("args", {})) for event in trace["traceEvents"] if event.get("cat") == "input" and event["name"] == name)
+        return [((ts - events[0][0]) / 1000, args) for ts, args in events]
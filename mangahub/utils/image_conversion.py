@@ -2,6 +2,56 @@ import io
 
 from PIL import Image
 
+try:
+    import pillow_jxl   # loading pillow plugin, needed in worker processes too  # noqa: F401
+except ImportError:
+    pass
+
+
+class MemoryReader(io.RawIOBase):
+    """
+    Read-only seekable file over any bytes-like object.
+    Unlike `io.BytesIO`, does not copy `bytearray`/`memoryview` it is given, so PIL can open downloaded buffer in place.
+    """
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(len(self._view), self._pos + size)
+        data = self._view[self._pos:end].tobytes()
+        self._pos = max(self._pos, end)
+        return data
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), max(0, len(self._view) - self._pos))
+        memoryview(buffer).cast("B")[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
 
 def convert_to_format(image_data, target_format="WEBP") -> bytes:
     with Image.open(io.BytesIO(image_data)) as img:
@@ -9,3 +59,30 @@ def convert_to_format(image_data, target_format="WEBP") -> bytes:
         output = io.BytesIO()
         img.save(output, format=target_format)
         return output.getvalue()
+
+
+def transcode_image(image_data, preferable_format: str = "JXL") -> tuple[bytes, str, int, int]:
+    """
+    Re-encode downloaded image losslessly for caching.
+    Top-level and PIL-only, so it can be run in a `ProcessPoolExecutor`.
+    `image_data` is read in place, so it may be a `bytearray` straight from download buffer.
+
+    Returns:
+        tuple: (encoded bytes, extension, width, height)
+    """
+    with MemoryReader(image_data) as reader, Image.open(reader) as img:
+        img = img.convert("RGB")    # TODO: Conversion helped greatly, but playing with it may improve perf even more
+        output = io.BytesIO()
+        extension = ".webp"
+
+        if preferable_format.upper() == "JXL":
+            try:
+                img.save(output, format="JXL", lossless=True, effort=1)  # TODO: Tweak params
+                extension = ".jxl"
+            except Exception:
+                output = io.BytesIO()
+
+        if extension == ".webp":
+            img.save(output, format="WEBP", lossless=True, method=6, quality=100)
+
+        return output.getvalue(), extension, img.width, img.height
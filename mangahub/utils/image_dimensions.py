@@ -1,48 +1,89 @@
 import struct
-from io import BytesIO
 
 
-async def get_image_dimensions_from_header(session, url, max_bytes=1024):
-    """
-    Get image dimensions by reading just the header of the image file.
+MAGIC_SIZE = 32  # Enough to tell every supported format apart, including AVIF compatible brands
+
+JXL_CODESTREAM_MAGIC = b"\xff\x0a"
+JXL_CONTAINER_MAGIC = b"\x00\x00\x00\x0cJXL \r\n\x87\n"
 
-    Args:
-        session: aiohttp session
-        url: Image URL
-        max_bytes: Maximum bytes to read (default: 1024)
 
-    Returns:
-        tuple: (width, height) or None if dimensions couldn't be determined
+class HeaderSniffer:
     """
-    try:
-        async with session.get(
-            url, headers={"Range": f"bytes=0-{max_bytes - 1}"}
-        ) as response:
-            if response.status != 206 and response.status != 200:
+    Finds image format and dimensions from the first chunks of a download.
+
+    Only the header is kept (usually 1-4KB). Parsing stops once dimensions are known,
+    format is unknown, or `limit` bytes were fed.
+    """
+
+    def __init__(self, limit: int = 64 * 1024):
+        self.limit = limit
+        self.format: str | None = None
+        self.dimensions: tuple[int, int] | None = None
+        self.done = False
+        self._header = bytearray()
+
+    def feed(self, chunk) -> tuple[int, int] | None:
+        """Add next chunk, returns (width, height) once they are known"""
+        if self.done:
+            return self.dimensions
+
+        self._header += chunk[: self.limit - len(self._header)]
+        if self.format is None:
+            if len(self._header) < MAGIC_SIZE and len(self._header) < self.limit:
+                return None
+            self.format = get_image_format(self._header)
+            if self.format is None:
+                self._finish()
                 return None
 
-            header_bytes = await response.content.read(max_bytes)
-            return get_dimensions_from_bytes(header_bytes)
-    except Exception as e:
-        print(f"Error getting image dimensions: {e}")
-        return None
+        try:
+            self.dimensions = _DIMENSION_PARSERS[self.format](self._header)
+        except (IndexError, struct.error):  # Header is not complete yet
+            self.dimensions = None
+
+        if self.dimensions or len(self._header) >= self.limit:
+            self._finish()
+        return self.dimensions
+
+    def _finish(self):
+        self.done = True
+        self._header = bytearray()
+
+
+def get_image_format(data) -> str | None:
+    """Detect image format by magic bytes, `data` may be any bytes-like object"""
+    head = bytes(data[:MAGIC_SIZE])
+    if head.startswith(b"\xff\xd8"):
+        return "JPEG"
+    elif head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    elif head.startswith(b"GIF87a") or head.startswith(b"GIF89a"):
+        return "GIF"
+    elif head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "WEBP"
+    elif head.startswith(JXL_CODESTREAM_MAGIC) or head.startswith(JXL_CONTAINER_MAGIC):
+        return "JXL"
+    elif head[4:8] == b"ftyp":
+        ftyp_size = struct.unpack(">I", head[:4])[0]
+        if head[8:12] in (b"avif", b"avis") or b"avif" in head[16:ftyp_size]:
+            return "AVIF"
+    return None
 
 
 def get_dimensions_from_bytes(data):
-    """Extract dimensions from image header bytes"""
+    """
+    Extract dimensions from image header bytes.
+    `data` may be any bytes-like object (e.g. `memoryview` of partially downloaded image),
+    None is returned if header is not complete yet.
+    """
     try:
-        # Check image format by magic bytes
-        if data.startswith(b"\xff\xd8"):  # JPEG
-            return _get_jpeg_dimensions(data)
-        elif data.startswith(b"\x89PNG\r\n\x1a\n"):  # PNG
-            return _get_png_dimensions(data)
-        elif data.startswith(b"GIF87a") or data.startswith(b"GIF89a"):  # GIF
-            return _get_gif_dimensions(data)
-        elif data.startswith(b"RIFF") and data[8:12] == b"WEBP":  # WebP
-            return _get_webp_dimensions(data)
-        else:
+        image_format = get_image_format(data)
+        if image_format is None:
             print("Unknown image format")
             return None
+        return _DIMENSION_PARSERS[image_format](data)
+    except (IndexError, struct.error):  # Header is not complete yet
+        return None
     except Exception as e:
         print(f"Error parsing image header: {e}")
         return None
@@ -66,52 +107,47 @@ def _get_gif_dimensions(data):
     return width, height
 
 
+_JPEG_SOF_MARKERS = (
+    0xC0,
+    0xC1,
+    0xC2,
+    0xC3,
+    0xC5,
+    0xC6,
+    0xC7,
+    0xC9,
+    0xCA,
+    0xCB,
+    0xCD,
+    0xCE,
+    0xCF,
+)
+
+
 def _get_jpeg_dimensions(data):
     """Get dimensions from JPEG header by parsing markers"""
-    stream = BytesIO(data)
-    stream.read(2)  # Skip JPEG marker
+    offset = 2  # Skip JPEG marker
 
-    while True:
-        marker = stream.read(2)
-        if len(marker) < 2:
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
             return None
 
         # Check for Start Of Frame markers
-        if marker[0] == 0xFF and marker[1] in (
-            0xC0,
-            0xC1,
-            0xC2,
-            0xC3,
-            0xC5,
-            0xC6,
-            0xC7,
-            0xC9,
-            0xCA,
-            0xCB,
-            0xCD,
-            0xCE,
-            0xCF,
-        ):
-            # Skip segment length
-            stream.read(2)
-            # Skip precision byte
-            stream.read(1)
-            # Read height and width
-            height_data = stream.read(2)
-            width_data = stream.read(2)
-            if len(height_data) < 2 or len(width_data) < 2:
+        if data[offset + 1] in _JPEG_SOF_MARKERS:
+            # Skip segment length and precision byte, then read height and width
+            if offset + 9 > len(data):
                 return None
 
-            height = struct.unpack(">H", height_data)[0]
-            width = struct.unpack(">H", width_data)[0]
+            height, width = struct.unpack_from(">HH", data, offset + 5)
             return width, height
 
         # Skip to next marker
-        segment_length = struct.unpack(">H", stream.read(2))[0]
+        segment_length = struct.unpack_from(">H", data, offset + 2)[0]
         if segment_length < 2:
             return None
 
-        stream.seek(segment_length - 2, 1)  # -2 because we already read the length
+        offset += 2 + segment_length
+    return None
 
 
 def _get_webp_dimensions(data):
@@ -119,17 +155,166 @@ def _get_webp_dimensions(data):
     if len(data) < 30:
         return None
 
-    if data[12:16] == b"VP8 ":
+    chunk = bytes(data[12:16])
+    if chunk == b"VP8 ":
         width = struct.unpack("<H", data[26:28])[0] & 0x3FFF
         height = struct.unpack("<H", data[28:30])[0] & 0x3FFF
         return width, height
-    elif data[12:16] == b"VP8L":
+    elif chunk == b"VP8L":
         bits = data[21] | (data[22] << 8) | (data[23] << 16) | (data[24] << 24)
         width = (bits & 0x3FFF) + 1
         height = ((bits >> 14) & 0x3FFF) + 1
         return width, height
-    elif data[12:16] == b"VP8X":
-        width = struct.unpack("<I", data[24:27] + b"\x00")[0] + 1
-        height = struct.unpack("<I", data[27:30] + b"\x00")[0] + 1
+    elif chunk == b"VP8X":
+        width = int.from_bytes(data[24:27], "little") + 1
+        height = int.from_bytes(data[27:30], "little") + 1
         return width, height
     return None
+
+
+class _BitReader:
+    """Reads JPEG XL fields, which are packed least significant bit first"""
+
+    def __init__(self, data, offset: int = 0):
+        self.data = data
+        self.pos = offset * 8
+
+    def read(self, bits: int) -> int:
+        value = 0
+        for i in range(bits):
+            value |= ((self.data[self.pos >> 3] >> (self.pos & 7)) & 1) << i
+            self.pos += 1
+        return value
+
+    def read_u32(self, *distribution: tuple[int, int]) -> int:
+        offset, bits = distribution[self.read(2)]
+        return offset + self.read(bits)
+
+
+_JXL_SIZE_DISTRIBUTION = ((1, 9), (1, 13), (1, 18), (1, 30))
+_JXL_RATIOS = {1: (1, 1), 2: (12, 10), 3: (4, 3), 4: (3, 2), 5: (16, 9), 6: (5, 4), 7: (2, 1)}
+
+
+def _get_jxl_codestream_dimensions(data, offset: int):
+    """Parse JPEG XL SizeHeader and orientation from ImageMetadata right after codestream signature"""
+    reader = _BitReader(data, offset + 2)
+    small = reader.read(1)
+    height = (reader.read(5) + 1) * 8 if small else reader.read_u32(*_JXL_SIZE_DISTRIBUTION)
+    ratio = reader.read(3)
+    if ratio:
+        numerator, denominator = _JXL_RATIOS[ratio]
+        width = height * numerator // denominator
+    else:
+        width = (reader.read(5) + 1) * 8 if small else reader.read_u32(*_JXL_SIZE_DISTRIBUTION)
+
+    all_default = reader.read(1)
+    if not all_default and reader.read(1):  # extra_fields
+        orientation = reader.read(3) + 1
+        if orientation > 4:  # Transposed
+            width, height = height, width
+    return width, height
+
+
+def _get_jxl_dimensions(data):
+    """Get dimensions from JPEG XL header, either bare codestream or ISOBMFF-like container"""
+    if bytes(data[:2]) == JXL_CODESTREAM_MAGIC:
+        return _get_jxl_codestream_dimensions(data, 0)
+
+    for box_type, start, _ in _iter_boxes(data, 0, len(data)):
+        if box_type == b"jxlc":
+            return _get_jxl_codestream_dimensions(data, start)
+        elif box_type == b"jxlp":  # Partial codestream, first one starts with the signature
+            return _get_jxl_codestream_dimensions(data, start + 4)
+    return None
+
+
+def _iter_boxes(data, start: int, end: int):
+    """Yields (type, payload start, box end) of ISOBMFF boxes between `start` and `end`"""
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:  # Box lasts until the end of the file
+            size = end - offset
+        if size < header_size:
+            return
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def _parse_ipma(data, offset: int) -> dict[int, list[int]]:
+    """Item id -> 1-based indices of its properties in `ipco`"""
+    version = data[offset]
+    flags = int.from_bytes(data[offset + 1 : offset + 4], "big")
+    entry_count = struct.unpack_from(">I", data, offset + 4)[0]
+    offset += 8
+
+    associations = {}
+    for _ in range(entry_count):
+        if version < 1:
+            item_id = struct.unpack_from(">H", data, offset)[0]
+            offset += 2
+        else:
+            item_id = struct.unpack_from(">I", data, offset)[0]
+            offset += 4
+
+        indices = []
+        for _ in range(data[offset]):
+            if flags & 1:
+                indices.append(struct.unpack_from(">H", data, offset + 1)[0] & 0x7FFF)
+                offset += 2
+            else:
+                indices.append(data[offset + 1] & 0x7F)
+                offset += 1
+        offset += 1
+        associations[item_id] = indices
+    return associations
+
+
+def _get_avif_dimensions(data):
+    """Get dimensions of primary item from AVIF `meta` box (`pitm` -> `ipma` -> `ispe`)"""
+    end = len(data)
+    meta = next(((start, stop) for box_type, start, stop in _iter_boxes(data, 0, end) if box_type == b"meta"), None)
+    if meta is None:
+        return None
+
+    primary_item = None
+    properties = []
+    associations = {}
+    for box_type, start, stop in _iter_boxes(data, meta[0] + 4, min(meta[1], end)):  # `meta` is a FullBox
+        if box_type == b"pitm":
+            primary_item = struct.unpack_from(">H" if data[start] == 0 else ">I", data, start + 4)[0]
+        elif box_type == b"iprp":
+            for child_type, child_start, child_stop in _iter_boxes(data, start, min(stop, end)):
+                if child_type == b"ipco":
+                    properties = list(_iter_boxes(data, child_start, min(child_stop, end)))
+                elif child_type == b"ipma":
+                    associations = _parse_ipma(data, child_start)
+
+    size = None
+    rotated = False
+    for index in associations.get(primary_item, ()):
+        if not 0 < index <= len(properties):
+            continue
+        box_type, start, _ = properties[index - 1]
+        if box_type == b"ispe":
+            size = struct.unpack_from(">II", data, start + 4)
+        elif box_type == b"irot":
+            rotated = bool(data[start] & 1)  # Rotated by 90 or 270 degrees
+    if size is None:
+        return None
+    width, height = size
+    return (height, width) if rotated else (width, height)
+
+
+_DIMENSION_PARSERS = {
+    "JPEG": _get_jpeg_dimensions,
+    "PNG": _get_png_dimensions,
+    "GIF": _get_gif_dimensions,
+    "WEBP": _get_webp_dimensions,
+    "JXL": _get_jxl_dimensions,
+    "AVIF": _get_avif_dimensions,
+}
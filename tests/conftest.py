@@ -1,5 +1,16 @@
+import os
 import sys
 from pathlib import Path
 
+import pytest
+
 CWD = Path(__file__).parent
-sys.path.insert(0, str(CWD.parent / 'mangahub'))
\ No newline at end of file
+sys.path.insert(0, str(CWD.parent / 'mangahub'))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def qt_app():
+    """One application for whole session, with widgets, as viewer needs them"""
+    from PySide6.QtWidgets import QApplication
+    yield QApplication.instance() or QApplication([])
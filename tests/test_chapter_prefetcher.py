@@ -0,0 +1,121 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from PySide6.QtCore import QObject, Signal
+
+from application.controllers.chapter_prefetcher import ChapterPrefetcher
+from config import Config
+
+
+class Repo(dict):
+    def get(self, key, default="err"):
+        return super().get(key, default)
+
+    def get_all(self):
+        return self
+
+
+class FakeWorker:
+    def __init__(self):
+        self.future = Future()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+        self.future.cancel()
+
+
+class FakeDownloadManager(QObject):
+    chapter_images_urls_downloaded = Signal(str, float, list)
+
+    def __init__(self):
+        super().__init__()
+        self.prefetched: dict[float, list[str]] = {}
+        self.workers: dict[float, FakeWorker] = {}
+
+    def prefetch_manga_chapter_images(self, manga_id, chapter_num, urls):
+        self.prefetched[chapter_num] = urls
+        self.workers[chapter_num] = FakeWorker()
+        return self.workers[chapter_num]
+
+
+class FakeSitesManager:
+    def __init__(self):
+        self.resolving = []
+
+    def download_manga_chapter_details(self, manga, num):
+        self.resolving.append(num)
+
+
+def _chapter(urls: list[str] | None):
+    images = Repo({i: SimpleNamespace(metadata=SimpleNamespace(url=url)) for i, url in enumerate(urls or [])})
+    return SimpleNamespace(urls_cached=urls is not None, _repo=images)
+
+
+def _setup():
+    chapters = Repo({
+        1.: _chapter([f"https://cdn.example.com/1/{i}.png" for i in range(10)]),
+        2.: _chapter(["https://cdn.example.com/2/0.png"]),
+        3.: _chapter(None),
+        4.: _chapter(None),
+    })
+    manga = SimpleNamespace(id_="manga", name="Manga", _chapters_repo=chapters)
+    app = SimpleNamespace(download_manager=FakeDownloadManager(), sites_manager=FakeSitesManager())
+    return ChapterPrefetcher(app), app, manga
+
+
+def test_next_chapters_are_prefetched_after_reading_fraction():
+    assert (Config.Downloading.Chapter.prefetch_chapters(), Config.Downloading.Chapter.prefetch_after()) == (2, .5)
+    prefetcher, app, manga = _setup()
+    prefetcher.set_chapter(manga, 1.)
+
+    prefetcher.update_position(2, .5)
+    assert not app.download_manager.prefetched
+
+    prefetcher.update_position(5, 0.)
+    assert app.download_manager.prefetched == {2.: ["https://cdn.example.com/2/0.png"]}
+    assert app.sites_manager.resolving == [3.]    # Urls of chapter 3 are not known yet
+
+    app.download_manager.chapter_images_urls_downloaded.emit("other", 3., ["https://other.example.com/0.png"])
+    app.download_manager.chapter_images_urls_downloaded.emit("manga", 3., ["https://cdn.example.com/3/0.png"])
+    assert app.download_manager.prefetched[3.] == ["https://cdn.example.com/3/0.png"]
+
+    assert not prefetcher.is_prefetched(2.)
+    app.download_manager.workers[2.].future.set_result(None)
+    assert prefetcher.is_prefetched(2.)
+
+
+def test_jumping_away_cancels_prefetch():
+    prefetcher, app, manga = _setup()
+    prefetcher.set_chapter(manga, 1.)
+    prefetcher.update_position(9, .9)
+    worker = app.download_manager.workers[2.]
+
+    prefetcher.set_chapter(manga, 2.)   # Opened, foreground download takes over
+    assert worker.cancelled
+    assert not prefetcher.is_prefetched(2.)
+
+    prefetcher.set_chapter(manga, 4.)
+    prefetcher.update_position(0, 0.)
+    assert 3. not in app.download_manager.workers
+
+
+def test_fractional_and_missing_chapters_are_walked_in_order():
+    prefetcher, app, manga = _setup()
+    manga._chapters_repo = Repo({
+        10.: _chapter([f"https://cdn.example.com/10/{i}.png" for i in range(4)]),
+        13.: _chapter(["https://cdn.example.com/13/0.png"]),
+        10.5: _chapter(["https://cdn.example.com/10.5/0.png"]),
+        9.: _chapter(None),
+    })
+    prefetcher.set_chapter(manga, 10.)
+    prefetcher.update_position(3, 0.)
+    assert list(app.download_manager.prefetched) == [10.5, 13.]
+
+
+def test_chapter_with_failed_images_is_not_prefetched():
+    prefetcher, app, manga = _setup()
+    prefetcher.set_chapter(manga, 1.)
+    prefetcher.update_position(9, 0.)
+    app.download_manager.workers[2.].future.set_result(["https://cdn.example.com/2/0.png"])
+    assert not prefetcher.is_prefetched(2.)
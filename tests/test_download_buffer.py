@@ -0,0 +1,88 @@
+import io
+import tracemalloc
+
+from PIL import Image
+
+from application.services.downloaders.download_buffer import DownloadBuffer
+from utils.image_conversion import MemoryReader, transcode_image
+from utils.image_dimensions import get_dimensions_from_bytes, get_image_format
+
+
+CHUNK = 8 * 1024
+
+
+def _make_image(format: str, size=(720, 1600)) -> bytes:
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def _chunks(data: bytes):
+    for i in range(0, len(data), CHUNK):
+        yield data[i:i + CHUNK]
+
+
+def test_buffer_is_written_in_place_and_detached_without_copy():
+    data = _make_image("PNG")
+    buffer = DownloadBuffer(len(data))
+    storage = buffer._data
+
+    for chunk in _chunks(data):
+        buffer.write(chunk)
+
+    assert buffer.capacity == len(data)
+    detached = buffer.detach()
+    assert detached is storage
+    assert detached == data
+    assert len(buffer) == 0
+
+
+def test_buffer_grows_when_content_length_is_missing_or_wrong():
+    data = _make_image("PNG")
+    for size_hint in (0, len(data) // 3, len(data) * 2):
+        buffer = DownloadBuffer(size_hint)
+        for chunk in _chunks(data):
+            buffer.write(chunk)
+        assert buffer.detach() == data
+
+
+def test_header_is_sniffed_from_partial_buffer():
+    for format in ("JPEG", "PNG", "WEBP", "GIF"):
+        data = _make_image(format, (333, 777))
+        buffer = DownloadBuffer(len(data))
+        buffer.write(data[:CHUNK])
+
+        with buffer.getbuffer() as header:
+            assert get_image_format(header) == format
+            assert get_dimensions_from_bytes(header) == (333, 777)
+
+
+def test_transcoder_reads_bytearray_in_place():
+    data = bytearray(_make_image("PNG"))
+    with MemoryReader(data) as reader:
+        reader.seek(-4, io.SEEK_END)
+        assert reader.read() == data[-4:]
+    _, _, width, height = transcode_image(data, "WEBP")
+    assert (width, height) == (720, 1600)
+
+
+def test_download_holds_single_copy_of_image():
+    data = _make_image("JPEG", (1200, 4000))
+    chunks = list(_chunks(data))
+
+    tracemalloc.start()
+    buffer = DownloadBuffer(len(data))
+    dimensions = None
+    for chunk in chunks:
+        buffer.write(chunk)
+        if not dimensions:
+            with buffer.getbuffer() as header:
+                dimensions = get_dimensions_from_bytes(header)
+    original_image = buffer.detach()
+    with MemoryReader(original_image) as reader, Image.open(reader) as img:
+        img.load()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert dimensions == (1200, 4000)
+    assert peak < len(data) * 1.1  # Buffer itself and decoder reads, never second copy of body
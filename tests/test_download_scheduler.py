@@ -0,0 +1,111 @@
+import asyncio
+import random
+
+import httpx
+import pytest
+
+from application.services.downloaders.download_scheduler import DownloadScheduler, HostLimiter, RequestStats
+from config import Config
+
+
+def test_waiters_are_woken_by_priority():
+    async def run():
+        limiter = HostLimiter('example.com')
+        limiter.limit = 1
+        order = []
+
+        await limiter.acquire((False, 0, 0))
+
+        async def request(priority):
+            await limiter.acquire(priority)
+            order.append(priority[2])
+            limiter.release(RequestStats())
+
+        tasks = [asyncio.create_task(request((False, abs(i - 5), i))) for i in (9, 0, 5, 4)]
+        await asyncio.sleep(0)
+        limiter.release(RequestStats())
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == [5, 4, 9, 0]
+
+
+def test_limit_grows_on_success_and_backs_off_on_congestion():
+    limiter = HostLimiter('example.com')
+    start_limit = limiter.limit
+
+    for _ in range(10):
+        limiter.in_flight += 1
+        limiter.release(RequestStats(started=1.0, first_byte=1.05, bytes=1000, ok=True))
+    grown_limit = limiter.limit
+    assert grown_limit > start_limit
+
+    limiter.in_flight += 1
+    limiter.release(RequestStats(congested=True))
+    assert limiter.limit == pytest.approx(max(1, grown_limit * limiter.backoff_factor))
+
+
+def test_limit_grows_only_while_throughput_does():
+    now = [0.0]
+    limiter = HostLimiter('example.com', clock=lambda: now[0])
+    limiter.limit = 2.0
+
+    def window(duration: float):
+        """`limit` requests of 1000 bytes finishing within `duration`"""
+        now[0] += duration
+        for _ in range(int(limiter.limit)):
+            limiter.in_flight += 1
+            limiter.release(RequestStats(started=1.0, first_byte=1.05, bytes=1000, ok=True))
+
+    window(1.0)
+    assert limiter.limit == 3.0
+    window(1.0)     # 3000 B/s beat 2000 B/s
+    assert limiter.limit == 4.0
+    window(2.0)     # 2000 B/s, more requests in flight did not help
+    assert limiter.limit == 4.0
+    window(1.0)
+    assert limiter.limit == 5.0
+
+
+def test_limit_does_not_grow_on_noise_of_saturated_host():
+    now = [0.0]
+    limiter = HostLimiter('example.com', clock=lambda: now[0])
+    start_limit = limiter.limit
+    rng = random.Random(0)
+
+    for _ in range(50):     # Host serves 10000 B/s whatever the limit, give or take 5%
+        now[0] += int(limiter.limit) * 1000 / (10000 * rng.uniform(.95, 1.05))
+        for _ in range(int(limiter.limit)):
+            limiter.in_flight += 1
+            limiter.release(RequestStats(started=1.0, first_byte=1.05, bytes=1000, ok=True))
+    assert limiter.limit <= start_limit + 2
+
+
+def test_header_prefetches_are_not_measured():
+    limiter = HostLimiter('example.com')
+    for _ in range(20):
+        limiter.in_flight += 1
+        limiter.release(RequestStats(started=1.0, first_byte=1.05, bytes=64, ok=True, header=True))
+    assert limiter.limit == Config.Downloading.Scheduler.initial_concurrency()
+    assert limiter.rtt_ms == 0.0 and limiter.bytes_per_second == 0.0
+
+    limiter.in_flight += 1
+    limiter.release(RequestStats(congested=True, header=True))
+    assert limiter.limit < Config.Downloading.Scheduler.initial_concurrency()
+
+
+def test_slot_marks_429_as_congestion():
+    scheduler = DownloadScheduler()
+    request = httpx.Request('GET', 'https://cdn.example.com/1.webp')
+    limiter = scheduler._limiter(str(request.url))
+    limit = limiter.limit
+
+    async def run():
+        response = httpx.Response(429, request=request)
+        with pytest.raises(httpx.HTTPStatusError):
+            async with scheduler.slot(str(request.url)):
+                response.raise_for_status()
+
+    asyncio.run(run())
+    assert limiter.in_flight == 0
+    assert limiter.limit < limit
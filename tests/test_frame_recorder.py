@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from utils import FrameRecorder
+
+
+FRAME = 1 / 60
+
+
+def _frames(recorder: FrameRecorder, intervals_ms: list[float], start: float = 0.0) -> float:
+    t = start
+    recorder.record_frame(t, t + .002)
+    for interval in intervals_ms:
+        t += interval / 1000
+        recorder.record_frame(t, t + .002)
+    return t
+
+
+def test_frame_times_histogram_and_dropped_frames():
+    recorder = FrameRecorder()
+    t = _frames(recorder, [FRAME * 1000] * 8 + [45, 17.5])
+    assert recorder.frames == 10
+    assert recorder.dropped_frames == 2     # 45 ms is about three refreshes
+    report = recorder.report()
+    assert report.histogram["<=16.7ms"] == 8 and report.histogram["<=33.4ms"] == 1 and report.histogram["<=50ms"] == 1
+    assert report.p50_ms == pytest.approx(FRAME * 1000, abs=.01) and report.max_ms == pytest.approx(45)
+
+    _frames(recorder, [FRAME * 1000], start=t + 5)   # Idle in between is not a frame
+    assert recorder.frames == 11 and recorder.dropped_frames == 2
+
+
+def test_work_is_attributed_to_next_frame():
+    now = [0.0]
+    recorder = FrameRecorder(clock=lambda: now[0])
+    recorder.record_frame(0, .001)
+    for work in ("update_visible_strips", "strip_upload", "strip_upload"):
+        with recorder.span(work):
+            now[0] += .003
+    now[0] = FRAME
+    with recorder.frame():
+        now[0] += .004
+
+    assert recorder.report().work_ms == {"update_visible_strips": pytest.approx(3), "strip_upload": pytest.approx(6)}
+    paint = recorder.events[-1]
+    assert paint[:2] == ("frame", "paint") and paint[3] == pytest.approx(.004)
+    assert paint[4]["strip_upload"] == pytest.approx(6)
+
+
+def test_trace_is_chrome_trace_json(tmp_path):
+    recorder = FrameRecorder()
+    recorder.record_span("layout", 0, .001)
+    _frames(recorder, [FRAME * 1000] * 3, start=.002)
+    trace = json.loads(recorder.export_trace(tmp_path / "trace.json").read_text())
+
+    complete = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+    assert [event["name"] for event in complete] == ["layout"] + ["paint"] * 4
+    assert all(event["ts"] >= 0 and event["dur"] >= 0 and event["pid"] == event["tid"] == 1 for event in complete)
+    assert len([event for event in trace["traceEvents"] if event["ph"] == "C"]) == 3
+    assert trace["metadata"]["report"]["frames"] == 3
+
+
+def test_recorded_input_is_read_back_from_trace():
+    now = [10.0]
+    recorder = FrameRecorder(clock=lambda: now[0])
+    for delta in (-120, -120, 240):
+        recorder.record_input("wheel", delta=delta)
+        now[0] += .05
+    recorder.record_span("layout", now[0], now[0] + .001)
+
+    trace = json.loads(json.dumps(recorder.trace()))
+    assert FrameRecorder.inputs(trace, "wheel") == [
+        (0.0, {"delta": -120}), (pytest.approx(50), {"delta": -120}), (pytest.approx(100), {"delta": 240})
+    ]
+
+
+def test_disabled_recorder_records_nothing():
+    recorder = FrameRecorder(enabled=False)
+    with recorder.frame(), recorder.span("layout"):
+        recorder.record_input("wheel", delta=-120)
+    assert not recorder.events and recorder.report().frames == 0
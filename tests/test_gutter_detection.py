@@ -0,0 +1,59 @@
+import numpy as np
+
+from application.services.tile_manager import ContentAwareTileManager
+from config import Config
+
+
+WIDTH, HEIGHT = 800, 30000
+
+
+def _find_gutter_reference(img_array: np.ndarray) -> list[int]:
+    """Row by row implementation `_find_gutter` replaced"""
+    height, width = img_array.shape
+    row_scores = [np.sum(img_array[y] > 240) / width for y in range(height)]
+
+    gutter_threshold = Config.Performance.MangaViewer.gutter_threshold()
+    min_gutter_height = Config.Performance.MangaViewer.min_gutter_height()
+
+    gutters = []
+    in_gutter = False
+    gutter_start = 0
+    for y, score in enumerate(row_scores):
+        if score > gutter_threshold and not in_gutter:
+            in_gutter = True
+            gutter_start = y
+        elif score <= gutter_threshold and in_gutter:
+            if y - gutter_start >= min_gutter_height:
+                gutters.append(gutter_start + (y - gutter_start) // 2)
+            in_gutter = False
+    return gutters
+
+
+def _make_webtoon_strip(seed: int = 0) -> np.ndarray:
+    """Panels of noisy artwork on white, separated by gutters of varying height, some too thin to count"""
+    rng = np.random.default_rng(seed)
+    page = np.full((HEIGHT, WIDTH), 255, dtype=np.uint8)
+    y = int(rng.integers(0, 40))
+    while y < HEIGHT - 200:
+        panel = int(rng.integers(300, 1500))
+        margin = int(rng.integers(0, 60))   # Panels not spanning whole width
+        page[y:y + panel, margin:WIDTH - margin] = rng.integers(0, 230, (min(panel, HEIGHT - y), WIDTH - 2 * margin), dtype=np.uint8)
+        if rng.random() < .3:   # Speech bubble reaching into gutter
+            page[y + panel:y + panel + 7, 300:500] = 0
+        y += panel + int(rng.choice([3, 9, 10, 11, 40, 150]))
+    return page
+
+
+def test_gutters_match_row_by_row_detection():
+    tm = ContentAwareTileManager()
+    for seed in range(3):
+        page = _make_webtoon_strip(seed)
+        assert tm._find_gutter(page) == _find_gutter_reference(page)
+
+    small = np.full((50, 30), 255, dtype=np.uint8)
+    small[:20] = 0
+    small[35:] = 0
+    assert tm._find_gutter(small) == _find_gutter_reference(small) == [27]
+    assert tm._find_gutter(np.zeros((40, 30), dtype=np.uint8)) == []
+    assert tm._find_gutter(np.full((40, 30), 255, dtype=np.uint8)) == []  # Reaches bottom, not a cut
+
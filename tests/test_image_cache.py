@@ -0,0 +1,348 @@
+import asyncio
+import io
+import mmap
+import os
+import sqlite3
+import threading
+
+import httpx
+import pytest
+from PIL import Image
+
+from application.services.downloaders.download_scheduler import DownloadScheduler
+from application.services.downloaders.image_downloader import ImageDownloader
+from application.services.downloaders.image_transcoder import ImageTranscoder
+from core.models.images import DiscStore, ImageCache, ImageCacheIndex, ImageMetadata
+
+
+def _image(i: int, size: int = 100) -> bytes:
+    return bytes([i]) * size
+
+
+def _files(path) -> list[str]:
+    return sorted(
+        file.name for file in path.iterdir() if not file.name.startswith(ImageCacheIndex.FILE_NAME) and file.name != DiscStore.TEMP_DIR
+    )
+
+
+def _named(cache: ImageCache, blobs) -> list[str]:
+    """Names of `blobs` in their order, every blob in these tests has one name"""
+    names = {blob: name for name, blob in cache._names.items()}
+    return [names[blob] for blob in blobs]
+
+
+def test_get_promotes_so_least_recently_used_is_dropped_from_ram(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=300, max_disc=1000)
+    for i in range(3):
+        cache.add(f"{i}", _image(i))
+
+    assert cache.get("0") == _image(0)
+    cache.add("3", _image(3))
+
+    assert _named(cache, cache._ram_cache) == ["2", "0", "3"]
+    assert _named(cache, cache._disc_cache) == ["1", "2", "0", "3"]
+    cache.flush()
+    assert (tmp_path / cache._names["1"]).read_bytes() == _image(1)
+    assert cache.cur_ram.bytes_value == 300
+    assert cache.cur_disc.bytes_value == 400
+
+
+def test_accounting_is_exact_after_pop_and_replace(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=300, max_disc=250)
+    for i in range(5):
+        cache.add(f"{i}", _image(i))
+    assert cache.cur_ram.bytes_value == 300
+    assert cache.cur_disc.bytes_value == 200
+
+    assert cache.pop("2") == _image(2)  # From ram, only one left on disc
+    blob = cache._names["3"]
+    assert cache.pop("3") == _image(3)
+    cache.flush()
+    assert not (tmp_path / blob).exists()
+    assert cache.cur_ram.bytes_value == 100
+    assert cache.cur_disc.bytes_value == 100
+
+    cache.add("4", _image(4, 50))  # Replace
+    assert cache.cur_ram.bytes_value == 50
+    assert cache.cur_disc.bytes_value == 50
+    assert cache.get("4") == _image(4, 50)
+
+    # Popped entries must not be evicted a second time
+    evictions = cache.stats.ram_evictions
+    cache.add("5", _image(5, 150))
+    assert cache.stats.ram_evictions == evictions
+    assert cache.cur_ram.bytes_value == 200
+
+
+def test_disc_tier_is_bounded_and_hits_are_promoted(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=100, max_disc=200)
+    for i in range(4):
+        cache.add(f"{i}", _image(i))
+
+    assert _named(cache, cache._ram_cache) == ["3"]
+    assert _named(cache, cache._disc_cache) == ["2", "3"]
+    cache.flush()
+    assert _files(tmp_path) == sorted(cache._disc_cache)
+    assert cache.stats.disc_evictions == 2
+    assert "0" not in cache
+
+    assert cache.get("2") == _image(2)  # Disc hit, promoted to ram
+    assert _named(cache, cache._ram_cache) == ["2"]
+    assert _named(cache, cache._disc_cache) == ["3", "2"]
+
+    with pytest.raises(Exception):
+        cache.get("0")
+    assert cache.get("0", b"") == b""
+    assert (cache.stats.ram_hits, cache.stats.disc_hits, cache.stats.misses) == (0, 1, 2)
+    assert cache.stats.hit_rate == pytest.approx(1 / 3)
+
+
+def test_image_larger_than_ram_goes_to_disc_only(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=100, max_disc=1000)
+    cache.add("small", _image(0, 50))
+    cache.add("large", _image(1, 500))
+
+    assert "large" in cache
+    assert _named(cache, cache._ram_cache) == ["small"]
+    assert cache.get("large") == _image(1, 500)
+    assert cache.cur_ram.bytes_value == 50
+
+
+def test_index_survives_restart_and_finds_images_by_url(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    assert not tmp_path.joinpath(ImageCacheIndex.FILE_NAME).exists()  # Loaded lazily
+
+    for i in range(3):
+        metadata = ImageMetadata(url=f"https://cdn.example.com/{i}.png", name=f"page_{i}.jxl", width=720, height=1600 + i, format=".jxl")
+        cache.add(metadata.name, _image(i), metadata)
+    cache.get("page_0.jxl")
+    cache.close()
+
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    metadata = cache.find("https://cdn.example.com/1.png")
+    assert (metadata.name, metadata.width, metadata.height, metadata.size, metadata.format) == ("page_1.jxl", 720, 1601, 100, ".jxl")
+    assert cache.find("https://cdn.example.com/unknown.png") is None
+    assert _named(cache, cache._disc_cache) == ["page_1.jxl", "page_2.jxl", "page_0.jxl"]  # Last access was persisted
+    assert cache.get("page_2.jxl") == _image(2)
+    assert cache.stats.disc_hits == 1
+    cache.close()
+
+
+def test_index_is_reconciled_with_directory(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    cache.add("kept.jxl", _image(0), ImageMetadata(url="https://cdn.example.com/kept.png"))
+    cache.add("deleted.jxl", _image(1), ImageMetadata(url="https://cdn.example.com/deleted.png"))
+    cache.add("resized.jxl", _image(2))
+    deleted, resized = cache._names["deleted.jxl"], cache._names["resized.jxl"]
+    cache.close()
+
+    (tmp_path / deleted).unlink()
+    (tmp_path / resized).write_bytes(_image(2, 30))
+    (tmp_path / "orphan.webp").write_bytes(_image(3, 20))
+    os.utime(tmp_path / "orphan.webp", (0, 0))
+
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    assert cache.find("https://cdn.example.com/deleted.png") is None
+    assert cache.find("https://cdn.example.com/kept.png").name == "kept.jxl"
+    assert dict(zip(_named(cache, cache._disc_cache), cache._disc_cache.values())) == {"orphan.webp": 20, "kept.jxl": 100, "resized.jxl": 30}
+    assert cache._names["orphan.webp"] == "orphan.webp"  # Adopted as blob of the same name
+    assert cache.cur_disc.bytes_value == 150
+    cache.close()
+
+
+def test_max_disc_is_enforced_across_sessions(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    for i in range(5):
+        cache.add(f"{i}", _image(i))
+    cache.get("0")
+    cache.close()
+
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=250)
+    assert "0" in cache
+    assert _named(cache, cache._disc_cache) == ["4", "0"]
+    cache.flush()
+    assert _files(tmp_path) == sorted(cache._disc_cache)
+    cache.close()
+
+
+def test_in_flight_writes_are_read_from_write_back_buffer(tmp_path):
+    store = DiscStore(tmp_path, mmap_threshold=1000)
+    gate = threading.Event()
+    commit = store._commit
+    store._commit = lambda written: (gate.wait(), commit(written))
+
+    store.write("0", _image(0))
+    assert store.is_pending("0")
+    assert not (tmp_path / "0").exists()
+    assert store.read("0") == _image(0)
+    future = store.read_async("0")
+    assert future.done() and future.result() == _image(0)
+
+    gate.set()
+    store.flush()
+    assert not store.is_pending("0")
+    assert (tmp_path / "0").read_bytes() == _image(0)
+    store.close()
+
+
+def test_queued_writes_do_not_outlive_replace_and_delete(tmp_path):
+    store = DiscStore(tmp_path, mmap_threshold=1000)
+    store.write("replaced", _image(0))
+    store.write("replaced", _image(1))
+    store.write("deleted", _image(2))
+    store.delete("deleted")
+    store.close()
+
+    assert _files(tmp_path) == ["replaced"]
+    assert (tmp_path / "replaced").read_bytes() == _image(1)
+    assert not any((tmp_path / DiscStore.TEMP_DIR).iterdir())
+
+
+def test_large_images_are_mapped_and_not_promoted(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=2000, mmap_threshold=300)
+    cache.add("large", _image(1, 500))
+    cache.add("small", _image(2, 200))
+    cache.add("filler", _image(3, 1000))  # Pushes both out of ram
+    cache.flush()
+
+    image = cache.get("large")
+    assert isinstance(image, mmap.mmap)
+    assert image[:] == _image(1, 500)
+    assert cache._names["large"] not in cache._ram_cache
+    assert cache.pop("large") == _image(1, 500)  # Copied, mapping would outlive deleted file
+    image.close()
+
+    future = cache.get_async("small")
+    assert future.result(timeout=5) == _image(2, 200)
+    assert _named(cache, cache._ram_cache) == ["small"]  # Promoted before future is resolved
+    assert cache.get_async("small").done()
+    assert cache.stats.disc_hits == 2
+    with pytest.raises(Exception):
+        cache.get_async("missing").result()
+    cache.close()
+
+
+def test_identical_images_share_one_blob_until_last_name_is_discarded(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    cache.add("credits_1.jxl", _image(0))
+    cache.add("credits_2.jxl", _image(0))
+    cache.add("page.jxl", _image(1))
+
+    assert cache._names["credits_1.jxl"] == cache._names["credits_2.jxl"]
+    assert cache.stats.deduplicated == 1
+    assert cache.cur_disc.bytes_value == 200
+    assert cache.cur_ram.bytes_value == 200
+
+    assert cache.pop("credits_1.jxl") == _image(0)
+    assert cache.get("credits_2.jxl") == _image(0)  # Still referenced
+    cache.add("page.jxl", _image(0))  # Replaced, its old blob has no names left
+    assert cache.cur_disc.bytes_value == 100
+    cache.close()
+
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    assert "page.jxl" in cache
+    assert cache._names["credits_2.jxl"] == cache._names["page.jxl"]
+    assert _files(tmp_path) == [cache._names["page.jxl"]]
+    cache.close()
+
+
+def test_source_hash_finds_converted_image_to_link(tmp_path):
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    source_hash = ImageCache.hasher(b"original png").hexdigest()
+    metadata = ImageMetadata(
+        url="https://a.example.com/1.png", name="a_1.jxl", width=720, height=1600, size=100, format=".jxl", source_hash=source_hash
+    )
+    cache.add(metadata.name, _image(0), metadata)
+    cache.close()
+
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    assert cache.find_source(ImageCache.hasher(b"other png").hexdigest()) is None
+    converted = cache.find_source(source_hash)
+    assert (converted.name, converted.width, converted.height, converted.format) == ("a_1.jxl", 720, 1600, ".jxl")
+
+    mirror = converted.model_copy(update={"url": "https://b.example.com/1.png", "name": "b_1.jxl"})
+    assert cache.link(mirror.name, mirror)
+    assert cache.get("b_1.jxl") == _image(0)
+    assert cache.find("https://b.example.com/1.png").name == "b_1.jxl"
+    assert cache.cur_disc.bytes_value == 100
+
+    cache.pop("a_1.jxl")
+    cache.pop("b_1.jxl")
+    assert cache.find_source(source_hash) is None
+    assert not cache.link("c_1.jxl", mirror)
+    cache.close()
+
+
+def test_index_without_blobs_is_migrated(tmp_path):
+    connection = sqlite3.connect(tmp_path / ImageCacheIndex.FILE_NAME)
+    connection.execute(
+        "CREATE TABLE images (name TEXT PRIMARY KEY, size INTEGER NOT NULL, format TEXT NOT NULL DEFAULT '', "
+        "width INTEGER NOT NULL DEFAULT 0, height INTEGER NOT NULL DEFAULT 0, url TEXT NOT NULL DEFAULT '', last_access REAL NOT NULL)"
+    )
+    connection.execute("INSERT INTO images VALUES ('old.jxl', 100, '.jxl', 720, 1600, 'https://cdn.example.com/old.png', 0)")
+    connection.commit()
+    connection.close()
+    (tmp_path / "old.jxl").write_bytes(_image(0))
+
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=1000)
+    assert cache.find("https://cdn.example.com/old.png").height == 1600
+    assert cache.get("old.jxl") == _image(0)
+    cache.close()
+
+
+def test_mirrored_image_is_converted_once(tmp_path):
+    png = io.BytesIO()
+    Image.new("RGB", (32, 48), "white").save(png, format="PNG")
+
+    class Clients:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=png.getvalue())))
+
+        def get(self, url):
+            return self.client
+
+    class CountingTranscoder(ImageTranscoder):
+        calls = 0
+
+        async def transcode(self, image_data):
+            CountingTranscoder.calls += 1
+            return await super().transcode(image_data)
+
+    cache = ImageCache(tmp_path, max_ram=1000 * 1000, max_disc=1000 * 1000)
+    downloader = ImageDownloader(cache, Clients(), DownloadScheduler(), CountingTranscoder(processes=0, preferable_format="WEBP"))
+    finished = []
+    downloader.download_finished.connect(finished.append)
+
+    async def download():
+        await downloader._download_and_process_single_image("https://a.example.com/credits.png", "a_credits")
+        await downloader._download_and_process_single_image("https://b.example.com/credits.png", "b_credits")
+    asyncio.run(download())
+
+    assert CountingTranscoder.calls == 1
+    assert [(m.name, m.width, m.height) for m in finished] == [("a_credits.webp", 32, 48), ("b_credits.webp", 32, 48)]
+    assert cache.get("a_credits.webp") == cache.get("b_credits.webp")
+    assert cache.stats.deduplicated == 1
+    cache.close()
+
+
+def test_close_waits_for_reads_in_flight_without_deadlock(tmp_path, monkeypatch):
+    cache = ImageCache(tmp_path, max_ram=1000, max_disc=2000)
+    cache.add("image", _image(1, 200))
+    cache.add("filler", _image(2, 1000))    # Pushes it out of ram
+    cache.flush()
+
+    started, release = threading.Event(), threading.Event()
+    read = DiscStore.read
+    def slow_read(store, name, allow_mmap=True):
+        started.set()
+        release.wait(5)
+        return read(store, name, allow_mmap)
+    monkeypatch.setattr(DiscStore, "read", slow_read)
+
+    future = cache.get_async("image")
+    started.wait(5)
+    closing = threading.Thread(target=cache.close, daemon=True)
+    closing.start()
+    release.set()   # Read finishes while close waits for it
+    closing.join(5)
+    assert not closing.is_alive()
+    assert future.result(timeout=5) == _image(1, 200)
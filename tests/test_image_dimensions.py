@@ -0,0 +1,94 @@
+import asyncio
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from application.services.downloaders.image_downloader import ImageDownloader
+from application.services.downloaders.image_transcoder import ImageTranscoder
+from application.services.downloaders.download_scheduler import DownloadScheduler
+from utils.image_dimensions import HeaderSniffer, get_dimensions_from_bytes, get_image_format
+
+
+FORMATS = {
+    "JPEG": {},
+    "PNG": {},
+    "GIF": {},
+    "WEBP": {},
+    "JXL": {"lossless": True, "effort": 1},
+    "AVIF": {"speed": 10},
+}
+
+
+def _make_image(format: str, size=(333, 777), **params) -> bytes:
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, format=format, **{**FORMATS[format], **params})
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_sniffer_finds_dimensions_within_first_kilobytes(format):
+    data = _make_image(format)
+    sniffer = HeaderSniffer()
+
+    fed = 0
+    for i in range(0, len(data), 256):
+        fed += 256
+        if sniffer.feed(data[i:i + 256]):
+            break
+
+    assert sniffer.format == format
+    assert sniffer.dimensions == (333, 777)
+    assert fed <= 4 * 1024
+    assert get_dimensions_from_bytes(data) == (333, 777)
+
+
+@pytest.mark.parametrize("size", [(8, 8), (1200, 900), (1600, 900), (720, 12000), (4001, 3)])
+def test_jxl_size_header_variants(size):
+    # Small sizes, aspect ratio shortcuts and 30 bit sizes are all encoded differently
+    data = _make_image("JXL", size)
+    assert get_dimensions_from_bytes(data) == size
+
+
+def test_jxl_container():
+    exif = Image.Exif()
+    exif[0x010E] = "description"
+    data = _make_image("JXL", exif=exif.tobytes())
+    assert get_image_format(data) == "JXL"
+    assert not data.startswith(b"\xff\x0a")
+    assert get_dimensions_from_bytes(data) == (333, 777)
+
+
+def test_sniffer_gives_up_on_unknown_format_and_limit():
+    sniffer = HeaderSniffer()
+    assert sniffer.feed(b"<html>" + b" " * 100) is None
+    assert sniffer.done and sniffer.format is None
+
+    sniffer = HeaderSniffer(limit=64)
+    sniffer.feed(_make_image("JPEG")[:64])
+    assert sniffer.done and sniffer.dimensions is None
+
+
+def test_header_prefetch_uses_range_request():
+    data = _make_image("WEBP")
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        start, end = map(int, request.headers["Range"].removeprefix("bytes=").split("-"))
+        return httpx.Response(206, content=data[start:end + 1], headers={"Content-Range": f"bytes {start}-{end}/{len(data)}"})
+
+    class Clients:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+        def get(self, url):
+            return self.client
+
+    downloader = ImageDownloader(None, Clients(), DownloadScheduler(), ImageTranscoder(processes=0))
+    metadata = []
+    downloader.metadata_downloaded.connect(metadata.append)
+
+    assert asyncio.run(downloader._download_image_header("https://cdn.example.com/1.webp", "page_1"))
+    assert requests[0].headers["Range"] == "bytes=0-4095"
+    assert (metadata[0].width, metadata[0].height, metadata[0].size, metadata[0].format) == (333, 777, len(data), "WEBP")
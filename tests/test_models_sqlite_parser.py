@@ -0,0 +1,113 @@
+import ujson as json
+import pytest
+
+from application.services.handlers import ModelStore
+from application.services.parsers import ModelsSqliteParser
+from core.models.images import ImageMetadata
+from core.models.manga import ChapterImage, Manga, MangaChapter
+from core.repositories.manga import ImagesDataRepository, MangaChaptersRepository, MangaRepository
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ModelStore(tmp_path / "library.sqlite3")
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def writes(store, monkeypatch):
+    """Keys written by collection"""
+    written: dict[str, list[str]] = {}
+    put = store.put
+    def counted_put(collection, rows):
+        rows = list(rows)
+        written.setdefault(collection, []).extend(key for key, _ in rows)
+        put(collection, rows)
+    monkeypatch.setattr(store, "put", counted_put)
+    return written
+
+
+def _image(i: int) -> ChapterImage:
+    return ChapterImage(number=i, metadata=ImageMetadata(url=f"https://a/{i}.jpg"))
+
+
+def _images(store, tmp_path, n: int = 0) -> ModelsSqliteParser[int, ChapterImage]:
+    parser = ModelsSqliteParser(tmp_path / "images.json", ChapterImage, int, store)
+    for i in range(n):
+        parser.add(i, _image(i))
+    return parser
+
+
+def test_only_added_and_changed_models_are_written(store, writes, tmp_path):
+    _images(store, tmp_path, 5).save()
+    images = _images(store, tmp_path)
+    assert len(images) == 5 and not images._models_collection     # Keys only, models are loaded on demand
+    assert images.get(3).metadata.url == "https://a/3.jpg" and len(images._models_collection) == 1
+
+    images.get(1).add_tag("read")
+    images.get(2).name = "assigned"     # Field assignment marks model changed too
+    images.add(5, _image(5))
+    writes.clear()
+    images.save()
+    images.save()
+    assert sorted(*writes.values()) == ["1", "2", "5"]
+
+    images = _images(store, tmp_path)
+    assert images.get(1).tags == {"read"} and images.get(2).name == "assigned" and images.get(5).number == 5
+    assert not images.get(0)._changed    # Loading is not a change
+
+
+def test_order_is_kept_through_updates_and_removals(store, tmp_path):
+    images = _images(store, tmp_path, 4)
+    images.save()
+    images.get(0).set_changed()
+    images.pop(2)
+    images.save()
+
+    images = _images(store, tmp_path)
+    assert list(images.get_all()) == [0, 1, 3]
+    assert images.get_i(-1).number == 3 and images.get_i(5) is None
+    assert images.get(2) is None
+
+
+def test_json_collection_is_imported_once(store, tmp_path):
+    (tmp_path / "images.json").write_text(json.dumps(
+        {str(i): _image(i).model_dump(mode="json") for i in range(3)}
+    ))
+    images = _images(store, tmp_path)
+    assert [image.number for image in images.get_all().values()] == [0, 1, 2]
+    images.pop(0)
+    images.save()
+    assert list(_images(store, tmp_path).get_all()) == [1, 2]    # Not imported again
+
+
+def test_library_is_saved_in_one_commit(store, writes, tmp_path, monkeypatch):
+    monkeypatch.setattr(ModelStore, "open", lambda path: store)
+    commits = []
+    transaction = store.transaction
+    def counted_transaction():
+        if not store._depth:
+            commits.append(1)
+        return transaction()
+    monkeypatch.setattr(store, "transaction", counted_transaction)
+
+    library = MangaRepository(tmp_path / "manga.json")
+    for id_ in ("a", "b"):
+        manga = Manga(name=id_, id_=id_, folder=tmp_path / id_).set_changed()
+        manga._chapters_repo = MangaChaptersRepository(manga.folder / "chapters.json")
+        for num in range(1, 4):
+            chapter = MangaChapter(num=num, folder=manga.folder / f"chapter{num}").set_changed()
+            chapter._repo = ImagesDataRepository(chapter.folder / "images.json").add(0, _image(0))
+            manga.add_chapter(chapter)
+        library.add(id_, manga)
+    library.save()
+    assert len(commits) == 1 and sum(map(len, writes.values())) == 2 + 2 * 3 + 2 * 3
+
+    library = MangaRepository(tmp_path / "manga.json")
+    chapter = library.get("b")._chapters_repo.get(2)
+    assert chapter._repo.get(0).number == 0
+    chapter.set_is_read()
+    writes.clear()
+    library.save()
+    assert list(writes.values()) == [["2.0"]]
@@ -0,0 +1,122 @@
+import io
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from core.models.images import MipPyramid, PageBuffer, PageBuffers
+from utils import ThreadingManager
+
+
+def _png(height: int = 400, width: int = 30) -> bytes:
+    pixels = np.zeros((height, width, 3), dtype=np.uint8)
+    pixels[:, :, 0] = np.arange(height)[:, None] % 256
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_page_is_decoded_once_and_strips_are_views(monkeypatch):
+    decodes = []
+    original_open = Image.open
+    monkeypatch.setattr(Image, "open", lambda *args: decodes.append(1) or original_open(*args))
+
+    image = Future()
+    page = PageBuffer("page.png", image)
+    assert not page.is_decoded
+
+    strips = {}
+    threads = [
+        threading.Thread(target=lambda y=y: strips.__setitem__(y, page.rows(y, y + 40))) for y in range(0, 400, 40)
+    ]
+    for thread in threads:
+        thread.start()
+    image.set_result(_png())    # Workers wait for disc read, then for the one decode
+    for thread in threads:
+        thread.join()
+
+    assert len(decodes) == 1
+    pixels = page.pixels()
+    for y, rows in strips.items():
+        assert rows.shape == (40, 30, 4)
+        assert np.shares_memory(rows, pixels)
+        assert rows[0, 0].tolist() == [0, 0, y % 256, 255]  # BGRA
+
+
+def test_page_is_dropped_when_last_holder_releases():
+    pages = PageBuffers()
+    first = pages.acquire("page.png", _png())
+    second = pages.acquire("page.png", b"never decoded")
+    assert first is second and len(pages) == 1
+
+    first.pixels()
+    assert pages.nbytes == (400 * 30 + 200 * 15 + 100 * 8 + 50 * 4) * 4  # Whole pyramid
+
+    strip = first.rows(0, 40)
+    pages.release("page.png")
+    assert "page.png" in pages
+    pages.release("page.png")
+    assert "page.png" not in pages and pages.nbytes == 0
+    assert strip[39, 0, 2] == 39    # Strip in flight keeps its rows
+
+    pages.release("page.png")   # Releasing twice is harmless
+    assert pages.acquire("page.png", _png()).refs == 1
+
+
+def test_pyramid_levels_are_box_filtered_and_read_back_from_file(tmp_path):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (301, 45, 4), dtype=np.uint8)    # Odd sizes, tiles end mid strip
+    pyramid = MipPyramid.from_pixels(pixels, 4)
+    assert pyramid.shapes == [(301, 45), (151, 23), (76, 12), (38, 6)]
+    expected = (pixels[:2, :2].astype(int).sum(axis=(0, 1)) + 2) // 4
+    assert pyramid.rows(1, 0, 2)[0, 0].tolist() == expected.tolist()
+
+    pyramid.save(tmp_path / "page.mip")
+    stored = MipPyramid.open(tmp_path / "page.mip")
+    for level in range(4):
+        for y_start, y_end in ((0, 301), (0, 1), (60, 200), (127, 129), (290, 301)):
+            assert np.array_equal(stored.rows(level, y_start, y_end), pyramid.rows(level, y_start, y_end))
+    stored.close()
+
+
+def test_saved_pyramid_is_used_instead_of_image(tmp_path):
+    pages = PageBuffers(tmp_path)
+    strip = pages.acquire("page.png", _png(), key="blob").rows(40, 80, level=2)
+    pages.release("page.png")
+    ThreadingManager.thread_pool.waitForDone()  # Saved in background
+    assert (tmp_path / "blob.mip").exists()
+
+    never = lambda: pytest.fail("Image was read although pyramid was saved")
+    page = pages.acquire("page.png", never, key="blob")
+    assert np.array_equal(page.rows(40, 80, level=2), strip)
+    assert page.rows(0, 400, level=3).shape == (50, 4, 4)
+    pages.release("page.png")
+
+
+def test_pyramid_store_is_kept_within_budget(tmp_path):
+    def save(pages: PageBuffers, key: str):
+        pages.acquire(key, _png(), key=key).pixels()
+        pages.release(key)
+        ThreadingManager.thread_pool.waitForDone()
+
+    probe = PageBuffers(tmp_path / "probe")
+    save(probe, "probe")
+    size = probe.stored_bytes
+
+    pages = PageBuffers(tmp_path, max_disc=3 * size)
+    for key in ("a", "b", "c"):
+        save(pages, key)
+    never = lambda: pytest.fail("Image was read although pyramid was saved")
+    pages.acquire("a", never, key="a")  # Seen again, so "b" is least recently used
+    pages.release("a")
+    for key in ("d", "e"):
+        save(pages, key)
+
+    assert sorted(path.stem for path in tmp_path.glob("*.mip")) == ["a", "d", "e"]
+    assert pages.stored_bytes == 3 * size
+
+    reopened = PageBuffers(tmp_path, max_disc=size)    # Budget lowered between sessions, recency is kept by mtime
+    assert reopened.stored_bytes == size
+    assert [path.stem for path in tmp_path.glob("*.mip")] == ["e"]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from core.models.images import PageLayout
+
+
+GAP = 5
+
+
+def _position_reference(sizes: dict[int, tuple[int, int]], index: int) -> float:
+    """Sorted sum `MangaViewer._calculate_position_for_index` did"""
+    return sum(sizes[i][1] + GAP for i in sorted(sizes) if i < index)
+
+
+def test_positions_follow_out_of_order_updates():
+    rng = np.random.default_rng(0)
+    layout, sizes = PageLayout(GAP), {}
+    for _ in range(500):
+        index = int(rng.integers(0, 300))
+        if rng.random() < .15:
+            delta = layout.remove(index)
+            old = sizes.pop(index, None)
+            assert delta == (-(old[1] + GAP) if old else 0)
+        else:
+            width, height = int(rng.integers(600, 1000)), int(rng.integers(100, 3000))
+            old = sizes.get(index)
+            sizes[index] = (width, height)
+            assert layout.set(index, width, height) == (height - old[1] if old else height + GAP)
+
+        probe = int(rng.integers(0, 320))
+        assert layout.position(probe) == _position_reference(sizes, probe)
+    assert layout.total_height == sum(height + GAP for _, height in sizes.values())
+    assert layout.max_width == max(width for width, _ in sizes.values())
+    assert len(layout) == len(sizes) and layout.capacity >= 300
+
+
+def test_page_at_y():
+    layout = PageLayout(GAP)
+    assert layout.index_at(0) is None
+    for index, height in ((0, 100), (1, 50), (3, 200)):     # Page 2 is not known yet
+        layout.set(index, 800, height)
+
+    assert [layout.index_at(y) for y in (0, 99, 104, 105, 159, 160, 364, 1000)] == [0, 0, 0, 1, 1, 3, 3, 3]
+    assert layout.index_at(-1) is None
+    assert layout.indexes_in(0, 50) == [0] and layout.indexes_in(110, 120) == [1]
+    assert layout.indexes_in(100, 170) == layout.indexes_in(-10, 1000) == [0, 1, 3]
+    assert layout.indexes_in(-50, -1) == layout.indexes_in(400, 500) == []
+    with pytest.raises(IndexError):
+        layout.set(-1, 800, 100)
+
+
+def test_first_page_arriving_last_moves_pages_after_it():
+    pages = 300
+    sizes = {index: (800, 2000) for index in range(1, pages)}
+    layout = PageLayout(GAP)
+    for index in sizes:
+        layout.set(index, 800, 2000)
+    assert layout.position(pages - 1) == _position_reference(sizes, pages - 1)
+
+    assert layout.set(0, 800, 2000) == 2000 + GAP
+    sizes[0] = (800, 2000)
+    assert [layout.position(index) for index in range(pages)] == [_position_reference(sizes, index) for index in range(pages)]
@@ -0,0 +1,128 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from application.services.tile_manager import ContentAwareTileManager
+from core.models.images import ImageCache, ImageMetadata, PageBuffers, PanelResultIndex
+from utils import ThreadingManager
+
+
+def _group_peaks_reference(candidates, strengths, gap) -> list[int]:
+    """Python grouping loop `_group_peaks` replaced"""
+    strength = dict(zip(candidates.tolist(), strengths.tolist()))
+    groups, current = [], [candidates[0]]
+    for candidate in candidates[1:]:
+        if candidate - current[-1] < gap:
+            current.append(candidate)
+        else:
+            groups.append(max(current, key=lambda y: strength[y]))
+            current = [candidate]
+    groups.append(max(current, key=lambda y: strength[y]))
+    return groups
+
+
+def _page(gutters: bool) -> np.ndarray:
+    """Four flat panels with black borders, separated by white gutters or touching each other"""
+    page = np.full((4000, 800), 255, dtype=np.uint8)
+    for top in range(0, 4000, 1000):
+        bottom = top + (940 if gutters else 1000)
+        page[top:bottom, 20:780] = 160
+        page[top:top + 4, 20:780] = 0
+        page[bottom - 4:bottom, 20:780] = 0
+    return page
+
+
+def test_vectorized_grouping_matches_loop():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        candidates = np.unique(rng.integers(0, 2000, rng.integers(1, 200)))
+        strengths = rng.integers(0, 5, len(candidates)).astype(np.float32)  # Ties, first one wins
+        peaks, _ = ContentAwareTileManager._group_peaks(candidates, strengths, 16)
+        assert peaks.tolist() == _group_peaks_reference(candidates, strengths, 16)
+
+
+def test_gutters_confirmed_by_edges_are_confident():
+    result = ContentAwareTileManager()._detect_panels(_page(gutters=True))
+    assert result.method == "gutter_detection"
+    assert result.boundaries == [970, 1970, 2970]
+    assert result.confidence >= 0.9
+
+
+def test_panels_without_gutters_are_found_by_edges():
+    result = ContentAwareTileManager()._detect_panels(_page(gutters=False))
+    assert result.method == "edge_detection"
+    assert len(result.boundaries) == 3
+    assert all(abs(found - expected) <= 8 for found, expected in zip(result.boundaries, [1000, 2000, 3000]))
+    assert result.confidence >= 0.8
+
+
+def test_blank_page_has_no_boundaries():
+    result = ContentAwareTileManager()._detect_panels(np.full((3000, 800), 255, dtype=np.uint8))
+    assert (result.boundaries, result.confidence, result.method) == ([], 0.0, "failed")
+
+
+def test_stored_results_are_served_without_decoding(tmp_path):
+    buffer = io.BytesIO()
+    Image.fromarray(_page(gutters=True)).save(buffer, format="PNG")
+    cache = ImageCache(tmp_path / "images")
+    cache.add("page.png", buffer.getvalue())
+
+    tm = ContentAwareTileManager(cache, PanelResultIndex(tmp_path / "panels.sqlite3"))
+    analyzed = tm._analyze_panel_worker(cache.get_async("page.png"), cache.content_key("page.png"))
+    assert analyzed.boundaries == [970, 1970, 2970]
+    tm.close()
+    tm.close()
+    assert tm._analyze_panel_worker(buffer.getvalue()).boundaries == analyzed.boundaries    # Without index after close
+
+    tm = ContentAwareTileManager(ImageCache(tmp_path / "images"), PanelResultIndex(tmp_path / "panels.sqlite3"))  # Next session
+    tm._detect_panels = lambda img_array: pytest.fail("Stored page was analyzed again")
+    emitted = []
+    tm.strips_generated.connect(lambda name, strips: emitted.append(strips))
+    metadata = ImageMetadata(url="", name="page.png", width=800, height=4000)
+
+    assert tm.analyze_panel_async(metadata, None) is None
+    assert [strip.y_start for strip in emitted[0]] == [0, 970, 1970, 2970]
+
+    tm.min_strip_height += 1    # Results depend on detector settings
+    assert tm._stored_result(cache.content_key("page.png")) is None
+
+
+def test_images_not_in_cache_are_found_by_hash_of_bytes(tmp_path):
+    buffer = io.BytesIO()
+    Image.fromarray(_page(gutters=False)).save(buffer, format="PNG")
+    tm = ContentAwareTileManager(panel_index=PanelResultIndex(tmp_path / "panels.sqlite3"))
+    analyzed = tm._analyze_panel_worker(buffer.getvalue())
+
+    tm._detect_panels = lambda img_array: pytest.fail("Stored page was analyzed again")
+    assert tm._analyze_panel_worker(buffer.getvalue()) == analyzed
+    assert len(tm.panel_index) == 1
+
+
+def test_pages_are_analyzed_from_page_buffer_without_reading_stored_ones(tmp_path, qt_app):
+    buffer = io.BytesIO()
+    Image.fromarray(_page(gutters=True)).save(buffer, format="PNG")
+    cache = ImageCache(tmp_path / "images")
+    cache.add("page.png", buffer.getvalue())
+    pages = PageBuffers()
+    tm = ContentAwareTileManager(cache, PanelResultIndex(tmp_path / "panels.sqlite3"), pages)
+    emitted, reads = [], []
+    tm.strips_generated.connect(lambda name, strips: emitted.append(strips))
+    metadata = ImageMetadata(url="", name="page.png", width=800, height=4000)
+    def read():
+        reads.append(metadata.name)
+        return cache.get_async(metadata.name)
+
+    assert tm.analyze_panel_async(metadata, read) is not None
+    strip_page = pages.acquire("page.png", read)    # Strips of page entering cull window meanwhile
+    ThreadingManager.thread_pool.waitForDone()
+    qt_app.processEvents()
+    assert [strip.y_start for strip in emitted[0]] == [0, 970, 1970, 2970]
+    assert reads == ["page.png"] and strip_page.is_decoded   # Decoded once for analysis and strips
+    pages.release("page.png")
+    assert not len(pages) and not tm._analyzing
+
+    assert tm.analyze_panel_async(metadata, read) is None   # Stored, image is not read
+    assert reads == ["page.png"] and len(emitted) == 2
+    tm.close()
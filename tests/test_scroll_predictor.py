@@ -0,0 +1,40 @@
+import pytest
+
+from core.models.images import ScrollPredictor
+
+
+def _scroll(predictor: ScrollPredictor, velocity: float, y: float = 0.0, target: float | None = None, start: float = 0.0) -> float:
+    for frame in range(10):    # 60 fps
+        y += velocity / 60
+        predictor.update(y, target, now=start + frame / 60)
+    return y
+
+
+def test_velocity_from_recent_positions_predicts_lead():
+    predictor = ScrollPredictor(horizon_ms=300, fling_velocity=6000)
+    assert predictor.velocity == 0 and predictor.lead() == 0 and not predictor.is_moving
+
+    _scroll(predictor, 1200)
+    assert predictor.velocity == pytest.approx(1200)
+    assert predictor.lead() == pytest.approx(360)  # 300 ms ahead
+    assert predictor.is_moving and not predictor.is_flinging
+
+    _scroll(predictor, -2000, y=5000, start=1.0)   # Older positions are forgotten
+    assert predictor.lead() == pytest.approx(-600)
+    assert predictor.lead(limit=500) == -500
+
+
+def test_animation_target_is_where_viewport_goes():
+    predictor = ScrollPredictor(horizon_ms=300, fling_velocity=6000)
+    y = _scroll(predictor, 600, target=4000)
+    assert predictor.lead() == pytest.approx(4000 - y)
+
+
+def test_fling_until_settled():
+    predictor = ScrollPredictor(horizon_ms=300, fling_velocity=6000)
+    _scroll(predictor, 9000)
+    assert predictor.is_flinging
+
+    predictor.reset()
+    predictor.update(2000, now=1.0)
+    assert not predictor.is_flinging and not predictor.is_moving
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PySide6.QtGui import QPixmap
+
+from core.models.images import StripCache, StripInfo
+from resources.enums import StripQuality
+
+
+STRIP = 100 * 100 * 4   # Bytes of full strip pixmap
+
+
+pytestmark = pytest.mark.usefixtures("qt_app")
+
+
+def _load(cache: StripCache, index: int, quality: StripQuality, requested: StripQuality | None = None):
+    """Request strip and finish its load at once, as worker would"""
+    info = StripInfo(image_name="page", index=index, y_start=index * 100, y_end=index * 100 + 100, width=100, height=100)
+    cache._load_strip_async = lambda *args: None
+    cache.request(info, quality, page=None)
+    size = int(100 * {StripQuality.PREVIEW: .125, StripQuality.LOW: .25, StripQuality.MEDIUM: .5, StripQuality.HIGH: 1}[quality])
+    cache._on_strip_loaded(info, quality, QPixmap(size, size))
+    if requested is not None:
+        cache.request(info, requested, page=None)  # Scrolled away
+
+
+def test_far_high_strips_are_downgraded_before_anything_is_dropped():
+    cache = StripCache(max_memory=3 * STRIP + 1000)  # Room for previews
+    unloaded, loaded = [], []
+    cache.strip_unloaded.connect(lambda name, index: unloaded.append(index))
+    cache.strip_loaded.connect(lambda name, index, data: loaded.append((index, data.loaded_quality)))
+
+    _load(cache, 0, StripQuality.HIGH, requested=StripQuality.PREVIEW)  # Far
+    _load(cache, 1, StripQuality.HIGH, requested=StripQuality.MEDIUM)   # Near
+    _load(cache, 2, StripQuality.HIGH)
+    assert cache.current_memory_usage.bytes_value == 3 * STRIP and cache.memory_by_quality["HIGH"] == 3 * STRIP
+
+    loaded.clear()
+    _load(cache, 3, StripQuality.HIGH)
+    assert not unloaded
+    assert (0, StripQuality.PREVIEW) in loaded and cache.cache["page"][1].pixmap is not None
+    preview = cache.cache["page"][0].preview_pixmap
+    assert (preview.width(), preview.height()) == (12, 12)
+    assert cache.memory_by_quality == {"PREVIEW": 12 * 12 * 4, "LOW": 0, "MEDIUM": 0, "HIGH": 3 * STRIP}
+    assert cache.current_memory_usage <= cache.max_memory
+
+
+def test_strips_are_dropped_farthest_first_and_visible_ones_are_kept():
+    cache = StripCache(max_memory=2 * STRIP)
+    unloaded = []
+    cache.strip_unloaded.connect(lambda name, index: unloaded.append(index))
+
+    _load(cache, 0, StripQuality.MEDIUM, requested=StripQuality.LOW)
+    _load(cache, 1, StripQuality.PREVIEW)
+    _load(cache, 2, StripQuality.HIGH)
+    _load(cache, 3, StripQuality.HIGH)
+    assert unloaded == [1, 0]
+    assert set(cache.cache["page"]) == {2, 3}
+    assert cache.memory_by_quality["HIGH"] == cache.current_memory_usage.bytes_value == 2 * STRIP
+
+    _load(cache, 4, StripQuality.HIGH)  # All in viewport, over budget rather than flickering
+    assert set(cache.cache["page"]) == {2, 3, 4}
+
+
+def test_held_quality_is_not_loaded_again():
+    cache = StripCache(max_memory=10 * STRIP)
+    _load(cache, 0, StripQuality.HIGH)
+    requests = []
+    cache._load_strip_async = lambda info, quality, page, distance: requests.append(quality)
+
+    info = cache.cache["page"][0].info
+    cache.request(info, StripQuality.HIGH, page=None)
+    assert not requests
+    cache.request(info, StripQuality.PREVIEW, page=None)     # Held HIGH is shown instead
+    assert not requests
+    cache.request(info, StripQuality.MEDIUM, page=None)
+    assert requests == [StripQuality.MEDIUM]
+
+
+def test_regenerated_strip_replaces_cached_one_of_old_geometry():
+    cache = StripCache(max_memory=10 * STRIP)
+    _load(cache, 0, StripQuality.HIGH)
+    old = cache.cache["page"][0].info
+    loaded = []
+    cache.strip_loaded.connect(lambda name, index, data: loaded.append(data.info))
+
+    panel = old.model_copy(update={"y_end": 80, "height": 80, "is_panel_boundary": True})
+    cache.request(panel, StripQuality.HIGH, page=None)
+    assert not loaded and cache.cache["page"][0].info == panel and cache.current_memory_usage.bytes_value == 0
+
+    cache._on_strip_loaded(old, StripQuality.HIGH, QPixmap(100, 100))   # Loaded before strips were regenerated
+    assert not loaded and cache.cache["page"][0].pixmap is None
+
+
+def test_strips_of_cancelled_image_are_not_kept_at_high_quality():
+    cache = StripCache(max_memory=2 * STRIP)
+    _load(cache, 0, StripQuality.HIGH)
+    _load(cache, 1, StripQuality.HIGH)
+
+    cache.cancel("page")    # Left cull window
+    _load(cache, 2, StripQuality.HIGH)
+    strips = cache.cache["page"]
+    assert strips[0].pixmap is None and strips[0].preview_pixmap is not None
+    assert strips[2].loaded_quality is StripQuality.HIGH
+    assert cache.current_memory_usage <= cache.max_memory
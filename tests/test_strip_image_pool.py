@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+from PySide6.QtGui import QImage, QPixmap
+
+from core.models.images import PageBuffer, StripCache, StripImagePool, StripInfo
+from resources.enums import StripQuality
+
+
+pytestmark = pytest.mark.usefixtures("qt_app")
+
+
+def _rows(value: int, height: int = 64, width: int = 100) -> np.ndarray:
+    rows = np.full((height, width, 4), 255, dtype=np.uint8)
+    rows[..., :3] = value
+    return rows
+
+
+def test_released_images_are_filled_again_without_allocating():
+    pool = StripImagePool(max_memory=10 * 64 * 100 * 4)
+    images = [pool.fill(_rows(i)) for i in range(3)]
+    assert pool.allocated == 3
+    for image in images:
+        pool.release(image)
+    assert pool.free_memory.bytes_value == 3 * 64 * 100 * 4
+
+    for i in range(100):
+        pool.release(pool.fill(_rows(i)))
+    assert pool.allocated == 3 and pool.reused == 100
+    assert pool.fill(_rows(1, height=32)) is not None and pool.allocated == 4    # Other size is allocated
+
+
+def test_reused_image_does_not_change_pixmap_still_shown():
+    pool = StripImagePool()
+    image = pool.fill(_rows(10))
+    pixmap = QPixmap.fromImage(image)
+    pool.release(image)
+
+    again = pool.fill(_rows(200))   # Detached from pixmap by Qt, not written under it
+    assert again.pixelColor(5, 5).getRgb() == (200, 200, 200, 255)
+    assert pixmap.toImage().pixelColor(5, 5).getRgb() == (10, 10, 10, 255)
+
+
+def test_pool_keeps_at_most_its_budget():
+    pool = StripImagePool(max_memory=64 * 100 * 4)
+    first, second = pool.fill(_rows(1)), pool.fill(_rows(2))
+    pool.release(first)
+    pool.release(second)
+    pool.release(QImage(100, 64, QImage.Format.Format_RGB888))  # Not of pool
+    assert pool.free_memory.bytes_value == 64 * 100 * 4
+
+
+def test_dropped_strip_gives_its_image_back():
+    cache = StripCache(max_memory=10 ** 9, pool_memory=10 ** 8)
+    page = PageBuffer("page", None)
+    page._pyramid = type("Pyramid", (), {"rows": lambda self, level, y_start, y_end: _rows(30, y_end - y_start)})()
+    info = StripInfo(image_name="page", index=0, y_start=0, y_end=64, width=100, height=64)
+    cache._load_strip_async = lambda *args: None
+    cache.request(info, StripQuality.HIGH, page)
+
+    image = cache._load_strip_worker(info, StripQuality.HIGH, page)
+    cache._on_strip_loaded(info, StripQuality.HIGH, image)
+    pixmap = cache.cache["page"][0].pixmap
+    assert pixmap.toImage().pixelColor(0, 0).getRgb() == (30, 30, 30, 255)
+    assert cache.images.free_memory.bytes_value == 0
+
+    cache._set_pixmap(cache.cache["page"][0], None, None)
+    assert cache.images.free_memory.bytes_value == 64 * 100 * 4
+    cache._load_strip_worker(info, StripQuality.HIGH, page)
+    assert cache.images.allocated == 1 and cache.images.reused == 1
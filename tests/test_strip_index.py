@@ -0,0 +1,52 @@
+import numpy as np
+
+from core.models.images import StripIndex, StripInfo
+
+
+PAGES, STRIPS, STRIP_HEIGHT, GAP = 200, 40, 256, 5
+
+
+def _chapter() -> list[tuple[int, float, float, list[StripInfo]]]:
+    """Pages of 40 strips of uneven height stacked with gap, as `MangaViewer` lays them out"""
+    rng = np.random.default_rng(0)
+    images, y = [], 0.0
+    for index in range(PAGES):
+        heights = rng.integers(STRIP_HEIGHT // 2, STRIP_HEIGHT * 2, STRIPS).tolist()
+        strips, top = [], 0
+        for i, height in enumerate(heights):
+            strips.append(StripInfo(image_name=f"{index}.png", index=i, y_start=top, y_end=top + height, width=800, height=height))
+            top += height
+        images.append((index, y, 1.0, strips))
+        y += top + GAP
+    return images
+
+
+def _query_reference(images, top: float, bottom: float) -> list[tuple[int, StripInfo]]:
+    """Every strip of every item tested against cull window, as `_update_visible_strips` did"""
+    return [
+        (index, strip) for index, y, scale, strips in images for strip in strips
+        if y + strip.y_end * scale > top and y + strip.y_start * scale < bottom
+    ]
+
+
+def _windows(total_height: float, count: int = 500) -> list[tuple[float, float]]:
+    rng = np.random.default_rng(1)
+    tops = rng.uniform(-2000, total_height, count)
+    return [(top, top + 1080 * 5) for top in tops.tolist()]     # Viewport with 2x buffer on both sides
+
+
+def test_query_matches_testing_every_strip():
+    images = _chapter()
+    index = StripIndex()
+    index.build(reversed(images))   # Order of items does not matter
+    assert len(index) == PAGES * STRIPS
+
+    total_height = images[-1][1] + images[-1][3][-1].y_end
+    for top, bottom in _windows(total_height, 200) + [(-10, 0), (0, 1), (total_height, total_height + 100)]:
+        expected = _query_reference(images, top, bottom)
+        assert index.query(top, bottom) == expected
+        assert index.count(top, bottom) == len(expected)
+
+    by_image = index.query_by_image(1000, 20000)
+    assert sorted(by_image) == sorted({i for i, _ in _query_reference(images, 1000, 20000)})
+
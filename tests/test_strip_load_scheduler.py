@@ -0,0 +1,79 @@
+from core.models.images import StripInfo, StripLoadScheduler
+from resources.enums import StripQuality
+
+
+class Scheduler(StripLoadScheduler):
+    """Workers are kept instead of started, test runs them"""
+
+    def __init__(self, max_in_flight: int):
+        self.loaded = []
+        super().__init__(
+            load=lambda info, quality, page: f"{info.image_name}[{info.index}] {quality.name}",
+            on_loaded=lambda info, quality, result: self.loaded.append(result),
+            max_in_flight=max_in_flight,
+        )
+        self.started = []
+
+    def _start(self, worker):
+        self.started.append(worker)
+
+    def finish(self, count: int = 1):
+        for _ in range(count):
+            self.started.pop(0).run()
+
+
+def _strip(index: int, image: str = "page") -> StripInfo:
+    return StripInfo(image_name=image, index=index, y_start=index * 256, y_end=index * 256 + 256, width=800, height=256)
+
+
+def test_nearest_strips_are_loaded_first_and_in_flight_is_capped():
+    scheduler = Scheduler(max_in_flight=2)
+    for index, distance in enumerate((900, 0, 300, 0, 1500)):
+        scheduler.submit(_strip(index), StripQuality.HIGH, None, distance)
+    assert scheduler.in_flight == 2 and len(scheduler) == 3    # 0 started before nearer ones were known
+
+    scheduler.finish(2)
+    scheduler.finish(2)
+    scheduler.finish()
+    assert scheduler.loaded == [
+        "page[0] HIGH", "page[1] HIGH", "page[3] HIGH", "page[2] HIGH", "page[4] HIGH"
+    ]
+    assert scheduler.in_flight == 0
+
+
+def test_requests_are_coalesced_and_cancelled():
+    scheduler = Scheduler(max_in_flight=1)
+    scheduler.submit(_strip(0, "busy"), StripQuality.HIGH, None)
+    for quality in (StripQuality.PREVIEW, StripQuality.LOW, StripQuality.MEDIUM):
+        scheduler.submit(_strip(1), quality, None, 500)     # Scrolling closer, only latest quality is loaded
+    scheduler.submit(_strip(2), StripQuality.HIGH, None, 700)
+    scheduler.submit(_strip(0, "gone"), StripQuality.HIGH, None, 100)
+    scheduler.submit(_strip(0, "busy"), StripQuality.HIGH, None)    # Already running
+    assert len(scheduler) == 3
+
+    assert scheduler.cancel("gone") == [0]
+    scheduler.finish(3)
+    assert scheduler.loaded == ["busy[0] HIGH", "page[1] MEDIUM", "page[2] HIGH"]
+    assert not scheduler.started and len(scheduler) == 0
+
+
+def test_failed_load_frees_its_slot():
+    errors = []
+    scheduler = Scheduler(max_in_flight=1)
+    scheduler.load = lambda info, quality, page: 1 / 0
+    scheduler.on_error = lambda info, quality, error: errors.append((info.index, error[0]))
+    scheduler.submit(_strip(0), StripQuality.HIGH, None)
+    scheduler.submit(_strip(1), StripQuality.HIGH, None)
+
+    scheduler.finish()
+    assert errors == [(0, ZeroDivisionError)] and scheduler.in_flight == 1
+
+
+def test_regenerated_strip_is_loaded_while_old_one_is_running():
+    scheduler = Scheduler(max_in_flight=2)
+    scheduler.submit(_strip(0), StripQuality.HIGH, None)
+    panel = _strip(0).model_copy(update={"y_end": 200, "height": 200, "is_panel_boundary": True})
+    scheduler.submit(panel, StripQuality.HIGH, None)    # Panel analysis done meanwhile
+    assert scheduler.in_flight == 2
+    scheduler.finish(2)
+    assert len(scheduler.loaded) == 2
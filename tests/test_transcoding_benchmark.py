@@ -0,0 +1,92 @@
+"""
+Chapter download with transcoding inline on download loop and in process pool.
+Run with `pytest tests/test_transcoding_benchmark.py --benchmark-only`, pages/s and loop stalls are in `extra_info`.
+"""
+import asyncio
+import io
+import os
+import time
+
+import pytest
+from PIL import Image, ImageDraw
+
+from application.services.downloaders.image_transcoder import ImageTranscoder
+
+
+pytest.importorskip("pytest_benchmark")
+
+PAGES = 100
+NETWORK_DELAY = 0.01
+PROCESSES = 2
+
+
+def _make_page(i: int) -> bytes:
+    page = Image.new("RGB", (720, 1600), "white")
+    draw = ImageDraw.Draw(page)
+    for panel in range(4):
+        top = 20 + panel * 400
+        draw.rectangle((20, top, 700, top + 360), fill=((i * 7 + panel * 50) % 255, 120, 200), outline="black", width=4)
+    buffer = io.BytesIO()
+    page.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def _download_chapter(transcoder: ImageTranscoder, pages: list[bytes]) -> tuple[float, float]:
+    """Simulated chapter download, returns (pages per second, longest loop stall in seconds)"""
+    max_stall = 0.0
+    done = False
+
+    async def heartbeat():
+        nonlocal max_stall
+        while not done:
+            before = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_stall = max(max_stall, time.perf_counter() - before - 0.001)
+
+    async def download(page: bytes):
+        await asyncio.sleep(NETWORK_DELAY)
+        return await transcoder.transcode(page)
+
+    beat = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    results = await asyncio.gather(*(download(page) for page in pages))
+    elapsed = time.perf_counter() - start
+    done = True
+    await beat
+
+    assert len(results) == len(pages)
+    assert all(result.width == 720 and result.height == 1600 for result in results)
+    return len(pages) / elapsed, max_stall
+
+
+def test_pooled_transcoding_does_not_stall_download_loop(benchmark):
+    pages = [_make_page(i) for i in range(PAGES)]
+
+    inline_rate, inline_stall = asyncio.run(_download_chapter(ImageTranscoder(processes=0), pages))
+
+    pooled = ImageTranscoder(processes=PROCESSES, queue_size=8)
+    loop = asyncio.new_event_loop()     # Transcoder queue is bound to loop it was first used on, as download loop
+    stalls = []
+    def download_chapter():
+        rate, stall = loop.run_until_complete(_download_chapter(pooled, pages))
+        stalls.append(stall)
+        return rate
+    try:
+        pooled_rate = benchmark.pedantic(download_chapter, rounds=3, iterations=1, warmup_rounds=1)    # Processes are started in warmup
+    finally:
+        pooled.close()
+        loop.close()
+
+    pooled_stall = max(stalls)
+    assert pooled_stall < inline_stall
+    if benchmark.disabled:
+        return
+    pooled_rate = PAGES / benchmark.stats.stats.min
+    benchmark.extra_info.update({
+        "inline_pages_per_s": round(inline_rate, 1),
+        "pooled_pages_per_s": round(pooled_rate, 1),
+        "inline_max_stall_ms": round(inline_stall * 1000, 1),
+        "pooled_max_stall_ms": round(pooled_stall * 1000, 1),
+    })
+    if (os.cpu_count() or 1) > PROCESSES:   # Pool can only outpace loop with cores to spare for it
+        assert pooled_rate >= inline_rate
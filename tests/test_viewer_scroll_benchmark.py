@@ -0,0 +1,310 @@
+"""
+Scroll traces replayed against offscreen `MangaViewer` over synthetic webtoon chapter.
+
+Traces are Chrome traces exported by `MangaViewer.export_frame_trace`, only their wheel inputs are replayed,
+so session that scrolled badly can be dropped into `data/scroll_traces` as is.
+Run with `pytest tests/test_viewer_scroll_benchmark.py --benchmark-only`, compare runs with `--benchmark-compare`.
+Besides time to replay and settle, each replay reports in its `extra_info`
+viewport update latency percentiles, strips and pages decoded, bytes decoded and peak RSS,
+and every strip in viewport has to be shown once replay settles.
+Panel and gutter detection, page layout and strip index are benchmarked here too, so timings stay out of unit tests.
+"""
+import io
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+pytest.importorskip("pytest_benchmark")
+from PySide6.QtCore import QPoint, QPointF, QRectF, Qt
+from PySide6.QtGui import QWheelEvent
+
+from application.services import ContentAwareTileManager
+from core.models.images import ImageCache, ImageMetadata, PageBuffer, PageLayout, StripIndex
+from utils import FrameRecorder, ThreadingManager
+
+from .test_gutter_detection import HEIGHT as STRIP_HEIGHT, WIDTH as STRIP_WIDTH, _find_gutter_reference, _make_webtoon_strip
+from .test_page_layout import GAP as LAYOUT_GAP, _position_reference
+from .test_strip_index import PAGES as INDEX_PAGES, STRIPS as INDEX_STRIPS, _chapter as _strip_chapter, _query_reference, _windows
+
+
+TRACES = Path(__file__).parent / "data" / "scroll_traces"
+PAGES = 16
+WIDTH, HEIGHT = 720, 2400
+ROUNDS = 3
+
+
+def _page(i: int) -> bytes:
+    """Webtoon page, panels of varying height on white, gradients and noise so it does not compress to nothing"""
+    rng = np.random.default_rng(i)
+    pixels = np.full((HEIGHT, WIDTH, 3), 255, dtype=np.uint8)
+    y = 40
+    while y < HEIGHT - 200:
+        height = int(rng.integers(300, 900))
+        bottom = min(y + height, HEIGHT - 40)
+        gradient = np.linspace(40, 220, bottom - y, dtype=np.uint8)[:, None, None]
+        pixels[y:bottom, 30:WIDTH - 30] = gradient + rng.integers(0, 30, (bottom - y, WIDTH - 60, 3), dtype=np.uint8)
+        y = bottom + int(rng.integers(40, 160))     # Gutter
+    page = Image.fromarray(pixels)
+    ImageDraw.Draw(page).text((60, 60), f"page {i}", fill="black")
+    buffer = io.BytesIO()
+    page.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def chapter() -> list[tuple[ImageMetadata, bytes]]:
+    return [(ImageMetadata(url="", name=f"{i}.jpg", width=WIDTH, height=HEIGHT), _page(i)) for i in range(PAGES)]
+
+
+@pytest.fixture(scope="module")
+def viewer_class(qt_app):
+    return pytest.importorskip("gui.widgets.manga", exc_type=ImportError).MangaViewer   # GUI needs system libraries, as enchant
+
+
+class DecodeCounters:
+    def __init__(self):
+        self.strips = self.strip_bytes = self.pages = self.page_bytes = 0
+        self._lock = threading.Lock()   # Counted on strip workers
+
+    def strip(self, nbytes: int):
+        with self._lock:
+            self.strips += 1
+            self.strip_bytes += nbytes
+
+    def page(self, nbytes: int):
+        with self._lock:
+            self.pages += 1
+            self.page_bytes += nbytes
+
+
+def _viewer(viewer_class, path: Path, chapter, counters: DecodeCounters):
+    cache = ImageCache(path / "images")
+    viewer = viewer_class(cache)
+    viewer.resize(800, 600)
+    viewer.show()
+    viewer.frame_recorder.enabled = True
+    viewer.strip_cache.pages.pyramid_path = path / "mips"    # Cold, every page is decoded
+
+    load = viewer.strip_cache.scheduler.load
+    def counted_load(strip_info, quality, page):
+        image = load(strip_info, quality, page)
+        counters.strip(image.sizeInBytes())
+        return image
+    viewer.strip_cache.scheduler.load = counted_load
+    viewer.tile_manager.close()     # Without stored panel results, every page is analyzed
+
+    for index, (metadata, data) in enumerate(chapter):
+        cache.add(metadata.name, data)
+        viewer.add_manga_image(index, metadata)
+    viewer.frame_recorder.reset()
+    return viewer
+
+
+def _settle(app, viewer, timeout: float = 20.0):
+    """Until smooth scroll, settle timer and every strip load are done"""
+    deadline = time.perf_counter() + timeout
+    scheduler = viewer.strip_cache.scheduler
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        if (
+            not viewer._scroll_animation_running and not viewer._settle_timer.isActive()
+            and not viewer._strips_changed_timer.isActive()
+            and not len(scheduler) and not scheduler.in_flight and not ThreadingManager.thread_pool.activeThreadCount()
+        ):
+            return
+        time.sleep(.002)
+    pytest.fail("Viewer did not settle")
+
+
+def _replay(app, viewer, wheel: list[tuple[float, dict]]):
+    start = time.perf_counter()
+    center = QPointF(viewer.viewport().rect().center())
+    for t, args in wheel:
+        while (wait := start + t / 1000 - time.perf_counter()) > 0:
+            app.processEvents()
+            time.sleep(min(wait, .002))
+        viewer.wheelEvent(QWheelEvent(
+            center, viewer.mapToGlobal(center), QPoint(), QPoint(0, args["delta"]),
+            Qt.MouseButton.NoButton, Qt.KeyboardModifier.NoModifier, Qt.ScrollPhase.NoScrollPhase, False,
+        ))
+    _settle(app, viewer)
+
+
+def _strips_in_viewport(viewer) -> tuple[int, int]:
+    """Strips intersecting viewport, and how many of them show pixmap"""
+    viewport_rect = viewer.mapToScene(viewer.viewport().rect()).boundingRect()
+    total = shown = 0
+    for item in viewer.manga_items.values():
+        for strip in item.strips:
+            if item.mapRectToScene(QRectF(0, strip.y_start, strip.width, strip.height)).intersects(viewport_rect):
+                total += 1
+                shown += not item.strip_items[strip.index].pixmap().isNull()
+    return total, shown
+
+
+def _peak_rss() -> int | None:
+    try:
+        import resource
+    except ImportError:     # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@pytest.mark.parametrize("trace", sorted(path.stem for path in TRACES.glob("*.json")))
+def test_scroll_replay(benchmark, qt_app, viewer_class, chapter, tmp_path, monkeypatch, trace):
+    wheel = FrameRecorder.inputs(json.loads((TRACES / f"{trace}.json").read_text()), "wheel")
+    counters = DecodeCounters()
+    build = PageBuffer._build_pyramid
+    def counted_build(page):
+        pyramid = build(page)
+        counters.page(pyramid.shapes[0][0] * pyramid.shapes[0][1] * pyramid.CHANNELS)
+        return pyramid
+    monkeypatch.setattr(PageBuffer, "_build_pyramid", counted_build)
+
+    viewers, latencies, frames, viewport_strips = [], [], [], []
+    def setup():
+        if viewers:     # Previous round is torn down outside of measured time
+            viewport_strips.append(_strips_in_viewport(viewers[-1]))
+            _close(viewers[-1], latencies, frames)
+        viewers.append(_viewer(viewer_class, tmp_path / f"round_{len(viewers)}", chapter, counters))
+        return (qt_app, viewers[-1], wheel), {}
+
+    benchmark.pedantic(_replay, setup=setup, rounds=ROUNDS, iterations=1)
+    scrolled = viewers[-1].verticalScrollBar().value()
+    viewport_strips.append(_strips_in_viewport(viewers[-1]))
+    _close(viewers[-1], latencies, frames)
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    benchmark.extra_info.update({
+        "viewport_updates": len(latencies) // ROUNDS,
+        "update_p50_ms": round(p50, 3),
+        "update_p95_ms": round(p95, 3),
+        "update_p99_ms": round(p99, 3),
+        "frame_p95_ms": round(float(np.percentile(frames, 95)) * 1000, 3) if frames else None,
+        "strips_decoded": counters.strips // ROUNDS,
+        "strip_bytes": counters.strip_bytes // ROUNDS,
+        "pages_decoded": counters.pages // ROUNDS,
+        "bytes_decoded": counters.page_bytes // ROUNDS,
+        "peak_rss": _peak_rss(),
+    })
+    assert scrolled > 0 and counters.strips and counters.pages
+    assert all(total and shown == total for total, shown in viewport_strips)   # Settled viewport is fully shown
+
+
+def _close(viewer, latencies: list[float], frames: list[float]):
+    for category, name, _, duration, args in viewer.frame_recorder.events:
+        if name == "update_visible_strips":
+            latencies.append(duration)
+        elif "interval_ms" in args:
+            frames.append(args["interval_ms"] / 1000)
+    viewer.clear()
+    viewer.close()
+    viewer.deleteLater()
+    ThreadingManager.thread_pool.waitForDone()
+
+
+def test_panel_detection_of_chapter(benchmark, chapter):
+    tile_manager = ContentAwareTileManager()
+    results = benchmark.pedantic(
+        lambda: [tile_manager._analyze_panel_worker(data) for _, data in chapter], rounds=ROUNDS, iterations=1
+    )
+    benchmark.extra_info.update({
+        "pages": len(results),
+        "boundaries": sum(len(result.boundaries) for result in results),
+        "confident": sum(result.confidence >= tile_manager.detection_confidence_threshold for result in results),
+    })
+    assert all(result.boundaries for result in results)
+
+
+def test_gutter_detection_of_long_strip(benchmark):
+    tile_manager = ContentAwareTileManager()
+    page = _make_webtoon_strip()
+    start = time.perf_counter()
+    reference = _find_gutter_reference(page)
+    reference_time = time.perf_counter() - start
+
+    gutters = benchmark(tile_manager._find_gutter, page)
+    assert gutters == reference
+    if benchmark.disabled:  # As with --benchmark-disable or under xdist, nothing was timed
+        return
+    speedup = reference_time / benchmark.stats.stats.min
+    benchmark.extra_info.update({
+        "strip": f"{STRIP_WIDTH}x{STRIP_HEIGHT}",
+        "row_by_row_ms": round(reference_time * 1000, 3),
+        "speedup": round(speedup, 1),
+    })
+    assert speedup >= 20
+
+
+def test_page_layout_of_first_page_arriving_last(benchmark):
+    pages = 300
+    sizes = {index: (800, 2000) for index in range(pages)}
+    def without_first():
+        layout = PageLayout(LAYOUT_GAP)
+        for index in range(1, pages):
+            layout.set(index, 800, 2000)
+        return (layout,), {}
+    def first_page_arrives(layout: PageLayout) -> float:
+        layout.set(0, 800, 2000)
+        return layout.position(pages - 1)
+
+    start = time.perf_counter()     # As viewer did: position of first page, then of every later one again
+    for index in range(pages):
+        _position_reference(sizes, index)
+    reference_time = time.perf_counter() - start
+
+    position = benchmark.pedantic(first_page_arrives, setup=without_first, rounds=50, iterations=1)
+    assert position == _position_reference(sizes, pages - 1)
+    if benchmark.disabled:
+        return
+
+    def set_costs(order) -> list[float]:
+        layout, costs = PageLayout(LAYOUT_GAP), []
+        for index in order:
+            start = time.perf_counter()
+            layout.set(index, 800, 2000)
+            layout.position(index)
+            costs.append(time.perf_counter() - start)
+        return costs
+    costs, reversed_costs = set_costs(range(pages)), set_costs(reversed(range(pages)))
+    first = np.median(costs[:20])
+    speedup = reference_time / benchmark.stats.stats.min
+    benchmark.extra_info.update({
+        "pages": pages,
+        "sorted_sums_ms": round(reference_time * 1000, 3),
+        "speedup": round(speedup, 1),
+        "last_to_first_page_cost": round(float(np.median(costs[-20:]) / first), 2),   # O(log n), stays near 1
+        "reversed_last_to_first_page_cost": round(float(np.median(reversed_costs[-20:]) / first), 2),
+    })
+    assert speedup >= 100
+
+
+def test_strip_index_viewport_updates(benchmark):
+    images = _strip_chapter()
+    index = StripIndex()
+    index.build(images)
+    windows = _windows(images[-1][1] + images[-1][3][-1].y_end)
+
+    start = time.perf_counter()     # Every strip tested, as viewer did
+    for top, bottom in windows[:50]:
+        _query_reference(images, top, bottom)
+    reference = 50 / (time.perf_counter() - start)
+
+    benchmark(lambda: [index.query_by_image(top, bottom) for top, bottom in windows])
+    if benchmark.disabled:
+        return
+    indexed = len(windows) / benchmark.stats.stats.min
+    benchmark.extra_info.update({
+        "strips": INDEX_PAGES * INDEX_STRIPS,
+        "every_strip_updates_per_s": round(reference),
+        "updates_per_s": round(indexed),
+        "speedup": round(indexed / reference, 1),
+    })
+    assert indexed / reference >= 20